@@ -32,5 +32,6 @@ __all__ = ['data',
            'model',
            'embedding',
            'Vocab',
+           'FrozenVocab',
            'loss',
            'initializer']
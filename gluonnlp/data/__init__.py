@@ -23,7 +23,8 @@
 from . import (batchify, candidate_sampler, conll, dataset, language_model,
                question_answering, registry, sampler, sentiment, stream,
                transforms, translation, utils, word_embedding_evaluation,
-               word_embedding_training, dataloader)
+               word_embedding_training, dataloader, profiler,
+               numericalized)
 from .candidate_sampler import *
 from .conll import *
 from .dataset import *
@@ -39,10 +40,12 @@ from .utils import *
 from .word_embedding_evaluation import *
 from .word_embedding_training import *
 from .dataloader import *
+from .profiler import *
+from .numericalized import *
 
 __all__ = (['batchify'] + utils.__all__ + transforms.__all__ + sampler.__all__
            + dataset.__all__ + language_model.__all__ + sentiment.__all__ +
            word_embedding_evaluation.__all__ + stream.__all__ +
            word_embedding_training.__all__ + conll.__all__ +
            translation.__all__ + registry.__all__ + question_answering.__all__ +
-           dataloader.__all__)
+           dataloader.__all__ + profiler.__all__ + numericalized.__all__)
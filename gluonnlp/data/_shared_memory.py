@@ -0,0 +1,162 @@
+# coding: utf-8
+
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Shared-memory transport of batches between processes."""
+__all__ = ['SlabPool', 'DEFAULT_SLAB_SIZE']
+
+import ctypes
+import mmap
+import multiprocessing
+
+import numpy as np
+
+import mxnet as mx
+from mxnet.base import _LIB, check_call
+
+DEFAULT_SLAB_SIZE = 64 * 1024 * 1024
+_ALIGNMENT = 64
+
+
+def _flatten(batch, arrays):
+    """Replace the arrays of a nested batch by their index in `arrays`."""
+    if isinstance(batch, mx.nd.NDArray) and batch.stype == 'default':
+        arrays.append(batch)
+        return ('ndarray', len(arrays) - 1)
+    elif isinstance(batch, np.ndarray) and not batch.dtype.hasobject:
+        arrays.append(batch)
+        return ('numpy', len(arrays) - 1)
+    elif type(batch) in (list, tuple):  # pylint: disable=unidiomatic-typecheck
+        return (type(batch).__name__, [_flatten(ele, arrays) for ele in batch])
+    return ('object', batch)
+
+
+def _unflatten(structure, arrays):
+    """Inverse of `_flatten`."""
+    kind, value = structure
+    if kind in ('ndarray', 'numpy'):
+        return arrays[value]
+    elif kind == 'list':
+        return [_unflatten(ele, arrays) for ele in value]
+    elif kind == 'tuple':
+        return tuple(_unflatten(ele, arrays) for ele in value)
+    return value
+
+
+class SlabPool(object):
+    """Pool of reusable shared-memory slabs to send batches between processes.
+
+    A producer writes the arrays of a batch into a free slab and obtains a small picklable
+    descriptor, which is sent through a queue instead of the pickled batch. The consumer
+    copies the arrays out of the slab with `read`, which returns the slab to the pool.
+
+    The slabs are anonymous shared memory mappings, so the pool must be created before the
+    processes using it are forked. Memory is only committed once it is written to.
+
+    Batches are nested lists and tuples of numpy arrays, NDArrays and other picklable
+    objects. Batches without arrays or larger than a slab are embedded in the descriptor
+    and pickled as usual.
+
+    Parameters
+    ----------
+    num_slabs : int
+        Number of slabs. `write` blocks while all slabs are in use.
+    slab_size : int
+        Size of each slab in bytes.
+    """
+    def __init__(self, num_slabs, slab_size=DEFAULT_SLAB_SIZE):
+        assert num_slabs > 0, 'num_slabs must be positive. Received {}'.format(num_slabs)
+        assert slab_size > 0, 'slab_size must be positive. Received {}'.format(slab_size)
+        self._slab_size = slab_size
+        self._slabs = [mmap.mmap(-1, slab_size) for _ in range(num_slabs)]
+        self._free_slabs = multiprocessing.Queue()
+        for slab_id in range(num_slabs):
+            self._free_slabs.put(slab_id)
+
+    def write(self, batch):
+        """Write the batch into a free slab, blocking until a slab is available.
+
+        Parameters
+        ----------
+        batch : object
+            Nested lists and tuples of numpy arrays, NDArrays and picklable objects.
+
+        Returns
+        -------
+        descriptor : tuple
+            Picklable description of the batch, to be passed to `read`.
+        """
+        arrays = []
+        structure = _flatten(batch, arrays)
+        layout = []
+        size = 0
+        for arr in arrays:
+            dtype = np.dtype(arr.dtype)
+            offset = (size + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+            layout.append((isinstance(arr, mx.nd.NDArray), offset, dtype.str, arr.shape))
+            size = offset + dtype.itemsize * int(np.prod(arr.shape))
+        if not arrays or size > self._slab_size:
+            return None, batch
+
+        slab_id = self._free_slabs.get()
+        buf = np.frombuffer(self._slabs[slab_id], dtype=np.uint8)
+        for arr, (is_ndarray, offset, dtype, shape) in zip(arrays, layout):
+            dst = self._view(buf, offset, dtype, shape)
+            if is_ndarray:
+                check_call(_LIB.MXNDArraySyncCopyToCPU(arr.handle,
+                                                       dst.ctypes.data_as(ctypes.c_void_p),
+                                                       ctypes.c_size_t(dst.size)))
+            else:
+                dst[...] = arr
+        return slab_id, (structure, layout)
+
+    def read(self, descriptor, ctx=None):
+        """Copy a batch out of its slab and release the slab.
+
+        Parameters
+        ----------
+        descriptor : tuple
+            Descriptor returned by `write`.
+        ctx : Context, default None
+            Context of the NDArrays in the batch. Defaults to `mx.cpu()`.
+
+        Returns
+        -------
+        batch : object
+            A copy of the batch passed to `write`.
+        """
+        slab_id, payload = descriptor
+        if slab_id is None:
+            return payload
+        structure, layout = payload
+        ctx = mx.cpu() if ctx is None else ctx
+        buf = np.frombuffer(self._slabs[slab_id], dtype=np.uint8)
+        try:
+            arrays = []
+            for is_ndarray, offset, dtype, shape in layout:
+                src = self._view(buf, offset, dtype, shape)
+                arrays.append(mx.nd.array(src, ctx=ctx, dtype=src.dtype) if is_ndarray
+                              else src.copy())
+        finally:
+            self._free_slabs.put(slab_id)
+        return _unflatten(structure, arrays)
+
+    @staticmethod
+    def _view(buf, offset, dtype, shape):
+        dtype = np.dtype(dtype)
+        nbytes = dtype.itemsize * int(np.prod(shape))
+        return buf[offset:offset + nbytes].view(dtype).reshape(shape)
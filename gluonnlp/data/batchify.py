@@ -20,6 +20,7 @@
 into batches for fast processing."""
 __all__ = ['Stack', 'Pad', 'Tuple']
 
+import itertools
 import logging
 
 import numpy as np
@@ -29,6 +30,11 @@ import mxnet as mx
 def _pad_arrs_to_max_length(arrs, pad_axis, pad_val, use_shared_mem, dtype):
     """Inner Implementation of the Pad batchify
 
+    The padded batch is allocated once. NDArray samples padded along the first axis are
+    gathered into it on their device, without a round trip through numpy. Other samples are
+    gathered into a numpy buffer of the output dtype, with a single concatenation and scatter
+    for 1-D samples, and then copied once into the output NDArray.
+
     Parameters
     ----------
     arrs : list
@@ -41,35 +47,71 @@ def _pad_arrs_to_max_length(arrs, pad_axis, pad_val, use_shared_mem, dtype):
     ret : NDArray
     original_length : NDArray
     """
+    ctx = mx.Context('cpu_shared', 0) if use_shared_mem else mx.cpu()
     if isinstance(arrs[0], mx.nd.NDArray):
         dtype = arrs[0].dtype if dtype is None else dtype
-        arrs = [arr.asnumpy() for arr in arrs]
-    elif not isinstance(arrs[0], np.ndarray):
-        arrs = [np.asarray(ele) for ele in arrs]
+        original_length = [ele.shape[pad_axis] for ele in arrs]
+        max_size = max(original_length)
+        ret_shape = list(arrs[0].shape)
+        ret_shape[pad_axis] = max_size
+        ret_shape = (len(arrs), ) + tuple(ret_shape)
+        if pad_axis != 0 or 0 in ret_shape:
+            # Zero-size NDArrays cannot be created, so they are handled by numpy
+            arrs = [arr.asnumpy() for arr in arrs]
+    if isinstance(arrs[0], mx.nd.NDArray):
+        ret = mx.nd.empty(ret_shape, ctx=ctx, dtype=dtype)
+        if all(length == max_size for length in original_length) \
+                and all(arr.dtype == dtype for arr in arrs):
+            mx.nd.stack(*arrs, out=ret)
+        else:
+            # Gather the rows of the concatenated samples, where the padded rows point to an
+            # extra row filled with pad_val.
+            src_ctx = arrs[0].context
+            pad_row = mx.nd.full((1, ) + ret_shape[2:], pad_val, ctx=src_ctx, dtype=dtype)
+            flat = mx.nd.concat(*([arr.astype(dtype, copy=False) for arr in arrs
+                                   if arr.shape[0] > 0] + [pad_row]), dim=0)
+            lengths = np.array(original_length)
+            offsets = np.cumsum(lengths) - lengths
+            positions = np.arange(max_size)
+            indices = np.where(positions < lengths[:, None], offsets[:, None] + positions,
+                               lengths.sum())
+            mx.nd.take(flat, mx.nd.array(indices.reshape((-1,)), ctx=src_ctx), axis=0,
+                       out=ret.reshape((-1, ) + ret_shape[2:]))
     else:
-        dtype = arrs[0].dtype if dtype is None else dtype
-
-    original_length = [ele.shape[pad_axis] for ele in arrs]
-    max_size = max(original_length)
-
-    ret_shape = list(arrs[0].shape)
-    ret_shape[pad_axis] = max_size
-    ret_shape = (len(arrs), ) + tuple(ret_shape)
-
-    ret = np.full(shape=ret_shape, fill_value=pad_val, dtype=dtype)
-
-    for i, arr in enumerate(arrs):
-        if arr.shape[pad_axis] == max_size:
-            ret[i] = arr
+        if isinstance(arrs[0], np.ndarray):
+            dtype = arrs[0].dtype if dtype is None else dtype
         else:
-            slices = [slice(None) for _ in range(arr.ndim)]
-            slices[pad_axis] = slice(0, arr.shape[pad_axis])
-            if slices[pad_axis].start != slices[pad_axis].stop:
-                slices = [slice(i, i + 1)] + slices
-                ret[tuple(slices)] = arr
-
-    ctx = mx.Context('cpu_shared', 0) if use_shared_mem else mx.cpu()
-    ret = mx.nd.array(ret, ctx=ctx, dtype=dtype)
+            dtype = mx.base.mx_real_t if dtype is None else dtype
+        original_length = [len(ele) if pad_axis == 0 else np.shape(ele)[pad_axis]
+                           for ele in arrs]
+        max_size = max(original_length)
+        flat = None
+        if pad_axis == 0:
+            if isinstance(arrs[0], np.ndarray):
+                if all(ele.ndim == 1 for ele in arrs):
+                    flat = np.concatenate(arrs).astype(dtype, copy=False)
+            else:
+                flat = np.array(list(itertools.chain.from_iterable(arrs)), dtype=dtype)
+                if flat.ndim != 1:
+                    flat = None
+        if flat is not None:
+            lengths = np.array(original_length)
+            ret = np.full(shape=(len(arrs), max_size), fill_value=pad_val, dtype=dtype)
+            ret[np.arange(max_size) < lengths[:, None]] = flat
+        else:
+            arrs = [np.asarray(ele) for ele in arrs]
+            ret_shape = list(arrs[0].shape)
+            ret_shape[pad_axis] = max_size
+            ret_shape = (len(arrs), ) + tuple(ret_shape)
+            ret = np.full(shape=ret_shape, fill_value=pad_val, dtype=dtype)
+            for i, arr in enumerate(arrs):
+                if arr.shape[pad_axis] == max_size:
+                    ret[i] = arr
+                elif arr.shape[pad_axis] != 0:
+                    slices = [slice(None) for _ in range(arr.ndim)]
+                    slices[pad_axis] = slice(0, arr.shape[pad_axis])
+                    ret[i][tuple(slices)] = arr
+        ret = mx.nd.array(ret, ctx=ctx, dtype=dtype)
     original_length = mx.nd.array(original_length, ctx=ctx, dtype=np.int32)
 
     return ret, original_length
@@ -85,8 +127,8 @@ def _stack_arrs(arrs, use_shared_mem, dtype):
         else:
             return mx.nd.stack(*arrs)
     else:
-        out = np.asarray(arrs)
-        dtype = out.dtype if dtype is None else dtype
+        out = np.asarray(arrs, dtype=dtype)
+        dtype = out.dtype
         if use_shared_mem:
             return mx.nd.array(out, ctx=mx.Context('cpu_shared', 0), dtype=dtype)
         else:
@@ -20,61 +20,279 @@
 __all__ = ['ShardedDataLoader']
 
 import sys
+import collections
 import multiprocessing
 import multiprocessing.queues
+import pickle
 import threading
+import time
 from mxnet import context
-from mxnet.gluon.data.dataloader import Queue, SimpleQueue, DataLoader, \
-    fetcher_loop, _as_in_context
+from mxnet.gluon.data.dataloader import Queue, SimpleQueue, DataLoader, _as_in_context
 
+from ._shared_memory import SlabPool, DEFAULT_SLAB_SIZE
+from .profiler import _make_event
 
-def worker_loop(dataset, key_queue, data_queue, batchify_fn):
-    """Worker loop for multiprocessing DataLoader."""
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+_WORKER_STATUS_CHECK_INTERVAL = 1.0  # seconds
+
+
+def worker_loop(dataset, key_queue, data_queue, batchify_fn, slab_pool=None, profile=False):
+    """Worker loop for multiprocessing DataLoader.
+
+    If `slab_pool` is given, the batches are written into its shared-memory slabs and only
+    their descriptors are sent through `data_queue`. If `profile` is True, the timing events
+    of the worker are sent together with each batch. As in `_thread_worker_loop`, an exception
+    raised while reading or batchifying the samples is sent in place of the batch.
+    """
     dataset._fork()
     while True:
         idx, samples = key_queue.get()
         if idx is None:
             break
-        if isinstance(samples[0], (list, tuple)):
-            batch = [batchify_fn([dataset[i] for i in shard]) for shard in samples]
-        else:
-            batch = batchify_fn([dataset[i] for i in samples])
+        events = [] if profile else None
+        try:
+            batch = _batchify_samples(dataset, samples, batchify_fn, events)
+        except Exception as e:  # pylint: disable=broad-except
+            data_queue.put((idx, _picklable_error(e)))
+            continue
+        sent = time.time()
+        if slab_pool is not None:
+            batch = slab_pool.write(batch)
+        if profile:
+            batch = (batch, events, sent)
         data_queue.put((idx, batch))
 
 
-class _ShardedMultiWorkerIter(object):
-    """Interal multi-worker iterator for ShardedDataLoader."""
-    def __init__(self, num_workers, dataset, batchify_fn, batch_sampler, pin_memory=False):
-        assert num_workers > 0, '_MultiWorkerIter is not for {} workers'.format(num_workers)
-        self._num_workers = num_workers
-        self._dataset = dataset
-        self._batchify_fn = batchify_fn
-        self._batch_sampler = batch_sampler
-        self._key_queue = Queue()
-        self._data_queue = Queue() if sys.version_info[0] <= 2 else SimpleQueue()
+def _picklable_error(error):
+    """Return the error, or a RuntimeError with its description if it cannot be pickled."""
+    try:
+        pickle.loads(pickle.dumps(error))
+    except Exception:  # pylint: disable=broad-except
+        return RuntimeError('{}: {}'.format(type(error).__name__, error))
+    return error
+
+
+def _thread_worker_loop(dataset, key_queue, data_queue, batchify_fn, profile=False):
+    """Worker loop for multithreading DataLoader.
+
+    An exception raised while reading or batchifying the samples is sent in place of the
+    batch, so that the consumer re-raises it and the worker keeps running.
+    """
+    while True:
+        idx, samples = key_queue.get()
+        if idx is None:
+            break
+        events = [] if profile else None
+        try:
+            batch = _batchify_samples(dataset, samples, batchify_fn, events)
+        except Exception as e:  # pylint: disable=broad-except
+            data_queue.put((idx, e))
+            continue
+        if profile:
+            batch = (batch, events, time.time())
+        data_queue.put((idx, batch))
+
+
+def _batchify_samples(dataset, samples, batchify_fn, events=None):
+    """Batchify the samples of a batch, or of each shard of a batch.
+
+    If `events` is a list, the timing events of reading and batchifying the samples are
+    appended to it.
+    """
+    if isinstance(samples[0], (list, tuple)):
+        return [_batchify_samples(dataset, shard, batchify_fn, events) for shard in samples]
+    start = time.time()
+    samples = [dataset[i] for i in samples]
+    if events is None:
+        return batchify_fn(samples)
+    end = time.time()
+    events.append(_make_event('getitem', start, end))
+    batch = batchify_fn(samples)
+    events.append(_make_event('batchify', end, time.time()))
+    return batch
+
+
+def _fetcher_loop(data_queue, data_buffer, data_cond, discarded, pin_memory=False,
+                  slab_pool=None, profiler=None):
+    """Fetcher loop that moves the batches produced by the workers into the data buffer
+    and wakes up the iterators waiting for them."""
+    ctx = context.cpu_pinned() if pin_memory else context.cpu()
+    while True:
+        idx, batch = data_queue.get()
+        if idx is None:
+            break
+        if isinstance(batch, Exception):
+            # Raised by a worker, and re-raised by the consumer
+            with data_cond:
+                if idx in discarded:
+                    discarded.remove(idx)
+                else:
+                    data_buffer[idx] = batch
+                    data_cond.notify_all()
+            continue
+        if profiler is not None:
+            batch, events, sent = batch
+        if slab_pool is not None:
+            batch = slab_pool.read(batch, ctx=ctx)
+        batch = _as_in_context(batch, ctx)
+        if profiler is not None:
+            profiler.record_events(events)
+            profiler.record('transfer', sent)
+        with data_cond:
+            if idx in discarded:
+                discarded.remove(idx)
+            else:
+                data_buffer[idx] = batch
+                data_cond.notify_all()
+
+
+class _ShardedWorkerPool(object):
+    """Internal pool of worker processes or threads for ShardedDataLoader.
+
+    The workers are started once and reused by all the iterators of the data loader, so that
+    no processes are forked at the beginning of each epoch. Every submitted batch gets a
+    unique index, which is used to retrieve the result. If `slab_size` is not None, the
+    batches of worker processes are transferred through a pool of `2 * num_workers`
+    shared-memory slabs. If `profiler` is not None, the stages run by the workers and the
+    transfer of the batches are recorded.
+    """
+    def __init__(self, num_workers, dataset, batchify_fn, pin_memory=False,
+                 slab_size=None, worker_type='process', profiler=None):
+        assert num_workers > 0, '_ShardedWorkerPool is not for {} workers'.format(num_workers)
+        assert worker_type in ['process', 'thread'], \
+            'worker_type must be "process" or "thread". Received {}'.format(worker_type)
         self._data_buffer = {}
-        self._rcvd_idx = 0
+        self._data_cond = threading.Condition()
+        self._discarded = set()
         self._sent_idx = 0
-        self._iter = iter(self._batch_sampler)
         self._shutdown = False
+        self.broken = False
+        slab_pool = None
 
-        workers = []
-        for _ in range(self._num_workers):
-            worker = multiprocessing.Process(
-                target=worker_loop,
-                args=(self._dataset, self._key_queue, self._data_queue, self._batchify_fn))
-            worker.daemon = True
-            worker.start()
-            workers.append(worker)
+        self._workers = []
+        if worker_type == 'thread':
+            self._key_queue = queue.Queue()
+            self._data_queue = queue.Queue()
+            for _ in range(num_workers):
+                worker = threading.Thread(
+                    target=_thread_worker_loop,
+                    args=(dataset, self._key_queue, self._data_queue, batchify_fn,
+                          profiler is not None))
+                worker.daemon = True
+                worker.start()
+                self._workers.append(worker)
+        else:
+            self._key_queue = Queue()
+            self._data_queue = Queue() if sys.version_info[0] <= 2 else SimpleQueue()
+            if slab_size is not None:
+                slab_pool = SlabPool(2 * num_workers, slab_size)
+            for _ in range(num_workers):
+                worker = multiprocessing.Process(
+                    target=worker_loop,
+                    args=(dataset, self._key_queue, self._data_queue, batchify_fn, slab_pool,
+                          profiler is not None))
+                worker.daemon = True
+                worker.start()
+                self._workers.append(worker)
 
         self._fetcher = threading.Thread(
-            target=fetcher_loop,
-            args=(self._data_queue, self._data_buffer, pin_memory))
+            target=_fetcher_loop,
+            args=(self._data_queue, self._data_buffer, self._data_cond, self._discarded,
+                  pin_memory, slab_pool, profiler))
         self._fetcher.daemon = True
         self._fetcher.start()
 
+    def __del__(self):
+        self.shutdown()
+
+    def submit(self, samples):
+        """Send the sample indices of a batch to the workers.
+
+        Parameters
+        ----------
+        samples : list of int or list of list of int
+            Indices of the samples in the batch, or of each shard of the batch.
+
+        Returns
+        -------
+        idx : int
+            The index used to retrieve the batch.
+        """
+        assert not self._shutdown, 'call submit after shutdown is forbidden'
+        idx = self._sent_idx
+        self._key_queue.put((idx, samples))
+        self._sent_idx += 1
+        return idx
+
+    def get(self, idx):
+        """Block until the batch with the given index is ready and return it.
+
+        The waiting thread sleeps on a condition variable, which is signalled by the fetcher
+        thread. A RuntimeError is raised if a worker process has died in the meantime.
+        """
+        with self._data_cond:
+            while idx not in self._data_buffer:
+                self._data_cond.wait(_WORKER_STATUS_CHECK_INTERVAL)
+                if idx not in self._data_buffer:
+                    self._check_workers()
+            return self._data_buffer.pop(idx)
+
+    def num_ready(self, indices):
+        """Number of batches with the given indices that are ready."""
+        with self._data_cond:
+            return sum(1 for idx in indices if idx in self._data_buffer)
+
+    def discard(self, indices):
+        """Drop the batches with the given indices, whether or not they are ready."""
+        with self._data_cond:
+            for idx in indices:
+                if self._data_buffer.pop(idx, None) is None:
+                    self._discarded.add(idx)
+
+    def _check_workers(self):
+        """Raise a RuntimeError if a worker process or the fetcher thread is not running.
+
+        The pool is then marked as broken, so that the data loader replaces it.
+        """
+        for worker in self._workers:
+            if worker.is_alive():
+                continue
+            self.broken = True
+            if isinstance(worker, threading.Thread):
+                raise RuntimeError('ShardedDataLoader worker thread {} exited '
+                                   'unexpectedly.'.format(worker.name))
+            raise RuntimeError('ShardedDataLoader worker (pid {}) exited unexpectedly '
+                               'with exit code {}.'.format(worker.pid, worker.exitcode))
+        if not self._fetcher.is_alive():
+            self.broken = True
+            raise RuntimeError('ShardedDataLoader fetcher thread exited unexpectedly.')
+
+    def shutdown(self):
+        """Shutdown internal workers by pushing terminate signals."""
+        if not self._shutdown:
+            for _ in range(len(self._workers)):
+                self._key_queue.put((None, None))
+            self._data_queue.put((None, None))
+            self._shutdown = True
+
+
+class _ShardedMultiWorkerIter(object):
+    """Interal multi-worker iterator for ShardedDataLoader."""
+    def __init__(self, worker_pool, batch_sampler, prefetch=0, profiler=None):
+        self._worker_pool = worker_pool
+        self._batch_sampler = batch_sampler
+        self._iter = iter(self._batch_sampler)
+        self._pending = collections.deque()
+        self._shutdown = False
+        self._profiler = profiler
+        self._last_return = None
+
         # pre-fetch
-        for _ in range(2 * self._num_workers):
+        for _ in range(prefetch):
             self._push_next()
 
     def __len__(self):
@@ -85,25 +303,34 @@ class _ShardedMultiWorkerIter(object):
 
     def _push_next(self):
         """Assign next batch workload to workers."""
+        start = time.time()
         r = next(self._iter, None)
         if r is None:
             return
-        self._key_queue.put((self._sent_idx, r))
-        self._sent_idx += 1
+        if self._profiler is not None:
+            self._profiler.record('sampler', start)
+        self._pending.append(self._worker_pool.submit(r))
 
     def __next__(self):
         assert not self._shutdown, 'call __next__ after shutdown is forbidden'
-        if self._rcvd_idx == self._sent_idx:
-            assert not self._data_buffer, 'Data buffer should be empty at this moment'
+        profiler = self._profiler
+        start = time.time()
+        if profiler is not None and self._last_return is not None:
+            profiler.record('consume', self._last_return, start)
+        self._push_next()
+        if not self._pending:
             self.shutdown()
             raise StopIteration
-
-        while True:
-            if self._rcvd_idx in self._data_buffer:
-                batch = self._data_buffer.pop(self._rcvd_idx)
-                self._rcvd_idx += 1
-                self._push_next()
-                return batch
+        if profiler is not None:
+            profiler.record_counter('in_flight', len(self._pending))
+            profiler.record_counter('ready', self._worker_pool.num_ready(self._pending))
+        batch = self._worker_pool.get(self._pending.popleft())
+        if isinstance(batch, Exception):
+            raise batch
+        if profiler is not None:
+            self._last_return = time.time()
+            profiler.record('wait', start, self._last_return)
+        return batch
 
     def next(self):
         return self.__next__()
@@ -112,11 +339,13 @@ class _ShardedMultiWorkerIter(object):
         return self
 
     def shutdown(self):
-        """Shutdown internal workers by pushing terminate signals."""
+        """Stop the iteration and drop the batches that are still in flight.
+
+        The worker processes are owned by the data loader and keep running.
+        """
         if not self._shutdown:
-            for _ in range(self._num_workers):
-                self._key_queue.put((None, None))
-            self._data_queue.put((None, None))
+            self._worker_pool.discard(self._pending)
+            self._pending.clear()
             self._shutdown = True
 
 
@@ -159,42 +388,98 @@ class ShardedDataLoader(DataLoader):
                     return nd.array(data, dtype=data.dtype)
 
     num_workers : int, default 0
-        The number of multiprocessing workers to use for data preprocessing.
-        `num_workers > 0` is not supported on Windows yet.
+        The number of workers to use for data preprocessing.
+        `num_workers > 0` with process workers is not supported on Windows yet.
     pin_memory : boolean, default False
         If ``True``, the dataloader will copy NDArrays into pinned memory
         before returning them. Copying from CPU pinned memory to GPU is faster
         than from normal CPU memory.
+    prefetch : int, default None
+        The number of batches prefetched by the workers, only used if `num_workers` > 0.
+        A larger number gives a smoother start of each epoch but consumes more shared
+        memory. Defaults to `2 * num_workers`.
+    slab_size : int or None, default 64MB
+        Size in bytes of the reusable shared-memory slabs used to send the batches from the
+        worker processes, only used if `num_workers` > 0. The workers write each batch into
+        a slab instead of pickling it. Larger batches are pickled. If None, all batches are
+        pickled.
+    worker_type : {'process', 'thread'}, default 'process'
+        Whether the workers are processes or threads. Threads avoid forking and copying the
+        batches between processes, and scale when the dataset and `batchify_fn` release the
+        GIL, e.g. in numpy or numba code with `nogil=True`.
+    profiler : PipelineProfiler, default None
+        If not None, the time spent in each stage of the data loading pipeline is recorded
+        in the profiler.
+
+    The workers are started at the first iteration and reused by the following
+    epochs. They are stopped when the data loader is garbage collected or when `shutdown`
+    is called.
     """
 
     def __init__(self, dataset, batch_size=None, shuffle=False, sampler=None,
                  last_batch=None, batch_sampler=None, batchify_fn=None,
-                 num_workers=0, pin_memory=False):
+                 num_workers=0, pin_memory=False, prefetch=None, slab_size=DEFAULT_SLAB_SIZE,
+                 worker_type='process', profiler=None):
         super(ShardedDataLoader, self).__init__(dataset, batch_size=batch_size, shuffle=shuffle,
                                                 sampler=sampler, last_batch=last_batch,
                                                 batch_sampler=batch_sampler,
                                                 batchify_fn=batchify_fn,
-                                                num_workers=num_workers,
+                                                num_workers=0,
                                                 pin_memory=pin_memory)
-
+        # The workers are managed by _ShardedWorkerPool. Passing them to DataLoader would
+        # start a multiprocessing pool that is never used.
+        self._num_workers = max(0, num_workers)
+        self._prefetch = max(0, int(prefetch) if prefetch is not None else 2 * self._num_workers)
+        self._slab_size = slab_size
+        assert worker_type in ['process', 'thread'], \
+            'worker_type must be "process" or "thread". Received {}'.format(worker_type)
+        self._worker_type = worker_type
+        self._profiler = profiler
+        self._persistent_pool = None
 
     def __iter__(self):
         if self._num_workers == 0:
             def _same_process_iter():
-                for batch in self._batch_sampler:
-                    if isinstance(batch[0], (list, tuple)):
-                        rets = [self._batchify_fn([self._dataset[idx] for idx in shard])
-                                for shard in batch]
-                        if self._pin_memory:
-                            rets = [_as_in_context(ret, context.cpu_pinned()) for ret in rets]
-                        yield rets
-                    else:
-                        ret = self._batchify_fn([self._dataset[idx] for idx in batch])
-                        if self._pin_memory:
-                            ret = _as_in_context(ret, context.cpu_pinned())
-                        yield ret
+                profiler = self._profiler
+                events = [] if profiler is not None else None
+                batch_iter = iter(self._batch_sampler)
+                while True:
+                    start = time.time()
+                    batch = next(batch_iter, None)
+                    if batch is None:
+                        return
+                    if profiler is not None:
+                        profiler.record('sampler', start)
+                    ret = _batchify_samples(self._dataset, batch, self._batchify_fn, events)
+                    if self._pin_memory:
+                        ret = _as_in_context(ret, context.cpu_pinned())
+                    if profiler is not None:
+                        profiler.record_events(events)
+                        del events[:]
+                        end = time.time()
+                        profiler.record('wait', start, end)
+                    yield ret
+                    if profiler is not None:
+                        profiler.record('consume', end)
             return _same_process_iter()
 
         # multi-worker
-        return _ShardedMultiWorkerIter(self._num_workers, self._dataset,
-                                       self._batchify_fn, self._batch_sampler, self._pin_memory)
+        if self._persistent_pool is not None and self._persistent_pool.broken:
+            # A worker died during a previous iteration, so a fresh pool is started
+            self.shutdown()
+        if self._persistent_pool is None:
+            self._persistent_pool = _ShardedWorkerPool(self._num_workers, self._dataset,
+                                                       self._batchify_fn, self._pin_memory,
+                                                       self._slab_size, self._worker_type,
+                                                       self._profiler)
+        return _ShardedMultiWorkerIter(self._persistent_pool, self._batch_sampler,
+                                       self._prefetch, self._profiler)
+
+    def __del__(self):
+        self.shutdown()
+
+    def shutdown(self):
+        """Shutdown the worker processes. They are started again by the next iteration."""
+        if getattr(self, '_persistent_pool', None) is not None:
+            self._persistent_pool.shutdown()
+            self._persistent_pool = None
@@ -22,16 +22,151 @@
 Files can be loaded into formats that are immediately ready for training and evaluation."""
 __all__ = ['TextLineDataset', 'CorpusDataset', 'LanguageModelDataset']
 
+import functools
 import io
+import itertools
+import logging
 import os
 import math
 
+import numpy as np
+
 import mxnet as mx
-from mxnet.gluon.data import SimpleDataset
-from .utils import (concat_sequence, slice_sequence, _slice_pad_length,
+from mxnet.gluon.data import Dataset, SimpleDataset
+from .utils import (concat_sequence, _slice_pad_length, _lookup_indices,
                     line_splitter, whitespace_splitter)
 
 
+_INDEX_CHUNK_SIZE = 1 << 24
+_NON_WHITESPACE = np.ones(256, dtype=bool)
+_NON_WHITESPACE[[ord(c) for c in ' \t\n\r\x0b\x0c']] = False
+
+
+def _build_line_index(buf):
+    """Index the lines of a byte buffer.
+
+    Parameters
+    ----------
+    buf : numpy.ndarray
+        The content of the file as an array of uint8, typically a memory map.
+
+    Returns
+    -------
+    starts : numpy.ndarray
+        Byte offset of the start of each line.
+    ends : numpy.ndarray
+        Byte offset of the end of each line, excluding the newline character.
+    nonempty : numpy.ndarray
+        Whether each line contains a character other than ASCII whitespace.
+    """
+    size = len(buf)
+    newlines = [np.flatnonzero(buf[begin:begin + _INDEX_CHUNK_SIZE] == ord('\n')) + begin
+                for begin in range(0, size, _INDEX_CHUNK_SIZE)]
+    newlines = np.concatenate(newlines + [np.zeros((0,), dtype=np.int64)]).astype(np.int64)
+    starts = np.concatenate([[0], newlines + 1]).astype(np.int64)
+    ends = np.concatenate([newlines, [size]]).astype(np.int64)
+    if starts[-1] == size:  # no line after the last newline
+        starts, ends = starts[:-1], ends[:-1]
+    nonempty = np.zeros(starts.shape, dtype=bool)
+    line = 0
+    while line < len(starts):
+        # Process whole lines of about _INDEX_CHUNK_SIZE bytes at once
+        last = max(line + 1, np.searchsorted(starts, starts[line] + _INDEX_CHUNK_SIZE))
+        stop = starts[last] if last < len(starts) else size
+        mask = _NON_WHITESPACE[buf[starts[line]:stop]]
+        nonempty[line:last] = np.logical_or.reduceat(mask, starts[line:last] - starts[line])
+        line = last
+    return starts, ends, nonempty
+
+
+def _load_line_index(filename, cache_index):
+    """Build the line index of a file, or load it from its sidecar file `filename.lineidx.npz`.
+
+    The sidecar file is only used if the size and modification time of the file did not change
+    since the index was saved.
+    """
+    stat = os.stat(filename)
+    index_filename = filename + '.lineidx.npz'
+    if cache_index and os.path.exists(index_filename):
+        with np.load(index_filename) as index:
+            if index['size'] == stat.st_size and index['mtime'] == stat.st_mtime:
+                return index['starts'], index['ends'], index['nonempty']
+    if stat.st_size:
+        starts, ends, nonempty = _build_line_index(np.memmap(filename, dtype=np.uint8, mode='r'))
+    else:
+        starts = ends = np.zeros((0,), dtype=np.int64)
+        nonempty = np.zeros((0,), dtype=bool)
+    if cache_index:
+        try:
+            with open(index_filename, 'wb') as f:
+                np.savez(f, starts=starts, ends=ends, nonempty=nonempty, size=stat.st_size,
+                         mtime=stat.st_mtime)
+        except (IOError, OSError) as e:
+            logging.warning('Cannot save the line index of %s: %s', filename, e)
+    return starts, ends, nonempty
+
+
+class _MemoryMappedLines(object):
+    """Sequence over the lines of text files, decoded and stripped on access.
+
+    The files are memory-mapped and only the byte offsets of their lines are kept in memory.
+    Lines are separated by '\\n', so the encoding must be ASCII compatible, e.g. utf8.
+
+    Parameters
+    ----------
+    filenames : list of str
+        Paths to the text files.
+    encoding : str
+        File encoding format.
+    skip_empty : bool
+        Whether to skip the lines that only contain ASCII whitespace.
+    cache_index : bool
+        Whether to save the line index of each file in a sidecar file and reuse it.
+    fn : callable or None
+        Function applied to each stripped line.
+    """
+    def __init__(self, filenames, encoding, skip_empty, cache_index, fn=None):
+        self._filenames = filenames
+        self._encoding = encoding
+        self._fn = fn
+        starts, ends = [], []
+        for filename in filenames:
+            file_starts, file_ends, nonempty = _load_line_index(filename, cache_index)
+            if skip_empty:
+                file_starts, file_ends = file_starts[nonempty], file_ends[nonempty]
+            starts.append(file_starts)
+            ends.append(file_ends)
+        self._file_offsets = np.cumsum([0] + [len(ele) for ele in starts])
+        self._starts = np.concatenate(starts)
+        self._ends = np.concatenate(ends)
+        self._buffers = None
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('Index {} is out of range for {} lines.'.format(idx, len(self)))
+        if self._buffers is None:
+            self._buffers = [np.memmap(filename, dtype=np.uint8, mode='r')
+                             if os.path.getsize(filename) else None
+                             for filename in self._filenames]
+        file_idx = np.searchsorted(self._file_offsets, idx, side='right') - 1
+        line = self._buffers[file_idx][self._starts[idx]:self._ends[idx]].tobytes()
+        line = line.decode(self._encoding).strip()
+        return line if self._fn is None else self._fn(line)
+
+    def __getstate__(self):
+        # The memory maps are reopened after unpickling instead of being copied
+        state = self.__dict__.copy()
+        state['_buffers'] = None
+        return state
+
+
 class TextLineDataset(SimpleDataset):
     """Dataset that comprises lines in a file. Each line will be stripped.
 
@@ -41,12 +176,24 @@ class TextLineDataset(SimpleDataset):
         Path to the input text file.
     encoding : str, default 'utf8'
         File encoding format.
+    lazy : bool, default False
+        If True, the file is memory-mapped and only the byte offsets of its lines are kept in
+        memory. Lines are decoded when they are accessed, which gives a fast startup and a
+        low memory usage for large files. Lines are separated by '\\n', so the encoding must
+        be ASCII compatible.
+    cache_index : bool, default False
+        Only used if `lazy` is True. If True, the line offsets are saved in the sidecar file
+        `filename.lineidx.npz` and reused as long as the file is not modified.
     """
-    def __init__(self, filename, encoding='utf8'):
-        lines = []
-        with io.open(filename, 'r', encoding=encoding) as in_file:
-            for line in in_file:
-                lines.append(line.strip())
+    def __init__(self, filename, encoding='utf8', lazy=False, cache_index=False):
+        if lazy:
+            lines = _MemoryMappedLines([os.path.expanduser(filename)], encoding,
+                                       skip_empty=False, cache_index=cache_index)
+        else:
+            lines = []
+            with io.open(filename, 'r', encoding=encoding) as in_file:
+                for line in in_file:
+                    lines.append(line.strip())
         super(TextLineDataset, self).__init__(lines)
 
 
@@ -58,6 +205,10 @@ def _corpus_dataset_process(s, bos, eos):
     return tokens
 
 
+def _corpus_dataset_tokenize(s, tokenizer, bos, eos):
+    return _corpus_dataset_process(tokenizer(s), bos, eos)
+
+
 class CorpusDataset(SimpleDataset):
     """Common text dataset that reads a whole corpus based on provided sample splitter
     and word tokenizer.
@@ -87,11 +238,25 @@ class CorpusDataset(SimpleDataset):
     eos : str or None, default None
         The token to add at the end of each sequence. If None, or if tokenizer is not
         specified, then nothing is added.
+    lazy : bool, default False
+        If True, the files are memory-mapped and only the byte offsets of their lines are kept
+        in memory. Each sample is a line, which is decoded and tokenized when it is accessed.
+        This gives a fast startup and a low memory usage for large corpora. Requires the
+        default `sample_splitter` and `flatten=False`. Lines are separated by '\\n', so the
+        encoding must be ASCII compatible, and `skip_empty` only skips the lines made of
+        ASCII whitespace.
+    cache_index : bool, default False
+        Only used if `lazy` is True. If True, the line offsets of each file are saved in the
+        sidecar file `filename.lineidx.npz` and reused as long as the file is not modified.
     """
     def __init__(self, filename, encoding='utf8', flatten=False, skip_empty=True,
                  sample_splitter=line_splitter, tokenizer=whitespace_splitter,
-                 bos=None, eos=None):
+                 bos=None, eos=None, lazy=False, cache_index=False):
         assert sample_splitter, 'sample_splitter must be specified.'
+        if lazy:
+            assert sample_splitter is line_splitter, \
+                'lazy CorpusDataset only supports the default sample_splitter.'
+            assert not flatten, 'lazy CorpusDataset does not support flatten=True.'
 
         if not isinstance(filename, (tuple, list)):
             filename = (filename, )
@@ -104,7 +269,15 @@ class CorpusDataset(SimpleDataset):
         self._tokenizer = tokenizer
         self._bos = bos
         self._eos = eos
-        super(CorpusDataset, self).__init__(self._read())
+        if lazy:
+            fn = None
+            if self._tokenizer:
+                fn = functools.partial(_corpus_dataset_tokenize, tokenizer=self._tokenizer,
+                                       bos=self._bos, eos=self._eos)
+            samples = _MemoryMappedLines(self._filenames, encoding, skip_empty, cache_index, fn)
+        else:
+            samples = self._read()
+        super(CorpusDataset, self).__init__(samples)
 
     def _read(self):
         all_samples = []
@@ -175,8 +348,9 @@ class LanguageModelDataset(CorpusDataset):
         the batches are discarded.
         """
         data = self._data[0]
-        sample_len = len(data) // batch_size
-        return mx.nd.array(vocab[data[:sample_len*batch_size]]).reshape(batch_size, -1).T
+        num_tokens = len(data) // batch_size * batch_size
+        return _batchify(_lookup_indices(vocab, itertools.islice(data, num_tokens), num_tokens),
+                         batch_size)
 
     def bptt_batchify(self, vocab, seq_len, batch_size, last_batch='keep'):
         """Transform the dataset into batches of numericalized samples, in the way that the
@@ -185,6 +359,9 @@ class LanguageModelDataset(CorpusDataset):
         Each sample is of shape `(seq_len, batch_size)`. When `last_batch='keep'`, the first
         dimension of last sample may be shorter than `seq_len`.
 
+        The corpus is numericalized into one int32 array. Each sample is sliced from it and
+        copied into NDArrays when it is accessed.
+
         Parameters
         ----------
         vocab : gluonnlp.Vocab
@@ -202,30 +379,88 @@ class LanguageModelDataset(CorpusDataset):
 
             - discard: The last batch is discarded if it's smaller than `(seq_len, batch_size)`.
         """
-        if last_batch not in ['keep', 'discard']:
-            raise ValueError(
-                'Got invalid last_batch: "{}". Must be "keep" or "discard".'.
-                format(last_batch))
-
+        _check_last_batch(last_batch)
+        data = self._data[0]
         if last_batch == 'keep':
             if not vocab.padding_token:
                 raise ValueError('vocab.padding_token must be specified '
                                  'in vocab when last_batch="keep".')
-            coded = vocab[self._data[0]]
-            sample_len = math.ceil(float(len(coded)) / batch_size)
-            padding_size = _slice_pad_length(sample_len, seq_len + 1, 1) * batch_size + \
-                sample_len * batch_size - len(coded)
-            coded.extend([vocab[vocab.padding_token]] * int(padding_size))
-            assert len(coded) % batch_size == 0
-            assert not _slice_pad_length(len(coded) / batch_size, seq_len + 1, 1)
+            # Numericalize the tokens and the padding directly into one array
+            padding_size = _bptt_padding_size(len(data), seq_len, batch_size)
+            tokens = itertools.chain(data, itertools.repeat(vocab.padding_token, padding_size))
+            coded = _lookup_indices(vocab, tokens, len(data) + padding_size)
+            padding_idx = vocab[vocab.padding_token]
         else:
-            sample_len = len(self._data[0]) // batch_size
-            coded = vocab[self._data[0][:sample_len * batch_size]]
-        data = mx.nd.array(coded).reshape((batch_size, -1)).T
-        batches = slice_sequence(data, seq_len + 1, overlap=1)
+            num_tokens = len(data) // batch_size * batch_size
+            coded = _lookup_indices(vocab, itertools.islice(data, num_tokens), num_tokens)
+            padding_idx = None
+        return _bptt_batchify(coded, seq_len, batch_size, last_batch, padding_idx)
+
+
+def _check_last_batch(last_batch):
+    if last_batch not in ['keep', 'discard']:
+        raise ValueError(
+            'Got invalid last_batch: "{}". Must be "keep" or "discard".'.
+            format(last_batch))
+
 
-        return SimpleDataset(batches).transform(_split_data_label)
+def _batchify(coded, batch_size):
+    """Reshape a flat array of token indices into `batch_size` independent sequences."""
+    sample_len = len(coded) // batch_size
+    return mx.nd.array(coded[:sample_len * batch_size],
+                       dtype=np.float32).reshape(batch_size, -1).T
 
 
-def _split_data_label(x):
-    return x[:-1, :], x[1:, :]
+def _bptt_padding_size(num_tokens, seq_len, batch_size):
+    """Number of padding tokens needed so that no token is discarded by `_bptt_batchify`."""
+    sample_len = int(math.ceil(float(num_tokens) / batch_size))
+    return _slice_pad_length(sample_len, seq_len + 1, 1) * batch_size + \
+        sample_len * batch_size - num_tokens
+
+
+def _bptt_batchify(coded, seq_len, batch_size, last_batch, padding_idx):
+    """Slice a flat array of token indices into batches for truncated back-propagation
+    through time. See `LanguageModelDataset.bptt_batchify`."""
+    if last_batch == 'keep':
+        padding_size = _bptt_padding_size(len(coded), seq_len, batch_size)
+        if padding_size:
+            coded = np.concatenate([coded, np.full((padding_size,), padding_idx,
+                                                   dtype=coded.dtype)])
+    else:
+        coded = coded[:len(coded) // batch_size * batch_size]
+    return _BPTTBatches(coded, seq_len, batch_size)
+
+
+class _BPTTBatches(Dataset):
+    """Batches of data and label for truncated back-propagation through time.
+
+    The flat array of token indices is viewed as a `(num_steps, batch_size)` matrix whose
+    columns are consecutive parts of the array. The i-th batch is the pair of row ranges
+    `[i * seq_len, (i + 1) * seq_len)` and `[i * seq_len + 1, (i + 1) * seq_len + 1)`, which
+    are only copied into NDArrays when the batch is accessed.
+
+    Parameters
+    ----------
+    coded : numpy.ndarray
+        The token indices, whose length is a multiple of `batch_size`.
+    seq_len : int
+        The length of each batch.
+    batch_size : int
+        The number of samples in each batch.
+    """
+    def __init__(self, coded, seq_len, batch_size):
+        self._data = coded.reshape((batch_size, -1)).T
+        self._seq_len = seq_len
+
+    def __len__(self):
+        return max(0, (len(self._data) - 1) // self._seq_len)
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('Index {} is out of range for {} batches.'.format(idx, len(self)))
+        start = idx * self._seq_len
+        data = self._data[start:start + self._seq_len]
+        label = self._data[start + 1:start + self._seq_len + 1]
+        return mx.nd.array(data, dtype=np.float32), mx.nd.array(label, dtype=np.float32)
@@ -43,21 +43,49 @@ class _WikiText(LanguageModelDataset):
     def __init__(self, namespace, segment, bos, eos, skip_empty, root,
                  **kwargs):
         root = os.path.expanduser(root)
-        if not os.path.isdir(root):
-            os.makedirs(root)
         self._root = root
         self._namespace = 'gluon/dataset/{}'.format(namespace)
         self._segment = segment
         super(_WikiText, self).__init__(self._get_data(), bos=bos, eos=eos,
                                         skip_empty=skip_empty, **kwargs)
 
+    @classmethod
+    def get_filename(cls, segment='train', root=None):
+        """Download a segment of the dataset if needed, and return the path to its file.
+
+        The file is not read, so that it can be passed to e.g.
+        `gluonnlp.data.load_numericalized_corpus` without tokenizing it.
+
+        Parameters
+        ----------
+        segment : {'train', 'val', 'test'}, default 'train'
+            Dataset segment.
+        root : str or None, default None
+            Path to the folder storing the data. If None, the default root of the dataset
+            is used.
+
+        Returns
+        -------
+        str
+            The path to the file of the segment.
+        """
+        if root is None:
+            root = os.path.join(_get_home_dir(), 'datasets', cls._name)
+        return cls._download('gluon/dataset/{}'.format(cls._name), segment,
+                             os.path.expanduser(root))
+
     def _get_data(self):
-        archive_file_name, archive_hash = self._archive_file
-        data_file_name, data_hash = self._data_file[self._segment]
-        root = self._root
+        return self._download(self._namespace, self._segment, self._root)
+
+    @classmethod
+    def _download(cls, namespace, segment, root):
+        if not os.path.isdir(root):
+            os.makedirs(root)
+        archive_file_name, archive_hash = cls._archive_file
+        data_file_name, data_hash = cls._data_file[segment]
         path = os.path.join(root, data_file_name)
         if not os.path.exists(path) or not check_sha1(path, data_hash):
-            downloaded_file_path = download(_get_repo_file_url(self._namespace, archive_file_name),
+            downloaded_file_path = download(_get_repo_file_url(namespace, archive_file_name),
                                             path=root,
                                             sha1_hash=archive_hash)
 
@@ -99,17 +127,19 @@ class WikiText2(_WikiText):
         MXNET_HOME defaults to '~/.mxnet'.
     """
 
+    _name = 'wikitext-2'
+    _archive_file = ('wikitext-2-v1.zip', '3c914d17d80b1459be871a5039ac23e752a53cbe')
+    _data_file = {'train': ('wiki.train.tokens',
+                            '863f29c46ef9d167fff4940ec821195882fe29d1'),
+                  'val': ('wiki.valid.tokens',
+                          '0418625c8b4da6e4b5c7a0b9e78d4ae8f7ee5422'),
+                  'test': ('wiki.test.tokens',
+                           'c7b8ce0aa086fb34dab808c5c49224211eb2b172')}
+
     def __init__(self, segment='train', skip_empty=True,
                  tokenizer=lambda s: s.split(),
                  bos=None, eos=C.EOS_TOKEN, root=os.path.join(
                      _get_home_dir(), 'datasets', 'wikitext-2'), **kwargs):
-        self._archive_file = ('wikitext-2-v1.zip', '3c914d17d80b1459be871a5039ac23e752a53cbe')
-        self._data_file = {'train': ('wiki.train.tokens',
-                                     '863f29c46ef9d167fff4940ec821195882fe29d1'),
-                           'val': ('wiki.valid.tokens',
-                                   '0418625c8b4da6e4b5c7a0b9e78d4ae8f7ee5422'),
-                           'test': ('wiki.test.tokens',
-                                    'c7b8ce0aa086fb34dab808c5c49224211eb2b172')}
         super(WikiText2,
               self).__init__('wikitext-2', segment, bos, eos, skip_empty, root,
                              tokenizer=tokenizer, **kwargs)
@@ -142,20 +172,22 @@ class WikiText103(_WikiText):
         MXNET_HOME defaults to '~/.mxnet'.
     """
 
+    _name = 'wikitext-103'
+    _archive_file = ('wikitext-103-v1.zip',
+                     '0aec09a7537b58d4bb65362fee27650eeaba625a')
+    _data_file = {
+        'train': ('wiki.train.tokens',
+                  'b7497e2dfe77e72cfef5e3dbc61b7b53712ac211'),
+        'val': ('wiki.valid.tokens',
+                'c326ac59dc587676d58c422eb8a03e119582f92b'),
+        'test': ('wiki.test.tokens',
+                 '8a5befc548865cec54ed4273cf87dbbad60d1e47')
+    }
+
     def __init__(self, segment='train', skip_empty=True,
                  tokenizer=lambda s: s.split(),
                  bos=None, eos=C.EOS_TOKEN, root=os.path.join(
                      _get_home_dir(), 'datasets', 'wikitext-103'), **kwargs):
-        self._archive_file = ('wikitext-103-v1.zip',
-                              '0aec09a7537b58d4bb65362fee27650eeaba625a')
-        self._data_file = {
-            'train': ('wiki.train.tokens',
-                      'b7497e2dfe77e72cfef5e3dbc61b7b53712ac211'),
-            'val': ('wiki.valid.tokens',
-                    'c326ac59dc587676d58c422eb8a03e119582f92b'),
-            'test': ('wiki.test.tokens',
-                     '8a5befc548865cec54ed4273cf87dbbad60d1e47')
-        }
         super(WikiText103,
               self).__init__('wikitext-103', segment, bos, eos, skip_empty,
                              root, tokenizer=tokenizer, **kwargs)
@@ -190,21 +222,22 @@ class WikiText2Raw(_WikiText):
         MXNET_HOME defaults to '~/.mxnet'.
     """
 
+    _name = 'wikitext-2'
+    _archive_file = ('wikitext-2-raw-v1.zip',
+                     '3b6993c138fc61c95f7fffd900fef68f8411371d')
+    _data_file = {
+        'train': ('wiki.train.raw',
+                  'd33faf256327882db0edc7c67cd098d1051a2112'),
+        'val': ('wiki.valid.raw',
+                'db78d4db83700cba1b1bf4a9381087043db2876d'),
+        'test': ('wiki.test.raw',
+                 '6f1fe2054a940eebfc76b284b09680763b37f5ea')
+    }
+
     def __init__(self, segment='train', skip_empty=True, bos=None, eos=None,
                  tokenizer=lambda s: s.encode('utf-8'),
                  root=os.path.join(_get_home_dir(), 'datasets',
                                    'wikitext-2'), **kwargs):
-        self._archive_file = ('wikitext-2-raw-v1.zip',
-                              '3b6993c138fc61c95f7fffd900fef68f8411371d')
-        self._data_file = {
-            'train': ('wiki.train.raw',
-                      'd33faf256327882db0edc7c67cd098d1051a2112'),
-            'val': ('wiki.valid.raw',
-                    'db78d4db83700cba1b1bf4a9381087043db2876d'),
-            'test': ('wiki.test.raw',
-                     '6f1fe2054a940eebfc76b284b09680763b37f5ea')
-        }
-
         super(WikiText2Raw,
               self).__init__('wikitext-2', segment, bos, eos, skip_empty, root,
                              tokenizer=tokenizer, **kwargs)
@@ -239,26 +272,29 @@ class WikiText103Raw(_WikiText):
         MXNET_HOME defaults to '~/.mxnet'.
     """
 
+    _name = 'wikitext-103'
+    _archive_file = ('wikitext-103-raw-v1.zip',
+                     '86f2375181b9247049d9c9205fad2b71b274b568')
+    _data_file = {
+        'train': ('wiki.train.raw',
+                  '3d06627c15e834408cfee91293f862c11c1cc9ef'),
+        'val': ('wiki.valid.raw',
+                'db78d4db83700cba1b1bf4a9381087043db2876d'),
+        'test': ('wiki.test.raw',
+                 '6f1fe2054a940eebfc76b284b09680763b37f5ea')
+    }
+
     def __init__(self, segment='train', skip_empty=True,
                  tokenizer=lambda s: s.encode('utf-8'), bos=None,
                  eos=None, root=os.path.join(_get_home_dir(), 'datasets',
                                              'wikitext-103'), **kwargs):
-        self._archive_file = ('wikitext-103-raw-v1.zip',
-                              '86f2375181b9247049d9c9205fad2b71b274b568')
-        self._data_file = {
-            'train': ('wiki.train.raw',
-                      '3d06627c15e834408cfee91293f862c11c1cc9ef'),
-            'val': ('wiki.valid.raw',
-                    'db78d4db83700cba1b1bf4a9381087043db2876d'),
-            'test': ('wiki.test.raw',
-                     '6f1fe2054a940eebfc76b284b09680763b37f5ea')
-        }
         super(WikiText103Raw,
               self).__init__('wikitext-103', segment, bos, eos, skip_empty,
                              root, tokenizer=tokenizer, **kwargs)
 
 class _GBWStream(LanguageModelStream):
-    def __init__(self, namespace, segment, bos, eos, skip_empty, root):
+    def __init__(self, namespace, segment, bos, eos, skip_empty, root, num_parts=1,
+                 part_index=0):
         """Directory layout:
            - root ($MXNET_HOME/datasets/gbw)
              - archive_file (1-billion-word-language-modeling-benchmark-r13output.tar.gz)
@@ -279,7 +315,8 @@ class _GBWStream(LanguageModelStream):
         self._get_data()
         sampler = 'sequential' if segment != 'train' else 'random'
         super(_GBWStream, self).__init__(self._file_pattern, skip_empty=skip_empty, bos=bos,
-                                         eos=eos, sampler=sampler, file_sampler=sampler)
+                                         eos=eos, sampler=sampler, file_sampler=sampler,
+                                         num_parts=num_parts, part_index=part_index)
 
     def _get_data(self):
         archive_file_name, archive_hash = self._archive_data
@@ -344,9 +381,15 @@ class GBWStream(_GBWStream):
     root : str, default '$MXNET_HOME/datasets/gbw'
         Path to temp folder for storing data.
         MXNET_HOME defaults to '~/.mxnet'.
+    num_parts : int, default 1
+        The number of parts the files are partitioned into, e.g. the number of training
+        processes. See `CorpusStream`.
+    part_index : int, default 0
+        The index of the part to stream, in [0, num_parts).
     """
     def __init__(self, segment='train', skip_empty=True, bos=C.BOS_TOKEN, eos=C.EOS_TOKEN,
-                 root=os.path.join(_get_home_dir(), 'datasets', 'gbw')):
+                 root=os.path.join(_get_home_dir(), 'datasets', 'gbw'), num_parts=1,
+                 part_index=0):
         self._archive_data = ('1-billion-word-language-modeling-benchmark-r13output.tar.gz',
                               '4df859766482e12264a5a9d9fb7f0e276020447d')
         self._archive_vocab = ('gbw-b3e83215.zip',
@@ -359,7 +402,8 @@ class GBWStream(_GBWStream):
                                     '0a8e2b7496ba0b5c05158f282b9b351356875445')}
         self._vocab_file = ('gbw-b3e83215.vocab',
                             'b3e832155eb66018b8dfe0b77c00b498c29bed67')
-        super(GBWStream, self).__init__('gbw', segment, bos, eos, skip_empty, root)
+        super(GBWStream, self).__init__('gbw', segment, bos, eos, skip_empty, root,
+                                        num_parts, part_index)
 
     @property
     def vocab(self):
@@ -0,0 +1,366 @@
+# coding: utf-8
+
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Numericalized corpora stored as flat arrays, and their on-disk cache."""
+__all__ = ['NumericalizedCorpus', 'load_numericalized_corpus', 'load_corpus_counter']
+
+import hashlib
+import itertools
+import json
+import logging
+import os
+
+import numpy as np
+
+from mxnet.gluon.data import Dataset
+from .dataset import CorpusDataset, _batchify, _bptt_batchify, _check_last_batch
+from .utils import Counter, count_tokens, line_splitter, whitespace_splitter, _get_home_dir
+
+
+class NumericalizedCorpus(Dataset):
+    """A corpus of numericalized sentences stored as two flat arrays.
+
+    The token indices of all sentences are concatenated in one int32 array, and sentence `i`
+    is `tokens[offsets[i]:offsets[i + 1]]`. Sentences are returned as numpy views of the flat
+    array, which can be memory-mapped from the files written by `save`.
+
+    The corpus is a valid input to `gluonnlp.data.ContextSampler`, and can be batchified
+    for language modeling in the same way as `LanguageModelDataset`.
+
+    Parameters
+    ----------
+    tokens : numpy.ndarray
+        The int32 token indices of all sentences, of shape (num_tokens,).
+    offsets : numpy.ndarray
+        The int64 start offset of each sentence in `tokens`, followed by `num_tokens`. Its
+        shape is (num_sentences + 1,).
+    """
+    def __init__(self, tokens, offsets):
+        assert tokens.ndim == 1 and offsets.ndim == 1 and len(offsets) >= 1, \
+            'tokens and offsets must be one dimensional and offsets must not be empty.'
+        assert offsets[0] == 0 and offsets[-1] == len(tokens), \
+            'offsets must start with 0 and end with the number of tokens.'
+        self._tokens = tokens
+        self._offsets = offsets
+
+    @property
+    def tokens(self):
+        """The flat array of the token indices of all sentences."""
+        return self._tokens
+
+    @property
+    def offsets(self):
+        """The start offsets of the sentences, followed by the number of tokens."""
+        return self._offsets
+
+    @property
+    def num_tokens(self):
+        """The total number of tokens in the corpus."""
+        return len(self._tokens)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('Index {} is out of range for {} sentences.'.format(idx, len(self)))
+        return self._tokens[self._offsets[idx]:self._offsets[idx + 1]]
+
+    @staticmethod
+    def from_samples(samples, vocab):
+        """Numericalize a corpus of tokenized samples.
+
+        Parameters
+        ----------
+        samples : Dataset or list of list of str
+            The tokenized sentences, e.g. a `CorpusDataset`.
+        vocab : gluonnlp.Vocab
+            The vocabulary used to map each token to its index.
+
+        Returns
+        -------
+        NumericalizedCorpus
+        """
+        tokens, offsets = vocab.encode_batch(list(samples))
+        return NumericalizedCorpus(tokens, offsets)
+
+    def save(self, prefix):
+        """Save the corpus to the files `prefix.tokens.npy` and `prefix.offsets.npy`.
+
+        Parameters
+        ----------
+        prefix : str
+            Path prefix of the files to write.
+        """
+        for suffix, array in [('.tokens.npy', self._tokens), ('.offsets.npy', self._offsets)]:
+            # Write to a temporary file first so that readers never see a partial file
+            tmp_path = '{}{}.{}.tmp'.format(prefix, suffix, os.getpid())
+            with open(tmp_path, 'wb') as f:
+                np.save(f, array)
+            os.rename(tmp_path, prefix + suffix)
+
+    @staticmethod
+    def load(prefix, mmap=True):
+        """Load a corpus saved with `save`.
+
+        Parameters
+        ----------
+        prefix : str
+            Path prefix of the files passed to `save`.
+        mmap : bool, default True
+            Whether to memory-map the files instead of reading them into memory.
+
+        Returns
+        -------
+        NumericalizedCorpus
+        """
+        arrays = []
+        for suffix in ['.tokens.npy', '.offsets.npy']:
+            try:
+                arrays.append(np.load(prefix + suffix, mmap_mode='r' if mmap else None))
+            except ValueError:  # empty arrays cannot be memory-mapped
+                arrays.append(np.load(prefix + suffix))
+        return NumericalizedCorpus(*arrays)
+
+    def batchify(self, batch_size):
+        """Transform the corpus into N independent sequences, where N is the batch size.
+
+        See `LanguageModelDataset.batchify`. The sentences are concatenated.
+
+        Parameters
+        ----------
+        batch_size : int
+            The number of samples in each batch.
+
+        Returns
+        -------
+        NDArray of shape (num_tokens // N, N). Excessive tokens that don't align along
+        the batches are discarded.
+        """
+        return _batchify(self._tokens, batch_size)
+
+    def bptt_batchify(self, seq_len, batch_size, last_batch='keep', padding_idx=None):
+        """Transform the corpus into batches of samples for truncated back-propagation through
+        time.
+
+        See `LanguageModelDataset.bptt_batchify`. The sentences are concatenated.
+
+        Parameters
+        ----------
+        seq_len : int
+            The length of each of the samples for truncated back-propagation-through-time (TBPTT).
+        batch_size : int
+            The number of samples in each batch.
+        last_batch : {'keep', 'discard'}
+            How to handle the last batch if the remaining length is less than `seq_len`.
+
+            - keep: A batch with less samples than previous batches is returned. `padding_idx`
+              is used to pad the last batch based on batch size.
+
+            - discard: The last batch is discarded if it's smaller than `(seq_len, batch_size)`.
+        padding_idx : int or None, default None
+            The index used for padding. Must be specified when `last_batch='keep'`.
+        """
+        _check_last_batch(last_batch)
+        if last_batch == 'keep' and padding_idx is None:
+            raise ValueError('padding_idx must be specified when last_batch="keep".')
+        return _bptt_batchify(self._tokens, seq_len, batch_size, last_batch, padding_idx)
+
+
+def _callable_name(fn):
+    """Name of a function, or of the class of a callable object, to be used in cache keys."""
+    if fn is None:
+        return None
+    name = getattr(fn, '__qualname__', getattr(fn, '__name__', None))
+    if name is None:
+        name = type(fn).__name__
+    return '{}.{}'.format(getattr(fn, '__module__', type(fn).__module__), name)
+
+
+_FILE_SHA1S = {}
+
+
+def _file_sha1(filename, chunk_size=1 << 20):
+    # The counter and the corpus of a file are usually loaded in the same process, so the hash
+    # is kept until the file changes
+    stat = os.stat(filename)
+    file_key = (os.path.abspath(filename), stat.st_size,
+                getattr(stat, 'st_mtime_ns', stat.st_mtime))
+    if file_key not in _FILE_SHA1S:
+        sha1 = hashlib.sha1()
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                sha1.update(chunk)
+        _FILE_SHA1S[file_key] = sha1.hexdigest()
+    return _FILE_SHA1S[file_key]
+
+
+def _vocab_sha1(vocab):
+    content = json.dumps([vocab.unknown_token, vocab.idx_to_token])
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def _cache_prefix(root, filenames, **kwargs):
+    """Path prefix of the cache files of a corpus read with the arguments in `kwargs`."""
+    key = json.dumps(dict(files=[_file_sha1(f) for f in filenames], **kwargs), sort_keys=True)
+    key = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return os.path.join(root, '{}-{}'.format(os.path.basename(filenames[0]), key[:16]))
+
+
+def load_numericalized_corpus(filename, vocab, encoding='utf8', skip_empty=True,
+                              sample_splitter=line_splitter, tokenizer=whitespace_splitter,
+                              bos=None, eos=None, tokenizer_name=None,
+                              root=os.path.join(_get_home_dir(), 'datasets', 'numericalized')):
+    """Read and numericalize a corpus, or load it from the cache if it was done before.
+
+    The corpus is read as a `CorpusDataset` with the given arguments and numericalized with
+    `vocab`. The result is saved in `root` and memory-mapped by the following calls with the
+    same corpus files, tokenizer and vocabulary, which skips reading, tokenizing and looking up
+    the corpus.
+
+    The cache key is computed from the SHA-1 of the content of the files, the reading
+    arguments, the name of the tokenizer and sample splitter, and the tokens of the vocabulary.
+    The configuration of a tokenizer object is not part of the key, so pass a distinct
+    `tokenizer_name` for tokenizers of the same class that tokenize differently.
+
+    Parameters
+    ----------
+    filename : str or list of str
+        Path to the input text file or list of paths to the input text files.
+    vocab : gluonnlp.Vocab
+        The vocabulary used to map each token to its index.
+    encoding : str, default 'utf8'
+        File encoding format.
+    skip_empty : bool, default True
+        Whether to skip the empty samples produced from sample_splitters.
+    sample_splitter : function, default str.splitlines
+        A function that splits the dataset string into samples.
+    tokenizer : function, default str.split
+        A function that splits each sample string into list of tokens.
+    bos : str or None, default None
+        The token to add at the begining of each sentence. If None, nothing is added.
+    eos : str or None, default None
+        The token to add at the end of each sentence. If None, nothing is added.
+    tokenizer_name : str or None, default None
+        The name of the tokenizer in the cache key. If None, the qualified name of the tokenizer
+        function or class is used.
+    root : str, default '$MXNET_HOME/datasets/numericalized'
+        Path to the folder storing the cached corpora.
+        MXNET_HOME defaults to '~/.mxnet'.
+
+    Returns
+    -------
+    NumericalizedCorpus
+        The numericalized corpus. It is memory-mapped if it was loaded from the cache.
+    """
+    assert tokenizer, 'Tokenizer must be specified for numericalizing a corpus.'
+    if not isinstance(filename, (tuple, list)):
+        filename = (filename, )
+    filenames = [os.path.expanduser(f) for f in filename]
+    root = os.path.expanduser(root)
+    prefix = _cache_prefix(root, filenames, encoding=encoding, skip_empty=skip_empty,
+                           sample_splitter=_callable_name(sample_splitter),
+                           tokenizer=tokenizer_name or _callable_name(tokenizer),
+                           bos=bos, eos=eos, vocab=_vocab_sha1(vocab))
+
+    if os.path.exists(prefix + '.tokens.npy') and os.path.exists(prefix + '.offsets.npy'):
+        return NumericalizedCorpus.load(prefix)
+
+    samples = CorpusDataset(filenames, encoding=encoding, skip_empty=skip_empty,
+                            sample_splitter=sample_splitter, tokenizer=tokenizer, bos=bos,
+                            eos=eos)
+    corpus = NumericalizedCorpus.from_samples(samples, vocab)
+    try:
+        if not os.path.exists(root):
+            os.makedirs(root)
+        corpus.save(prefix)
+    except (IOError, OSError) as e:
+        logging.warning('Cannot save the numericalized corpus to %s: %s', prefix, e)
+    return corpus
+
+
+def load_corpus_counter(filename, encoding='utf8', skip_empty=True,
+                        sample_splitter=line_splitter, tokenizer=whitespace_splitter,
+                        bos=None, eos=None, tokenizer_name=None,
+                        root=os.path.join(_get_home_dir(), 'datasets', 'numericalized')):
+    """Count the tokens of a corpus, or load the counts from the cache if it was done before.
+
+    The counter is used to build the vocabulary passed to `load_numericalized_corpus`, so that
+    a run whose corpus is cached does not read or tokenize the corpus at all. It is cached in
+    `root` as a JSON file, with a key computed as in `load_numericalized_corpus` without the
+    vocabulary.
+
+    Parameters
+    ----------
+    filename : str or list of str
+        Path to the input text file or list of paths to the input text files.
+    encoding : str, default 'utf8'
+        File encoding format.
+    skip_empty : bool, default True
+        Whether to skip the empty samples produced from sample_splitters.
+    sample_splitter : function, default str.splitlines
+        A function that splits the dataset string into samples.
+    tokenizer : function, default str.split
+        A function that splits each sample string into list of tokens.
+    bos : str or None, default None
+        The token to add at the begining of each sentence. If None, nothing is added.
+    eos : str or None, default None
+        The token to add at the end of each sentence. If None, nothing is added.
+    tokenizer_name : str or None, default None
+        The name of the tokenizer in the cache key. If None, the qualified name of the tokenizer
+        function or class is used.
+    root : str, default '$MXNET_HOME/datasets/numericalized'
+        Path to the folder storing the cached counters.
+        MXNET_HOME defaults to '~/.mxnet'.
+
+    Returns
+    -------
+    Counter
+        The number of occurrences of each token in the corpus.
+    """
+    assert tokenizer, 'Tokenizer must be specified for counting the tokens of a corpus.'
+    if not isinstance(filename, (tuple, list)):
+        filename = (filename, )
+    filenames = [os.path.expanduser(f) for f in filename]
+    root = os.path.expanduser(root)
+    prefix = _cache_prefix(root, filenames, encoding=encoding, skip_empty=skip_empty,
+                           sample_splitter=_callable_name(sample_splitter),
+                           tokenizer=tokenizer_name or _callable_name(tokenizer),
+                           bos=bos, eos=eos)
+    path = prefix + '.counter.json'
+
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return Counter(dict(json.load(f)))
+
+    samples = CorpusDataset(filenames, encoding=encoding, skip_empty=skip_empty,
+                            sample_splitter=sample_splitter, tokenizer=tokenizer, bos=bos,
+                            eos=eos)
+    counter = count_tokens(itertools.chain.from_iterable(samples))
+    try:
+        if not os.path.exists(root):
+            os.makedirs(root)
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump(list(counter.items()), f)
+        os.rename(tmp_path, path)
+    except (IOError, OSError) as e:
+        logging.warning('Cannot save the token counts to %s: %s', path, e)
+    return counter
@@ -0,0 +1,163 @@
+# coding: utf-8
+
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Timing instrumentation of the data loading pipelines."""
+__all__ = ['PipelineProfiler']
+
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+
+def _make_event(name, start, end):
+    """Create a timing event of the current process and thread."""
+    return (name, start, end - start, os.getpid(), threading.current_thread().ident)
+
+
+class PipelineProfiler(object):
+    """Records where the time goes in a data loading pipeline.
+
+    Pass a profiler to `ShardedDataLoader` or `PrefetchingStream` to record the wall time of
+    each stage of the pipeline. Stages running in worker processes or threads are timed
+    there and reported together with the batch. The following stages are recorded:
+
+    - sampler: drawing the sample indices of a batch from the batch sampler.
+    - getitem: reading the samples of a batch from the dataset.
+    - batchify: merging the samples of a batch with `batchify_fn`.
+    - stream: drawing an element from the source stream of a `PrefetchingStream`.
+    - transfer: moving a batch from a worker to the consumer, including the queue and the
+      shared memory copies.
+    - wait: blocking in the consumer until the next batch is available.
+    - consume: the time spent by the consumer between two batches, e.g. in the training loop.
+
+    The number of batches that are requested but not yet consumed (in_flight) and that are
+    ready to be consumed (ready) are recorded as counters whenever a batch is consumed.
+
+    The training loop is input-bound if the consumer spends a large fraction of its time
+    waiting for batches, i.e. if `wait_fraction` of the summary is close to 1.
+
+    Examples
+    --------
+    >>> profiler = gluonnlp.data.PipelineProfiler()
+    >>> loader = gluonnlp.data.ShardedDataLoader(dataset, batch_size, num_workers=4,
+    ...                                          profiler=profiler)  # doctest: +SKIP
+    >>> for batch in loader:  # doctest: +SKIP
+    ...     train(batch)
+    >>> print(profiler)  # doctest: +SKIP
+    >>> profiler.export_chrome_trace('trace.json')  # doctest: +SKIP
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = []
+        self._counters = []
+
+    def record(self, name, start, end=None):
+        """Record a stage of the current thread that started at `start`.
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage.
+        start : float
+            Start time of the stage, as returned by `time.time()`.
+        end : float, default None
+            End time of the stage. Defaults to the current time.
+        """
+        self.record_events([_make_event(name, start, time.time() if end is None else end)])
+
+    def record_events(self, events):
+        """Record events created in another thread or process."""
+        with self._lock:
+            self._events.extend(events)
+
+    def record_counter(self, name, value):
+        """Record the current value of a counter, such as a queue depth."""
+        with self._lock:
+            self._counters.append((name, time.time(), value, os.getpid()))
+
+    def reset(self):
+        """Forget all recorded events and counters."""
+        with self._lock:
+            self._events = []
+            self._counters = []
+
+    def summary(self):
+        """Statistics of the recorded stages and counters.
+
+        Returns
+        -------
+        summary : dict
+            The 'stages' entry maps each stage to the count, total, mean and max of its wall
+            time in seconds. The 'counters' entry maps each counter to its mean and max.
+            'wait_fraction' is the fraction of the consumer time spent waiting for batches.
+        """
+        with self._lock:
+            events = list(self._events)
+            counters = list(self._counters)
+        stages = {}
+        for name in sorted(set(event[0] for event in events)):
+            durations = np.array([event[2] for event in events if event[0] == name])
+            stages[name] = {'count': len(durations), 'total': durations.sum(),
+                            'mean': durations.mean(), 'max': durations.max()}
+        counter_stats = {}
+        for name in sorted(set(counter[0] for counter in counters)):
+            values = np.array([counter[2] for counter in counters if counter[0] == name])
+            counter_stats[name] = {'mean': values.mean(), 'max': values.max()}
+        wait = stages['wait']['total'] if 'wait' in stages else 0.0
+        consume = stages['consume']['total'] if 'consume' in stages else 0.0
+        wait_fraction = wait / (wait + consume) if wait + consume > 0 else 0.0
+        return {'stages': stages, 'counters': counter_stats, 'wait_fraction': wait_fraction}
+
+    def __str__(self):
+        summary = self.summary()
+        lines = ['{:<10}{:>8}{:>12}{:>12}{:>12}'.format('Stage', 'Count', 'Total (s)',
+                                                       'Mean (ms)', 'Max (ms)')]
+        for name, stats in sorted(summary['stages'].items()):
+            lines.append('{:<10}{:>8}{:>12.3f}{:>12.3f}{:>12.3f}'.format(
+                name, stats['count'], stats['total'], stats['mean'] * 1000,
+                stats['max'] * 1000))
+        for name, stats in sorted(summary['counters'].items()):
+            lines.append('{:<10} mean {:.2f}, max {}'.format(name, stats['mean'], stats['max']))
+        lines.append('Fraction of consumer time spent waiting: {:.1%}'.format(
+            summary['wait_fraction']))
+        return '\n'.join(lines)
+
+    def export_chrome_trace(self, path):
+        """Write the recorded events in the Chrome trace event format.
+
+        The trace can be inspected with chrome://tracing or https://ui.perfetto.dev.
+
+        Parameters
+        ----------
+        path : str
+            Path of the JSON file to write.
+        """
+        with self._lock:
+            events = list(self._events)
+            counters = list(self._counters)
+        trace = [{'name': name, 'cat': 'data', 'ph': 'X', 'ts': start * 1e6,
+                  'dur': duration * 1e6, 'pid': pid, 'tid': tid}
+                 for name, start, duration, pid, tid in events]
+        trace.extend({'name': name, 'cat': 'data', 'ph': 'C', 'ts': timestamp * 1e6,
+                      'pid': pid, 'args': {name: value}}
+                     for name, timestamp, value, pid in counters)
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': trace}, f)
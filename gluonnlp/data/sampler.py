@@ -540,7 +540,7 @@ class ContextSampler(Sampler):
 
     Parameters
     ----------
-    coded : list of lists of int
+    coded : list of lists of int or NumericalizedCorpus
         List of coded sentences. A coded sentence itself is a list of token
         indices. Context samples do not cross sentence boundaries.
     batch_size : int
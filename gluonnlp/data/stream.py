@@ -22,23 +22,29 @@
 corpora and dataset files. Files can be streamed into formats that are
 ready for training and evaluation."""
 __all__ = ['DataStream', 'CorpusStream', 'LanguageModelStream', 'SimpleDataStream',
-           'PrefetchingStream', 'ContextStream']
+           'PrefetchingStream', 'ContextStream', 'count_corpus_tokens']
 
+import functools
 import glob
 import itertools
 import multiprocessing
+import multiprocessing.pool
 import os
 import random
 import threading
+import time
 
 import numpy as np
 
 import mxnet as mx
-from mxnet.gluon.data import RandomSampler, SequentialSampler
+from mxnet.gluon.data import RandomSampler, SequentialSampler, SimpleDataset
 
+from ._shared_memory import SlabPool, DEFAULT_SLAB_SIZE
 from .dataset import CorpusDataset
+from .numericalized import NumericalizedCorpus
+from .profiler import _make_event
 from .sampler import ContextSampler
-from .utils import line_splitter, whitespace_splitter
+from .utils import concat_sequence, count_tokens, line_splitter, whitespace_splitter
 
 try:
     import Queue as queue
@@ -72,17 +78,41 @@ class DataStream(object):
         """
         raise NotImplementedError
 
-    def transform(self, fn):
+    def transform(self, fn, num_workers=0, ordered=True, worker_type='thread',
+                  num_prefetch=None):
         """Transform a DataStream lazily.
 
+        If `num_workers` is greater 0, `fn` is applied in parallel to a bounded window of
+        upcoming elements by a pool of worker threads or processes.
+
+        Parameters
+        ----------
+        fn : callable
+            The function applied to each element. Tuple elements are unpacked as arguments.
+            It must be picklable, e.g. a module-level function, if `worker_type` is 'process'.
+        num_workers : int, default 0
+            Number of workers applying `fn`. If 0, `fn` is applied in the consumer thread.
+        ordered : bool, default True
+            Whether to return the transformed elements in the order of the stream. If False,
+            they are returned as soon as they are transformed.
+        worker_type : 'thread' or 'process', default 'thread'
+            Use Python Threads or Processes as workers.
+        num_prefetch : int or None, default None
+            Maximum number of elements transformed or waiting to be returned ahead of the
+            consumer. Defaults to `2 * num_workers`.
+
         Returns
         -------
         DataStream
             The data stream that lazily transforms the data while streaming.
         """
-
+        if num_workers:
+            return _ParallelTransformDataStream(self, fn, num_workers, ordered=ordered,
+                                                worker_type=worker_type,
+                                                num_prefetch=num_prefetch)
         return _LazyTransformDataStream(self, fn)
 
+
 class DatasetStream(DataStream):
     """Abstract Dataset Stream Interface.
 
@@ -111,9 +141,26 @@ class SimpleDataStream(DataStream):
     """
     def __init__(self, iterable):
         self._stream = iterable
+        self._position = 0
+        self._resume = False
+
+    def state_dict(self):
+        """Return the number of elements returned by the current iteration."""
+        return {'position': self._position}
+
+    def load_state_dict(self, state):
+        """Skip the first `state['position']` elements in the next iteration."""
+        self._position = state['position']
+        self._resume = True
 
     def __iter__(self):
-        return iter(self._stream)
+        start = self._position if self._resume else 0
+        self._resume = False
+        self._position = start
+        for item in itertools.islice(self._stream, start, None):
+            self._position += 1
+            yield item
+        self._position = 0
 
 
 class _LazyTransformDataStream(DataStream):
@@ -122,6 +169,14 @@ class _LazyTransformDataStream(DataStream):
         self._stream = stream
         self._fn = fn
 
+    def state_dict(self):
+        """Return the state of the transformed stream."""
+        return self._stream.state_dict()
+
+    def load_state_dict(self, state):
+        """Restore the state of the transformed stream."""
+        self._stream.load_state_dict(state)
+
     def __iter__(self):
         stream_iter = iter(self._stream)
         try:
@@ -139,6 +194,237 @@ class _LazyTransformDataStream(DataStream):
                 yield self._fn(item)
 
 
+def _is_resumable(stream):
+    """Whether the position of the stream can be saved with `state_dict()`."""
+    while isinstance(stream, (_LazyTransformDataStream, _ParallelTransformDataStream,
+                             PrefetchingStream)):
+        stream = stream._stream
+    return hasattr(stream, 'state_dict')
+
+
+# The function of a transform worker process, installed once by _transform_worker_init
+_worker_transform_fn = None
+
+
+def _transform_worker_init(fn, seed, np_seed, mx_seed):
+    """Initialize the transform function and random states of a transform worker process."""
+    global _worker_transform_fn  # pylint: disable=global-statement
+    _worker_transform_fn = fn
+    # Forked workers inherit the same random states, so they are made distinct by the pid
+    pid = os.getpid()
+    random.seed(seed + pid)
+    np.random.seed((np_seed + pid) % 2**32)
+    mx.random.seed((mx_seed + pid) % 2**32)
+
+
+def _transform_element(fn, idx, item):
+    """Apply fn to an element and return its index, and the result or the raised error."""
+    try:
+        if isinstance(item, tuple):
+            return idx, fn(*item), None
+        return idx, fn(item), None
+    except Exception as e:  # pylint: disable=broad-except
+        return idx, None, e
+
+
+def _worker_transform_element(idx, item):
+    """Apply the function installed in the transform worker process to an element."""
+    return _transform_element(_worker_transform_fn, idx, item)
+
+
+class _TransformPosition(object):
+    """Position of the elements returned by a parallel transform in the transformed stream.
+
+    Parameters
+    ----------
+    stream_state : dict
+        State of the transformed stream before its first element.
+    skip : list of int
+        Elements of the transformed stream that are already returned.
+    """
+    def __init__(self, stream_state, skip):
+        self._stream_state = stream_state
+        self._first = 0
+        self._stream_states = {}
+        self._returned = set(skip)
+
+    def read(self, idx, stream_state):
+        """Record the state of the transformed stream after its element `idx` was read."""
+        self._stream_states[idx] = stream_state
+        self._advance()
+
+    def returned(self, idx):
+        """Record that the transformed element `idx` was returned."""
+        self._returned.add(idx)
+        self._advance()
+
+    def _advance(self):
+        while self._first in self._returned and self._first in self._stream_states:
+            self._returned.remove(self._first)
+            self._stream_state = self._stream_states.pop(self._first)
+            self._first += 1
+
+    def state_dict(self):
+        """Return the state of the transformed stream before the first element that was not
+        returned, and the offsets from that element of the elements returned after it."""
+        return {'stream': self._stream_state,
+                'skip': sorted(idx - self._first for idx in self._returned)}
+
+
+class _ParallelTransformDataStream(DataStream):
+
+    """Data stream that transforms the data lazily in a pool of workers.
+
+    The pool is started by the first iteration and kept for the lifetime of the stream. Worker
+    processes receive the transform function once when they are started, and their random
+    states are initialized as in `PrefetchingStream`, offset by the process id of the worker.
+
+    If the transformed stream is resumable, so is this stream. Its state is the state of the
+    transformed stream before the first element that was not returned yet, and the elements
+    after it that were returned out of order. Elements that were in flight are transformed
+    again on resume.
+    """
+    def __init__(self, stream, fn, num_workers, ordered=True, worker_type='thread',
+                 num_prefetch=None):
+        if num_workers < 1:
+            raise ValueError('num_workers must be greater 0.')
+        if num_prefetch is None:
+            num_prefetch = 2 * num_workers
+        if num_prefetch < 1:
+            raise ValueError('num_prefetch must be greater 0.')
+        assert worker_type.lower() in ['thread', 'process']
+        self._stream = stream
+        self._fn = fn
+        self._num_workers = num_workers
+        self._ordered = ordered
+        self._multiprocessing = worker_type.lower() == 'process'
+        self._num_prefetch = num_prefetch
+        self._pool = None
+        self._pool_pid = None
+        self._state = None
+        self._resume_state = None
+
+    def state_dict(self):
+        """Return the position of the current iteration over the stream.
+
+        Returns
+        -------
+        dict
+            The state of the transformed stream before the first element that was not returned,
+            and the offsets from that element of the elements returned after it.
+        """
+        if self._resume_state is not None:
+            return self._resume_state
+        if self._state is not None:
+            return self._state.state_dict()
+        return {'stream': self._stream.state_dict(), 'skip': []}
+
+    def load_state_dict(self, state):
+        """Restore a position returned by `state_dict()`.
+
+        Parameters
+        ----------
+        state : dict
+            The state returned by `state_dict()`.
+        """
+        self._resume_state = state
+
+    def _get_pool(self):
+        # A pool cannot be used by a process forked from the one that started it
+        if self._pool is None or self._pool_pid != os.getpid():
+            if self._multiprocessing:
+                seed = random.getrandbits(32)
+                np_seed = np.random.randint(0, 2**32)
+                mx_seed = int(mx.nd.random.uniform(0, 2**32).asscalar())
+                self._pool = multiprocessing.Pool(
+                    self._num_workers, initializer=_transform_worker_init,
+                    initargs=(self._fn, seed, np_seed, mx_seed))
+            else:
+                self._pool = multiprocessing.pool.ThreadPool(self._num_workers)
+            self._pool_pid = os.getpid()
+        return self._pool
+
+    def _submit(self, pool, idx, item, callback):
+        if self._multiprocessing:
+            return pool.apply_async(_worker_transform_element, (idx, item), callback=callback)
+        return pool.apply_async(_transform_element, (self._fn, idx, item), callback=callback)
+
+    def __iter__(self):
+        state, self._resume_state = self._resume_state, None
+        skip = []
+        if state is not None:
+            self._stream.load_state_dict(state['stream'])
+            skip = state['skip']
+        resumable = _is_resumable(self._stream)
+        position = None
+        if resumable:
+            position = _TransformPosition(self._stream.state_dict(), skip)
+        self._state = position
+        skip = set(skip)
+        pool = self._get_pool()
+        # Each iteration has its own queue, so the results of an abandoned iteration are dropped
+        done = queue.Queue()
+        stream_iter = enumerate(self._stream)
+        pending = {}
+        # Transformed elements that wait for the elements before them if ordered
+        finished = {}
+        next_idx = 0
+        exhausted = False
+        while True:
+            # Keep at most num_prefetch elements in flight or waiting to be returned
+            while not exhausted and len(pending) + len(finished) < self._num_prefetch:
+                try:
+                    idx, item = next(stream_iter)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if resumable:
+                    position.read(idx, self._stream.state_dict())
+                # Elements returned out of order before the stream was resumed are skipped
+                if idx not in skip:
+                    pending[idx] = self._submit(pool, idx, item, done.put)
+            while next_idx in skip:
+                next_idx += 1
+            if self._ordered and next_idx in finished:
+                if resumable:
+                    position.returned(next_idx)
+                yield finished.pop(next_idx)
+                next_idx += 1
+                continue
+            if not pending:
+                assert not finished
+                self._state = None
+                return
+            try:
+                idx, result, error = done.get(timeout=1)
+            except queue.Empty:
+                # The callback is not called if an element or result cannot be pickled
+                for async_result in pending.values():
+                    if async_result.ready() and not async_result.successful():
+                        async_result.get()
+                continue
+            del pending[idx]
+            if error is not None:
+                raise error
+            if self._ordered:
+                finished[idx] = result
+            else:
+                if resumable:
+                    position.returned(idx)
+                yield result
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_pool'] = None
+        state['_pool_pid'] = None
+        return state
+
+    def __del__(self):
+        pool = getattr(self, '_pool', None)
+        if pool is not None and self._pool_pid == os.getpid():
+            pool.terminate()
+
+
 class CorpusStream(DatasetStream):
     """CorpusStream streams a number of CorpusDatasets.
 
@@ -173,13 +459,39 @@ class CorpusStream(DatasetStream):
 
         - 'sequential': SequentialSampler
         - 'random': RandomSampler
+    num_parts : int, default 1
+        The number of parts the corpus is partitioned into, e.g. the number of training
+        processes. Each part is read by one process, so that every process only reads and
+        tokenizes its share of the corpus.
+    part_index : int, default 0
+        The index of the part to stream, in [0, num_parts).
+    partition_samples : bool, default False
+        If False, the files are partitioned and every part reads about len(files) / num_parts
+        files. If True, every part reads all the files but only keeps every num_parts-th sample
+        of each file, starting from the part_index-th. Use it when there are less files than
+        parts.
+    seed : int or None, default None
+        Only used if num_parts > 1 and `file_sampler` is 'random'. If None, the files of each
+        part are fixed and shuffled with the global random state. Otherwise, all the files are
+        shuffled with a random state seeded with `seed` plus the epoch before they are
+        partitioned, so that the parts get different files in every epoch while staying
+        disjoint. All parts must then use the same seed. The epoch is the number of times the
+        stream has been iterated over.
+
+    The position of the stream can be saved with `state_dict()` and restored with
+    `load_state_dict()`, after which the next iteration continues with the file following the
+    last returned one, in the same order.
     """
     def __init__(self, file_pattern, encoding='utf8', flatten=False, skip_empty=True,
                  sample_splitter=line_splitter, tokenizer=whitespace_splitter,
-                 bos=None, eos=None, file_sampler='random'):
+                 bos=None, eos=None, file_sampler='random', num_parts=1, part_index=0,
+                 partition_samples=False, seed=None):
         assert sample_splitter, 'sample_splitter must be specified.'
         if not isinstance(file_pattern, str):
             raise TypeError('file_pattern must be str, but got %s'%type(file_pattern))
+        if not 0 <= part_index < num_parts:
+            raise ValueError('part_index must be in [0, num_parts), but got part_index=%d and '
+                             'num_parts=%d'%(part_index, num_parts))
         self._file_pattern = os.path.expanduser(file_pattern)
         self._encoding = encoding
         self._flatten = flatten
@@ -189,6 +501,15 @@ class CorpusStream(DatasetStream):
         self._bos = bos
         self._eos = eos
         self._file_sampler = file_sampler
+        self._num_parts = num_parts
+        self._part_index = part_index
+        self._partition_samples = partition_samples
+        self._seed = seed
+        self._epoch = 0
+        # The files of the current iteration in reading order, and the number of files read
+        self._files = None
+        self._position = 0
+        self._resume = False
 
     def _get_sampler(self, sampler):
         assert isinstance(sampler, str), 'Expected sampler to be a str, but got %s'%type(sampler)
@@ -198,18 +519,76 @@ class CorpusStream(DatasetStream):
             return SequentialSampler
         raise ValueError('sampler must be either "random" or "sequential", but got %s'%(sampler))
 
-    def __iter__(self):
+    def _file_indices(self, num_files):
+        """The indices of the files read by this part in the current epoch, in reading order."""
+        num_parts = 1 if self._partition_samples else self._num_parts
+        if num_files < num_parts:
+            raise ValueError('Cannot partition %d files into %d parts. Consider using '
+                             'partition_samples=True.'%(num_files, num_parts))
+        part_index = self._part_index if num_parts > 1 else 0
+        epoch = self._epoch
+        self._epoch += 1
+        if num_parts > 1 and self._seed is not None and self._file_sampler == 'random':
+            order = np.random.RandomState(self._seed + epoch).permutation(num_files)
+            return order[part_index::num_parts].tolist()
+        files = list(range(num_files))[part_index::num_parts]
         file_sampler = self._get_sampler(self._file_sampler)
-        # generate file samples
-        files = sorted(glob.glob(self._file_pattern))
-        if len(files) == 0:
-            raise ValueError('Cannot find any file with path "%s"'%self._file_pattern)
-        for file_idx in iter(file_sampler(len(files))):
-            filename = files[file_idx]
-            yield CorpusDataset(filename, encoding=self._encoding,
-                                flatten=self._flatten, skip_empty=self._skip_empty,
-                                sample_splitter=self._sample_splitter,
-                                tokenizer=self._tokenizer, bos=self._bos, eos=self._eos)
+        return [files[i] for i in file_sampler(len(files))]
+
+    def state_dict(self):
+        """Return the position of the current iteration over the stream.
+
+        Returns
+        -------
+        dict
+            The epoch, the files of the current iteration in reading order and the number of
+            files that were returned. The files are None if no iteration is in progress.
+        """
+        files = None if self._files is None else list(self._files)
+        return {'epoch': self._epoch, 'files': files, 'position': self._position}
+
+    def load_state_dict(self, state):
+        """Restore a position returned by `state_dict()`.
+
+        The next iteration over the stream continues from that position.
+
+        Parameters
+        ----------
+        state : dict
+            The state returned by `state_dict()`.
+        """
+        self._epoch = state['epoch']
+        self._files = None if state['files'] is None else list(state['files'])
+        self._position = state['position']
+        self._resume = self._files is not None
+
+    def __iter__(self):
+        if not self._resume:
+            # generate file samples
+            files = sorted(glob.glob(self._file_pattern))
+            if len(files) == 0:
+                raise ValueError('Cannot find any file with path "%s"'%self._file_pattern)
+            self._files = [files[i] for i in self._file_indices(len(files))]
+            self._position = 0
+        self._resume = False
+        files = self._files
+        partition_samples = self._partition_samples and self._num_parts > 1
+        while self._position < len(files):
+            filename = files[self._position]
+            dataset = CorpusDataset(filename, encoding=self._encoding,
+                                    flatten=self._flatten and not partition_samples,
+                                    skip_empty=self._skip_empty,
+                                    sample_splitter=self._sample_splitter,
+                                    tokenizer=self._tokenizer, bos=self._bos, eos=self._eos)
+            if partition_samples:
+                samples = dataset[self._part_index::self._num_parts]
+                if self._flatten and self._tokenizer:
+                    samples = concat_sequence(samples)
+                dataset = SimpleDataset(samples)
+            self._position += 1
+            yield dataset
+        self._files = None
+        self._position = 0
 
 class LanguageModelStream(CorpusStream):
     """Streams a corpus consisting of multiple text files that match provided
@@ -246,23 +625,36 @@ class LanguageModelStream(CorpusStream):
 
         - 'sequential': SequentialSampler
         - 'random': RandomSampler
+    num_parts : int, default 1
+        The number of parts the corpus is partitioned into. See `CorpusStream`.
+    part_index : int, default 0
+        The index of the part to stream, in [0, num_parts).
+    partition_samples : bool, default False
+        Whether to partition the samples of each file instead of the files. See `CorpusStream`.
+    seed : int or None, default None
+        The seed used to shuffle the files before they are partitioned in every epoch. See
+        `CorpusStream`.
     """
     def __init__(self, file_pattern, encoding='utf8', skip_empty=True,
                  sample_splitter=line_splitter, tokenizer=whitespace_splitter,
-                 bos=None, eos=None, sampler='random', file_sampler='random'):
+                 bos=None, eos=None, sampler='random', file_sampler='random',
+                 num_parts=1, part_index=0, partition_samples=False, seed=None):
         super(LanguageModelStream, self).__init__(file_pattern, flatten=True,
                                                   encoding=encoding,
                                                   skip_empty=skip_empty,
                                                   sample_splitter=sample_splitter,
                                                   tokenizer=tokenizer, bos=bos,
-                                                  eos=eos, file_sampler=file_sampler)
+                                                  eos=eos, file_sampler=file_sampler,
+                                                  num_parts=num_parts, part_index=part_index,
+                                                  partition_samples=partition_samples,
+                                                  seed=seed)
         self._sampler = sampler
 
     def bptt_batchify(self, vocab, seq_len, batch_size, last_batch='keep'):
         """The corpus is transformed into batches of numericalized samples, in the way that the
         recurrent states from last batch connects with the current batch for each sample.
 
-        Each sample is of shape `(seq_len, batch_size)`.
+        Each sample is an int32 NDArray of shape `(seq_len, batch_size)`.
 
         For example, the following 4 sequences::
 
@@ -311,7 +703,9 @@ class LanguageModelStream(CorpusStream):
         corpus = CorpusStream(self._file_pattern, flatten=False, encoding=self._encoding,
                               skip_empty=self._skip_empty, sample_splitter=self._sample_splitter,
                               tokenizer=self._tokenizer, bos=self._bos, eos=self._eos,
-                              file_sampler=self._file_sampler)
+                              file_sampler=self._file_sampler, num_parts=self._num_parts,
+                              part_index=self._part_index,
+                              partition_samples=self._partition_samples, seed=self._seed)
         return _LanguageModelBPTTStream(
             corpus, vocab, seq_len, batch_size, sampler=self._get_sampler(
                 self._sampler), last_batch=last_batch)
@@ -320,6 +714,9 @@ class LanguageModelStream(CorpusStream):
 class _LanguageModelBPTTStream(DataStream):
     """Streams a corpus and produces a language modeling data stream.
 
+    Each corpus dataset is numericalized at once. Every sample of the batch (lane) reads whole
+    sentences into its own ring buffer, from which the batches are copied in blocks.
+
     Parameters
     ----------
     vocab : gluonnlp.Vocab
@@ -348,70 +745,210 @@ class _LanguageModelBPTTStream(DataStream):
         self._sampler = sampler
         self._last_batch = last_batch
         self._padding_idx = 0
+        # The position to resume from, and a function returning the position of the current
+        # iteration
+        self._resume_state = None
+        self._snapshot = None
         if last_batch == 'keep':
             assert vocab.padding_token, 'Padding token must be specified in vocab when '\
                                         'last_batch="keep".'
             self._padding_idx = vocab[vocab.padding_token]
 
+    def _shards(self):
+        """Numericalize each corpus dataset at once, in the order of the sampler.
+
+        Each shard is returned with the state of the corpus and the numpy random state before
+        it was read, from which it can be read again in the same order.
+        """
+        corpus_iter = iter(self._corpus)
+        while True:
+            state = (self._corpus.state_dict(), np.random.get_state())
+            try:
+                corpus_dataset = next(corpus_iter)
+            except StopIteration:
+                return
+            samples = [corpus_dataset[idx] for idx in self._sampler(len(corpus_dataset))]
+            shard = NumericalizedCorpus.from_samples(samples, self._vocab)
+            yield shard.tokens, shard.offsets, state
+
+    def state_dict(self):
+        """Return the position of the current iteration over the stream.
+
+        Returns
+        -------
+        dict
+            The state of the corpus and the numpy random state before the shard being read,
+            the index of the next sentence in that shard, and the tokens buffered in each
+            sample of the batch.
+        """
+        if self._resume_state is not None:
+            return self._resume_state
+        if self._snapshot is not None:
+            return self._snapshot()
+        return {'corpus': self._corpus.state_dict(), 'random_state': None, 'sentence': None,
+                'buffers': None, 'has_next': True, 'has_token_buffered': False}
+
+    def load_state_dict(self, state):
+        """Restore a position returned by `state_dict()`.
+
+        The next iteration over the stream continues from that position. The shard being read
+        is read again, and the numpy random state is restored to its state before the shard
+        was first read.
+
+        Parameters
+        ----------
+        state : dict
+            The state returned by `state_dict()`.
+        """
+        self._resume_state = state
+
     def __iter__(self):
-        def _init(data, target, value):
-            """Init the data and target with values."""
-            data[:] = value
-            target[:] = value
-
-        def _read(buffers, i, vocab, corpus):
-            """Read a sentence from the corpus into i-th buffer."""
-            if len(buffers[i]) <= 1:
-                buffers[i].extend(vocab[next(corpus)])
-
-        def _write(data, target, buffers, seq_len, i, length):
-            """Write a sentence from i-th buffer to data and target."""
-            num_tokens = len(buffers[i]) - 1
-            num_tokens = min(num_tokens, seq_len - length)
-            # fill in data and target
-            data[i, length:length+num_tokens] = buffers[i][:num_tokens]
-            target[i, length:length+num_tokens] = buffers[i][1:num_tokens+1]
-            # trim sentence in the buffer if too long. Used for the next batch
-            buffers[i] = buffers[i][num_tokens:]
-            return num_tokens
-
-        # stream states
-        buffers = [None] * self._batch_size
-        for i in range(self._batch_size):
-            buffers[i] = []
+        state, self._resume_state = self._resume_state, None
+        if state is not None:
+            self._corpus.load_state_dict(state['corpus'])
+            if state['random_state'] is not None:
+                np.random.set_state(state['random_state'])
+        shards = self._shards()
+        # The shard being read and the index of its next sentence
+        tokens = np.zeros((0,), dtype=np.int32)
+        offsets = np.zeros((1,), dtype=np.int64)
+        shard_state = None
+        sentence = 0
+        buffers = _LaneBuffers(self._batch_size, 2 * (self._seq_len + 1))
         has_next = True
         has_token_buffered = False
-        data = np.empty([self._batch_size, self._seq_len], dtype=np.float32)
-        target = np.empty([self._batch_size, self._seq_len], dtype=np.float32)
-        corpus = itertools.chain.from_iterable(
-            (corpus_dataset[idx] for idx in self._sampler(len(corpus_dataset)))
-            for corpus_dataset in self._corpus)
-
+        if state is not None:
+            if state['sentence'] is not None:
+                tokens, offsets, shard_state = next(shards)
+                sentence = state['sentence']
+            if state['buffers'] is not None:
+                buffers.load_state_dict(state['buffers'])
+            has_next = state['has_next']
+            has_token_buffered = state['has_token_buffered']
+
+        def snapshot():
+            if sentence < len(offsets) - 1:
+                corpus_state, random_state = shard_state
+                shard_sentence = sentence
+            else:  # The next shard is read from the current position of the corpus
+                corpus_state, random_state = self._corpus.state_dict(), None
+                shard_sentence = None
+            return {'corpus': corpus_state, 'random_state': random_state,
+                    'sentence': shard_sentence, 'buffers': buffers.state_dict(),
+                    'has_next': has_next, 'has_token_buffered': has_token_buffered}
+
+        self._snapshot = snapshot
         while has_next or has_token_buffered:
-            _init(data, target, self._padding_idx)
             has_token_buffered = False
             for i in range(self._batch_size):
-                length = 0
-                try:
-                    while length < self._seq_len:
-                        _read(buffers, i, self._vocab, corpus)
-                        num_tokens = _write(data, target, buffers, self._seq_len, i, length)
-                        if len(buffers[i]) > 0:
-                            has_token_buffered = True
-                        length += num_tokens
-                except StopIteration:
-                    has_next = False
+                # A batch takes seq_len tokens from a lane, plus one more token for the target.
+                # Whole sentences are read until the lane holds enough tokens.
+                missing = self._seq_len + 1 - buffers.sizes[i]
+                num_read = 0
+                while missing > 0 and has_next:
+                    if sentence == len(offsets) - 1:
+                        try:
+                            tokens, offsets, shard_state = next(shards)
+                            sentence = 0
+                        except StopIteration:
+                            has_next = False
+                        continue
+                    end = np.searchsorted(offsets, offsets[sentence] + missing)
+                    end = min(end, len(offsets) - 1)
+                    block = tokens[offsets[sentence]:offsets[end]]
+                    buffers.append(i, block)
+                    num_read += end - sentence
+                    missing -= len(block)
+                    sentence = end
+                if num_read or buffers.sizes[i] > 1:
+                    has_token_buffered = True
+            data, target = buffers.pop(self._seq_len, self._padding_idx)
             if has_token_buffered or self._last_batch == 'keep':
-                yield mx.nd.array(data).T, mx.nd.array(target).T
-        return
+                yield mx.nd.array(data.T, dtype=np.int32), mx.nd.array(target.T, dtype=np.int32)
+        if self._snapshot is snapshot:
+            self._snapshot = None
+
+
+class _LaneBuffers(object):
+    """Per-lane int32 ring buffers of the tokens not yet returned by _LanguageModelBPTTStream.
+
+    The last token of each lane is kept after a batch is returned, since it is the first token
+    of the data of the next batch.
+    """
+    def __init__(self, num_lanes, capacity):
+        self._buffers = np.zeros((num_lanes, capacity), dtype=np.int32)
+        self._heads = np.zeros((num_lanes,), dtype=np.int64)
+        self.sizes = np.zeros((num_lanes,), dtype=np.int64)
+
+    def _grow(self, capacity):
+        buffers = np.zeros((len(self._buffers), capacity), dtype=np.int32)
+        for i, size in enumerate(self.sizes):
+            buffers[i, :size] = self._window(i, size)
+        self._buffers = buffers
+        self._heads[:] = 0
+
+    def _window(self, i, size):
+        capacity = self._buffers.shape[1]
+        head = self._heads[i]
+        if head + size <= capacity:
+            return self._buffers[i, head:head + size]
+        return np.concatenate([self._buffers[i, head:], self._buffers[i, :head + size - capacity]])
+
+    def append(self, i, block):
+        """Append a block of tokens to the i-th lane."""
+        capacity = self._buffers.shape[1]
+        if self.sizes[i] + len(block) > capacity:
+            self._grow(max(2 * capacity, int(self.sizes[i]) + len(block)))
+            capacity = self._buffers.shape[1]
+        tail = (self._heads[i] + self.sizes[i]) % capacity
+        num_first = min(len(block), capacity - tail)
+        self._buffers[i, tail:tail + num_first] = block[:num_first]
+        self._buffers[i, :len(block) - num_first] = block[num_first:]
+        self.sizes[i] += len(block)
+
+    def state_dict(self):
+        """Return the sizes and the concatenated tokens of the lanes."""
+        tokens = [self._window(i, size) for i, size in enumerate(self.sizes)]
+        return {'sizes': self.sizes.copy(),
+                'tokens': np.concatenate(tokens).astype(np.int32)}
+
+    def load_state_dict(self, state):
+        """Restore the lanes from a state returned by `state_dict()`."""
+        sizes = state['sizes']
+        if sizes.max() > self._buffers.shape[1]:
+            self._buffers = np.zeros((len(self._buffers), sizes.max()), dtype=np.int32)
+        self._buffers[:] = 0
+        self._heads[:] = 0
+        self.sizes = sizes.astype(np.int64)
+        for i, (start, end) in enumerate(zip(np.cumsum(sizes) - sizes, np.cumsum(sizes))):
+            self._buffers[i, :end - start] = state['tokens'][start:end]
+
+    def pop(self, seq_len, padding_idx):
+        """Return the data and target of the next batch, of shape (num_lanes, seq_len).
+
+        Lanes with less than seq_len + 1 tokens are padded with padding_idx.
+        """
+        num_lanes, capacity = self._buffers.shape
+        lengths = np.clip(self.sizes - 1, 0, seq_len)
+        columns = np.arange(seq_len + 1)
+        window = self._buffers[np.arange(num_lanes)[:, None],
+                               (self._heads[:, None] + columns) % capacity]
+        valid = columns[None, :-1] < lengths[:, None]
+        data = np.where(valid, window[:, :-1], padding_idx).astype(np.int32)
+        target = np.where(valid, window[:, 1:], padding_idx).astype(np.int32)
+        self._heads = (self._heads + lengths) % capacity
+        self.sizes -= lengths
+        return data, target
 
 
 class _Prefetcher(object):
     """Internal shared prefetcher logic."""
     data_queue = None
     control_queue = None
+    slab_pool = None
 
-    def __init__(self, stream, num_prefetch, seed, np_seed, mx_seed):
+    def __init__(self, stream, num_prefetch, seed, np_seed, mx_seed, profiler=None,
+                 state=None):
         super(_Prefetcher, self).__init__()
         self.stream = stream
         assert num_prefetch > 0, 'Unbounded Prefetcher is unsupported.'
@@ -419,6 +956,10 @@ class _Prefetcher(object):
         self.seed = seed
         self.np_seed = np_seed
         self.mx_seed = mx_seed
+        self.profiler = profiler
+        # The state of the stream after the last returned element, if the stream is resumable
+        self.state = state
+        self._last_return = None
 
     def run(self):
         """Method representing the process’s activity."""
@@ -426,6 +967,9 @@ class _Prefetcher(object):
         np.random.seed(self.np_seed)
         mx.random.seed(self.mx_seed)
 
+        resumable = self.state is not None
+        if resumable:
+            self.stream.load_state_dict(self.state)
         stream_iter = iter(self.stream)
         while True:
             try:  # Check control queue
@@ -436,16 +980,45 @@ class _Prefetcher(object):
                 pass
 
             try:
+                start = time.time()
                 data = next(stream_iter)
+                sent = time.time()
+                if self.slab_pool is not None:
+                    data = self.slab_pool.write(data)
+                if self.profiler is not None:
+                    # The timing events are sent with the data to the consumer
+                    data = (data, [_make_event('stream', start, sent)], sent)
+                if resumable:
+                    data = (data, self.stream.state_dict())
                 self.data_queue.put(data)
             except StopIteration:
-                self.data_queue.put(None)
+                self.data_queue.put((None, self.stream.state_dict()) if resumable else None)
 
     def __next__(self):
+        profiler = self.profiler
+        start = time.time()
+        if profiler is not None:
+            if self._last_return is not None:
+                profiler.record('consume', self._last_return, start)
+            try:
+                profiler.record_counter('ready', self.data_queue.qsize())
+            except NotImplementedError:  # qsize is not implemented on macOS
+                pass
         next_item = self.data_queue.get()
+        if self.state is not None:
+            next_item, self.state = next_item
         if next_item is None:
             self.control_queue.put(None)
             raise StopIteration
+        if profiler is not None:
+            next_item, events, sent = next_item
+        if self.slab_pool is not None:
+            next_item = self.slab_pool.read(next_item)
+        if profiler is not None:
+            self._last_return = time.time()
+            profiler.record_events(events)
+            profiler.record('transfer', sent, self._last_return)
+            profiler.record('wait', start, self._last_return)
         return next_item
 
     def next(self):
@@ -456,10 +1029,17 @@ class _Prefetcher(object):
 
 
 class _ProcessPrefetcher(_Prefetcher, multiprocessing.Process):
-    """Internal multi-processing prefetcher."""
+    """Internal multi-processing prefetcher.
+
+    If `slab_size` is not None, the elements are sent through `num_prefetch + 1` reusable
+    shared-memory slabs, so that the producer never waits for a free slab.
+    """
 
     def __init__(self, *args, **kwargs):
+        slab_size = kwargs.pop('slab_size', None)
         super(_ProcessPrefetcher, self).__init__(*args, **kwargs)
+        if slab_size is not None:
+            self.slab_pool = SlabPool(self.num_prefetch + 1, slab_size)
         self.data_queue = multiprocessing.Queue(self.num_prefetch)
         self.control_queue = multiprocessing.Queue()
         self.daemon = True
@@ -498,29 +1078,81 @@ class PrefetchingStream(DataStream):
         Number of elements to prefetch from the stream. Must be greater 0.
     worker_type : 'thread' or 'process', default 'thread'
         Use a separate Python Thread or Process to prefetch.
+    slab_size : int or None, default 64MB
+        Size in bytes of the reusable shared-memory slabs used to send the elements from
+        the prefetching process, only used if `worker_type` is 'process'. Elements that are
+        nested lists or tuples of numpy arrays and NDArrays are written into a slab instead
+        of being pickled. Larger elements are pickled. If None, all elements are pickled.
+    profiler : PipelineProfiler, default None
+        If not None, the time spent producing, transferring and consuming the elements is
+        recorded in the profiler.
+
+    If the wrapped stream implements `state_dict()` and `load_state_dict()`, so does the
+    PrefetchingStream. Its state is the state of the wrapped stream after the last element that
+    was returned to the consumer, not after the prefetched elements.
 
     """
 
-    def __init__(self, stream, num_prefetch=1, worker_type='thread'):
+    def __init__(self, stream, num_prefetch=1, worker_type='thread',
+                 slab_size=DEFAULT_SLAB_SIZE, profiler=None):
         self._stream = stream
+        self._profiler = profiler
+        self._slab_size = slab_size
         self._num_prefetch = num_prefetch
         if num_prefetch < 1:
             raise ValueError('num_prefetch must be greater 0.')
         assert worker_type.lower() in ['thread', 'process']
         self._multiprocessing = worker_type.lower() == 'process'
+        # The state to resume from, and the prefetcher of the current iteration
+        self._resume_state = None
+        self._prefetcher = None
+
+    def state_dict(self):
+        """Return the state of the wrapped stream after the last returned element.
+
+        Returns
+        -------
+        dict
+            The state of the wrapped stream.
+        """
+        if self._resume_state is not None:
+            state = self._resume_state
+        elif self._prefetcher is not None:
+            state = self._prefetcher.state
+        else:
+            state = self._stream.state_dict()
+        return {'stream': state}
+
+    def load_state_dict(self, state):
+        """Restore a state returned by `state_dict()`.
+
+        The next iteration continues from that state.
+
+        Parameters
+        ----------
+        state : dict
+            The state returned by `state_dict()`.
+        """
+        self._resume_state = state['stream']
 
     def __iter__(self):
         seed = random.getrandbits(32)
         np_seed = np.random.randint(0, 2**32)
         mx_seed = int(mx.nd.random.uniform(0, 2**32).asscalar())
+        state, self._resume_state = self._resume_state, None
+        if state is None and _is_resumable(self._stream):
+            state = self._stream.state_dict()
         if self._multiprocessing:
-            return _ProcessPrefetcher(self._stream, self._num_prefetch,
-                                      seed=seed, np_seed=np_seed,
-                                      mx_seed=mx_seed)
+            self._prefetcher = _ProcessPrefetcher(self._stream, self._num_prefetch,
+                                                  seed=seed, np_seed=np_seed,
+                                                  mx_seed=mx_seed, slab_size=self._slab_size,
+                                                  profiler=self._profiler, state=state)
         else:
-            return _ThreadPrefetcher(self._stream, self._num_prefetch,
-                                     seed=seed, np_seed=np_seed,
-                                     mx_seed=mx_seed)
+            self._prefetcher = _ThreadPrefetcher(self._stream, self._num_prefetch,
+                                                 seed=seed, np_seed=np_seed,
+                                                 mx_seed=mx_seed, profiler=self._profiler,
+                                                 state=state)
+        return self._prefetcher
 
 
 class ContextStream(DataStream):
@@ -548,6 +1180,10 @@ class ContextStream(DataStream):
     shuffle : bool, default True
          shuffle size passed to ContextSampler.
 
+    If the wrapped stream implements `state_dict()` and `load_state_dict()`, so does the
+    ContextStream. The shard being read when the state was saved is read again after the state
+    is loaded, with the python and numpy random states it was first read with.
+
     """
 
     def __init__(self, stream, batch_size, p_discard, window_size=5,
@@ -560,10 +1196,53 @@ class ContextStream(DataStream):
         self._window_size = window_size
         self._random_reduce = reduce_window_size_randomly
         self._shuffle = shuffle
+        # The position to resume from, and the position of the current iteration
+        self._resume_state = None
+        self._state = None
+
+    def state_dict(self):
+        """Return the position of the current iteration over the stream.
+
+        Returns
+        -------
+        dict
+            The state of the wrapped stream and the python and numpy random states before the
+            shard being read, and the number of batches returned from that shard.
+        """
+        if self._resume_state is not None:
+            return self._resume_state
+        if self._state is not None:
+            return dict(self._state)
+        return {'stream': self._stream.state_dict(), 'random_state': None, 'batch': 0}
+
+    def load_state_dict(self, state):
+        """Restore a position returned by `state_dict()`.
+
+        Parameters
+        ----------
+        state : dict
+            The state returned by `state_dict()`.
+        """
+        self._resume_state = state
 
     def __iter__(self):
         """"""
-        for shard in self._stream:
+        state, self._resume_state = self._resume_state, None
+        num_skipped = 0
+        if state is not None:
+            self._stream.load_state_dict(state['stream'])
+            if state['random_state'] is not None:
+                random.setstate(state['random_state'][0])
+                np.random.set_state(state['random_state'][1])
+            num_skipped = state['batch']
+        stream_iter = iter(self._stream)
+        while True:
+            stream_state = self._stream.state_dict() if _is_resumable(self._stream) else None
+            random_state = (random.getstate(), np.random.get_state())
+            try:
+                shard = next(stream_iter)
+            except StopIteration:
+                break
             shard = [[
                 t for t, r in zip(sentence, np.random.uniform(0, 1, size=len(sentence)))
                 if r > self.idx_to_pdiscard[t]
@@ -573,5 +1252,82 @@ class ContextStream(DataStream):
                 shard, batch_size=self._batch_size, window=self._window_size,
                 reduce_window_size_randomly=self._random_reduce, shuffle=self._shuffle)
 
-            for batch in context_sampler:
+            batches = itertools.islice(context_sampler, num_skipped, None)
+            self._state = {'stream': stream_state, 'random_state': random_state,
+                           'batch': num_skipped}
+            num_skipped = 0
+            for batch in batches:
+                self._state['batch'] += 1
                 yield batch
+        self._state = None
+
+
+def _count_file_tokens(to_lower, kwargs, filename):
+    """Count the tokens of one corpus file."""
+    dataset = CorpusDataset(filename, flatten=False, **kwargs)
+    return count_tokens(itertools.chain.from_iterable(dataset), to_lower=to_lower)
+
+
+def _merge_counters(counters):
+    """Merge a list of counters into the first one."""
+    counter = counters[0]
+    for other in counters[1:]:
+        counter.update(other)
+    return counter
+
+
+def count_corpus_tokens(corpus, to_lower=False, num_workers=None):
+    """Count the tokens of a corpus of text files in a pool of processes.
+
+    Every file is read and counted by a worker process. The counters of the files are then
+    merged pairwise by the workers, in a tree of depth log2(number of files).
+
+    Parameters
+    ----------
+    corpus : str, list of str or CorpusStream
+        A file pattern or a list of files, which are read with the default arguments of
+        `CorpusStream`, or a CorpusStream, whose files are read with its encoding, sample
+        splitter, tokenizer, bos and eos. The partitioning of a CorpusStream is ignored, so that
+        all the files are counted. The tokenizer must be picklable if `num_workers` is not 0.
+    to_lower : bool, default False
+        Whether to convert the tokens to lower case.
+    num_workers : int or None, default None
+        Number of worker processes. If None, the number of CPUs is used. If 0, the files are
+        counted in the current process.
+
+    Returns
+    -------
+    Counter
+        The token counts, which can be used to create a `gluonnlp.Vocab`.
+    """
+    kwargs = {}
+    if isinstance(corpus, CorpusStream):
+        assert corpus._tokenizer, 'The tokenizer of the corpus must be specified.'
+        kwargs = dict(encoding=corpus._encoding, skip_empty=corpus._skip_empty,
+                      sample_splitter=corpus._sample_splitter, tokenizer=corpus._tokenizer,
+                      bos=corpus._bos, eos=corpus._eos)
+        corpus = corpus._file_pattern
+    if isinstance(corpus, str):
+        files = sorted(glob.glob(os.path.expanduser(corpus)))
+        if not files:
+            raise ValueError('Cannot find any file with path "%s"'%corpus)
+    else:
+        files = [os.path.expanduser(f) for f in corpus]
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+    count_fn = functools.partial(_count_file_tokens, to_lower, kwargs)
+
+    if not num_workers:
+        return _merge_counters([count_fn(filename) for filename in files] or [count_tokens([])])
+    pool = multiprocessing.Pool(min(num_workers, len(files)) or 1)
+    try:
+        counters = pool.map(count_fn, files) or [count_tokens([])]
+        while len(counters) > 1:
+            # An odd counter out waits for the next level
+            pairs = [counters[i:i + 2] for i in range(0, len(counters) - 1, 2)]
+            odd = counters[len(counters) - len(counters) % 2:]
+            counters = pool.map(_merge_counters, pairs) + odd
+    finally:
+        pool.terminate()
+        pool.join()
+    return counters[0]
@@ -28,6 +28,7 @@ __all__ = [
 
 import os
 import collections
+import itertools
 import zipfile
 import tarfile
 import numpy as np
@@ -129,6 +130,23 @@ def count_tokens(tokens, to_lower=False, counter=None):
         return counter
 
 
+def _lookup_indices(vocab, tokens, num_tokens):
+    """Look up the indices of `num_tokens` tokens in the vocabulary as an int32 array.
+
+    Equivalent to `vocab[tokens]`, but the dictionary lookups run without a Python level call
+    per token. Token indices that look up batches of tokens themselves, like the one of
+    `FrozenVocab`, are used directly.
+    """
+    token_to_idx = vocab.token_to_idx
+    if hasattr(token_to_idx, 'lookup_indices'):
+        return token_to_idx.lookup_indices(tokens, num_tokens)
+    if vocab.unknown_token is None:
+        indices = map(token_to_idx.__getitem__, tokens)
+    else:
+        indices = map(token_to_idx.get, tokens, itertools.repeat(token_to_idx[vocab.unknown_token]))
+    return np.fromiter(indices, dtype=np.int32, count=num_tokens)
+
+
 def concat_sequence(sequences):
     """Concatenate sequences of tokens into a single flattened list of tokens.
 
@@ -59,8 +59,6 @@ class Text8(CorpusDataset):
     def __init__(self, root=os.path.join(_get_home_dir(), 'datasets', 'text8'),
                  segment='train', max_sentence_length=10000):
         root = os.path.expanduser(root)
-        if not os.path.isdir(root):
-            os.makedirs(root)
         self._root = root
         self._segment = segment
         self._max_sentence_length = max_sentence_length
@@ -74,15 +72,39 @@ class Text8(CorpusDataset):
                     data.append(sentence[i:i + max_sentence_length])
             self._data = data
 
-    def _get_data(self):
-        archive_file_name, archive_hash = self.archive_file
-        data_file_name, data_hash = self.data_file[self._segment]
-        root = self._root
+    @classmethod
+    def get_filename(cls, segment='train',
+                     root=os.path.join(_get_home_dir(), 'datasets', 'text8')):
+        """Download a segment of the dataset if needed, and return the path to its file.
+
+        The file is not read, so that it can be passed to e.g.
+        `gluonnlp.data.load_numericalized_corpus` without tokenizing it.
+
+        Parameters
+        ----------
+        segment : {'train'}, default 'train'
+            Dataset segment.
+        root : str, default '$MXNET_HOME/datasets/text8'
+            Path to temp folder for storing data.
+
+        Returns
+        -------
+        str
+            The path to the file of the segment.
+        """
+        root = os.path.expanduser(root)
+        if not os.path.isdir(root):
+            os.makedirs(root)
+        archive_file_name, archive_hash = cls.archive_file
+        data_file_name, data_hash = cls.data_file[segment]
         path = os.path.join(root, data_file_name)
         if not os.path.exists(path) or not check_sha1(path, data_hash):
-            downloaded_file_path = download(self.url + archive_file_name,
+            downloaded_file_path = download(cls.url + archive_file_name,
                                             path=root, sha1_hash=archive_hash)
 
             with zipfile.ZipFile(downloaded_file_path, 'r') as zf:
                 zf.extractall(root)
         return path
+
+    def _get_data(self):
+        return self.get_filename(self._segment, self._root)
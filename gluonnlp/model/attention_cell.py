@@ -62,7 +62,33 @@ class AttentionCell(HybridBlock):
         cell = AttentionCell()
         out = cell(query, key, value, mask)
 
+    The computation that only depends on the memory can be put in `_project_memory()`. It can then
+    be done once and shared by multiple queries, e.g., by all the decoding steps::
+
+        proj_key, proj_value = cell.project_memory(key, value)
+        out = cell.attend_projected(query, proj_key, proj_value, mask)
+
     """
+    def _project_memory(self, F, key, value):
+        """Project the key and the value of the memory.
+
+        Parameters
+        ----------
+        F : symbol or ndarray
+        key : Symbol or NDArray
+            Key of the memory. Shape (batch_size, memory_length, key_dim)
+        value : Symbol or NDArray
+            Value of the memory. Shape (batch_size, memory_length, value_dim)
+
+        Returns
+        -------
+        proj_key : Symbol or NDArray
+            Projected key of the memory. Shape (batch_size, memory_length, ...)
+        proj_value : Symbol or NDArray
+            Projected value of the memory. Shape (batch_size, memory_length, ...)
+        """
+        return key, value
+
     def _compute_weight(self, F, query, key, mask=None):
         """Compute attention weights based on the query and the keys
 
@@ -72,7 +98,8 @@ class AttentionCell(HybridBlock):
         query : Symbol or NDArray
             The query vectors. Shape (batch_size, query_length, query_dim)
         key : Symbol or NDArray
-            Key of the memory. Shape (batch_size, memory_length, key_dim)
+            Projected key of the memory, i.e., the output of `_project_memory()`.
+            Shape (batch_size, memory_length, ...)
         mask : Symbol or NDArray or None
             Mask the memory slots. Shape (batch_size, query_length, memory_length)
             Only contains 0 or 1 where 0 means that the memory slot will not be used.
@@ -99,7 +126,8 @@ class AttentionCell(HybridBlock):
             For multi-head attention,
                 Shape (batch_size, num_heads, query_length, memory_length).
         value : Symbol or NDArray
-            Value of the memory. Shape (batch_size, memory_length, total_value_dim)
+            Projected value of the memory, i.e., the output of `_project_memory()`.
+            Shape (batch_size, memory_length, ...)
 
         Returns
         -------
@@ -108,6 +136,57 @@ class AttentionCell(HybridBlock):
         """
         return F.batch_dot(att_weights, value)
 
+    def project_memory(self, key, value=None):
+        """Project the memory in advance so that it can be reused by multiple queries.
+
+        Parameters
+        ----------
+        key : Symbol or NDArray
+            Key of the memory. Shape (batch_size, memory_length, key_dim)
+        value : Symbol or NDArray or None, default None
+            Value of the memory. If set to None, the value will be set as the key.
+            Shape (batch_size, memory_length, value_dim)
+
+        Returns
+        -------
+        projected_memory : list of Symbol or list of NDArray
+            The projected key and value of the memory. The first two dimensions are
+            (batch_size, memory_length).
+        """
+        if value is None:
+            value = key
+        F = mx.sym if isinstance(key, mx.sym.Symbol) else mx.nd
+        return list(self._project_memory(F, key, value))
+
+    def attend_projected(self, query, proj_key, proj_value, mask=None):
+        """Compute the attention given the memory returned by `project_memory()`.
+
+        Parameters
+        ----------
+        query : Symbol or NDArray
+            Query vector. Shape (batch_size, query_length, query_dim)
+        proj_key : Symbol or NDArray
+            Projected key of the memory.
+        proj_value : Symbol or NDArray
+            Projected value of the memory.
+        mask : Symbol or NDArray or None, default None
+            Mask of the memory slots. Shape (batch_size, query_length, memory_length)
+            Only contains 0 or 1 where 0 means that the memory slot will not be used.
+            If set to None. No mask will be used.
+
+        Returns
+        -------
+        context_vec : Symbol or NDArray
+            Shape (batch_size, query_length, context_vec_dim)
+        att_weights : Symbol or NDArray
+            Attention weights. Shape (batch_size, query_length, memory_length) or
+            (batch_size, num_heads, query_length, memory_length)
+        """
+        F = mx.sym if isinstance(query, mx.sym.Symbol) else mx.nd
+        att_weights = self._compute_weight(F, query, proj_key, mask)
+        context_vec = self._read_by_weight(F, att_weights, proj_value)
+        return context_vec, att_weights
+
     def __call__(self, query, key, value=None, mask=None):  # pylint: disable=arguments-differ
         """Compute the attention.
 
@@ -143,6 +222,7 @@ class AttentionCell(HybridBlock):
             return super(AttentionCell, self).forward(query, key, value, mask)
 
     def hybrid_forward(self, F, query, key, value, mask=None):  # pylint: disable=arguments-differ
+        key, value = self._project_memory(F, key, value)
         att_weights = self._compute_weight(F, query, key, mask)
         context_vec = self._read_by_weight(F, att_weights, value)
         return context_vec, att_weights
@@ -244,15 +324,21 @@ class MultiHeadAttentionCell(AttentionCell):
         """
         return super(MultiHeadAttentionCell, self).__call__(query, key, value, mask)
 
+    def _project_memory(self, F, key, value):
+        # Shape (batch_size, memory_length, num_heads, ele_units)
+        key = self.proj_key(key).reshape(shape=(0, 0, self._num_heads, -1))
+        value = self.proj_value(value).reshape(shape=(0, 0, self._num_heads, -1))
+        # The projections of the base cell are applied to the last axis
+        return self._base_cell._project_memory(F, key, value)
+
     def _compute_weight(self, F, query, key, mask=None):
         query = self.proj_query(query)  # Shape (batch_size, query_length, query_units)
         # Shape (batch_size * num_heads, query_length, ele_units)
         query = F.transpose(query.reshape(shape=(0, 0, self._num_heads, -1)),
                             axes=(0, 2, 1, 3))\
                  .reshape(shape=(-1, 0, 0), reverse=True)
-        key = self.proj_key(key)
-        key = F.transpose(key.reshape(shape=(0, 0, self._num_heads, -1)),
-                          axes=(0, 2, 1, 3)).reshape(shape=(-1, 0, 0), reverse=True)
+        # Shape (batch_size * num_heads, memory_length, ele_units)
+        key = F.transpose(key, axes=(0, 2, 1, 3)).reshape(shape=(-1, 0, 0), reverse=True)
         if mask is not None:
             mask = F.broadcast_axis(F.expand_dims(mask, axis=1),
                                     axis=1, size=self._num_heads)\
@@ -262,9 +348,7 @@ class MultiHeadAttentionCell(AttentionCell):
 
     def _read_by_weight(self, F, att_weights, value):
         att_weights = att_weights.reshape(shape=(-1, 0, 0), reverse=True)
-        value = self.proj_value(value)
-        value = F.transpose(value.reshape(shape=(0, 0, self._num_heads, -1)),
-                            axes=(0, 2, 1, 3)).reshape(shape=(-1, 0, 0), reverse=True)
+        value = F.transpose(value, axes=(0, 2, 1, 3)).reshape(shape=(-1, 0, 0), reverse=True)
         context_vec = self._base_cell._read_by_weight(F, att_weights, value)
         context_vec = F.transpose(context_vec.reshape(shape=(-1, self._num_heads, 0, 0),
                                                       reverse=True),
@@ -355,11 +439,13 @@ class MLPAttentionCell(AttentionCell):
                                                  weight_initializer=weight_initializer,
                                                  prefix='score_')
 
+    def _project_memory(self, F, key, value):
+        return self._key_mid_layer(key), value
+
     def _compute_weight(self, F, query, key, mask=None):
         mapped_query = self._query_mid_layer(query)
-        mapped_key = self._key_mid_layer(key)
         mid_feat = F.broadcast_add(F.expand_dims(mapped_query, axis=2),
-                                   F.expand_dims(mapped_key, axis=1))
+                                   F.expand_dims(key, axis=1))
         mid_feat = self._act(mid_feat)
         att_score = self._attention_score(mid_feat).reshape(shape=(0, 0, 0))
         att_weights = self._dropout_layer(_masked_softmax(F, att_score, mask))
@@ -451,19 +537,23 @@ class DotProductAttentionCell(AttentionCell):
             with self.name_scope():
                 self._l2_norm = L2Normalization(axis=-1)
 
+    def _project_memory(self, F, key, value):
+        if self._units is not None and not self._luong_style:
+            key = self._proj_key(key)
+        if self._normalized:
+            key = self._l2_norm(key)
+        return key, value
+
     def _compute_weight(self, F, query, key, mask=None):
         if self._units is not None:
             query = self._proj_query(query)
-            if not self._luong_style:
-                key = self._proj_key(key)
-            elif F == mx.nd:
+            if self._luong_style and F == mx.nd:
                 assert query.shape[-1] == key.shape[-1], 'Luong style attention requires key to ' \
                                                          'have the same dim as the projected ' \
                                                          'query. Received key {}, query {}.'.format(
                                                              key.shape, query.shape)
         if self._normalized:
             query = self._l2_norm(query)
-            key = self._l2_norm(key)
         if self._scaled:
             query = F.contrib.div_sqrt_dim(query)
         att_score = F.batch_dot(query, key, transpose_b=True)
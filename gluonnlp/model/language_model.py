@@ -30,6 +30,7 @@ from mxnet import nd, cpu, autograd
 from mxnet.gluon.model_zoo import model_store
 
 from gluonnlp.model import train
+from gluonnlp.model.sampled_block import AdaptiveSoftmax
 from gluonnlp.data.utils import _load_pretrained_vocab
 
 
@@ -64,6 +65,9 @@ class AWDRNN(train.AWDRNN):
         Dropout rate to on the output of embedding.
     drop_e : float
         Dropout rate to use on the embedding layer.
+    adaptive_softmax_cutoffs : list of int or None, default None
+        If not None, use an `AdaptiveSoftmax` decoder with these cutoffs instead of the dense
+        decoder. The model then outputs log probabilities instead of unnormalized scores.
     """
     def __init__(self, mode, vocab_size, embed_size, hidden_size, num_layers,
                  tie_weights, dropout, weight_drop, drop_h,
@@ -127,6 +131,9 @@ class StandardRNN(train.StandardRNN):
         Dropout rate to use for encoder output.
     tie_weights : bool, default False
         Whether to tie the weight matrices of output dense layer and input embedding layer.
+    adaptive_softmax_cutoffs : list of int or None, default None
+        If not None, use an `AdaptiveSoftmax` decoder with these cutoffs instead of the dense
+        decoder. The model then outputs log probabilities instead of unnormalized scores.
     """
     def __init__(self, mode, vocab_size, embed_size, hidden_size,
                  num_layers, dropout, tie_weights, **kwargs):
@@ -444,10 +451,14 @@ class BigRNN(Block):
         Dropout rate to use for embedding output.
     encode_dropout : float
         Dropout rate to use for encoder output.
+    adaptive_softmax_cutoffs : list of int or None, default None
+        If not None, use an `AdaptiveSoftmax` decoder with these cutoffs instead of the dense
+        decoder. The model then outputs log probabilities instead of unnormalized scores.
 
     """
     def __init__(self, vocab_size, embed_size, hidden_size, num_layers,
-                 projection_size, embed_dropout=0.0, encode_dropout=0.0, **kwargs):
+                 projection_size, embed_dropout=0.0, encode_dropout=0.0,
+                 adaptive_softmax_cutoffs=None, **kwargs):
         super(BigRNN, self).__init__(**kwargs)
         self._embed_size = embed_size
         self._hidden_size = hidden_size
@@ -456,6 +467,7 @@ class BigRNN(Block):
         self._embed_dropout = embed_dropout
         self._encode_dropout = encode_dropout
         self._vocab_size = vocab_size
+        self._adaptive_softmax_cutoffs = adaptive_softmax_cutoffs
 
         with self.name_scope():
             self.embedding = self._get_embedding()
@@ -481,7 +493,10 @@ class BigRNN(Block):
         return block
 
     def _get_decoder(self):
-        output = nn.Dense(self._vocab_size, prefix='decoder0_')
+        if self._adaptive_softmax_cutoffs:
+            return AdaptiveSoftmax(self._vocab_size, self._projection_size,
+                                   self._adaptive_softmax_cutoffs, prefix='decoder0_')
+        output = nn.Dense(self._vocab_size, in_units=self._projection_size, prefix='decoder0_')
         return output
 
     def begin_state(self, **kwargs):
@@ -510,16 +525,85 @@ class BigRNN(Block):
             For each layer the two initial states have shape `(batch_size, num_hidden)`
             and `(batch_size, num_projection)`
         """
-        encoded = self.embedding(inputs)
         length = inputs.shape[0]
         batch_size = inputs.shape[1]
-        encoded, state = self.encoder.unroll(length, encoded, begin_state,
-                                             layout='TNC', merge_outputs=True)
-        encoded = encoded.reshape((-1, self._projection_size))
+        encoded, state = self._encode(inputs, begin_state)
         out = self.decoder(encoded)
         out = out.reshape((length, batch_size, -1))
         return out, state
 
+    def _encode(self, inputs, begin_state):
+        encoded = self.embedding(inputs)
+        encoded, state = self.encoder.unroll(inputs.shape[0], encoded, begin_state,
+                                             layout='TNC', merge_outputs=True)
+        encoded = encoded.reshape((-1, self._projection_size))
+        return encoded, state
+
+    def log_likelihood(self, inputs, target, begin_state, vocab_chunk_size=65536):
+        """Compute the log-likelihood of the target words.
+
+        The full-softmax normalizer is accumulated over chunks of the vocabulary with a
+        running log-sum-exp, so that the logits of the whole vocabulary are never materialized.
+        The memory usage is bounded by `(sequence_length * batch_size, vocab_chunk_size)`.
+        With the adaptive softmax decoder, the log-likelihood is computed by the decoder and
+        `vocab_chunk_size` is ignored.
+
+        Parameters
+        -----------
+        inputs : NDArray
+            input tensor with shape `(sequence_length, batch_size)`
+            when `layout` is "TNC".
+        target : NDArray
+            target tensor with shape `(sequence_length, batch_size)`
+            when `layout` is "TNC".
+        begin_state : list
+            initial recurrent state tensor with length equals to num_layers*2.
+            For each layer the two initial states have shape `(batch_size, num_hidden)`
+            and `(batch_size, num_projection)`
+        vocab_chunk_size : int, default 65536
+            Number of words in each chunk of the vocabulary.
+
+        Returns
+        --------
+        log_likelihood : NDArray
+            log-likelihood of the target words with shape `(sequence_length, batch_size)`
+              when `layout` is "TNC".
+        out_states : list
+            output recurrent state tensor with length equals to num_layers*2.
+            For each layer the two initial states have shape `(batch_size, num_hidden)`
+            and `(batch_size, num_projection)`
+        """
+        length = inputs.shape[0]
+        batch_size = inputs.shape[1]
+        encoded, state = self._encode(inputs, begin_state)
+        if self._adaptive_softmax_cutoffs:
+            return self.decoder(encoded, target.reshape((-1,))).reshape((length, batch_size)), \
+                   state
+        ctx = encoded.context
+        weight = self.decoder.weight.data(ctx)
+        bias = self.decoder.bias.data(ctx)
+        target = target.reshape((-1,))
+        target_logits = nd.sum(encoded * weight.take(target), axis=1) + bias.take(target)
+        max_logits = None
+        sum_exp = None
+        for begin in range(0, self._vocab_size, vocab_chunk_size):
+            end = min(begin + vocab_chunk_size, self._vocab_size)
+            logits = nd.FullyConnected(encoded, weight.slice_axis(axis=0, begin=begin, end=end),
+                                       bias.slice_axis(axis=0, begin=begin, end=end),
+                                       num_hidden=end - begin)
+            chunk_max = logits.max(axis=1)
+            if max_logits is None:
+                new_max = chunk_max
+                sum_exp = nd.zeros_like(chunk_max)
+            else:
+                new_max = nd.maximum(max_logits, chunk_max)
+                sum_exp = sum_exp * nd.exp(max_logits - new_max)
+            sum_exp = sum_exp + nd.exp(nd.broadcast_sub(logits, new_max.expand_dims(1))) \
+                                  .sum(axis=1)
+            max_logits = new_max
+        log_likelihood = target_logits - max_logits - nd.log(sum_exp)
+        return log_likelihood.reshape((length, batch_size)), state
+
 def big_rnn_lm_2048_512(dataset_name=None, vocab=None, pretrained=False, ctx=cpu(),
                         root=os.path.join('~', '.mxnet', 'models'), **kwargs):
     r"""Big 1-layer LSTMP language model.
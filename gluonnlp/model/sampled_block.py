@@ -17,11 +17,12 @@
 # specific language governing permissions and limitations
 # under the License.
 
-"""Blocks for sampled losses."""
-__all__ = ['ISLogits', 'NCELogits', 'SparseISLogits', 'SparseNCELogits']
+"""Blocks for sampled losses and adaptive softmax."""
+__all__ = ['ISLogits', 'NCELogits', 'SparseISLogits', 'SparseNCELogits', 'AdaptiveSoftmax']
 
+import numpy as np
 from mxnet import nd
-from mxnet.gluon import Block, HybridBlock
+from mxnet.gluon import Block, HybridBlock, nn
 
 class _SampledLogitsHelper(HybridBlock):
     """A helper Block for calculating sampled logits.
@@ -647,3 +648,126 @@ class SparseNCELogits(_SparseSampledLogits):
         super(SparseNCELogits, self).__init__(num_classes, num_sampled, in_unit,
                                               remove_accidental_hits, dtype, weight_initializer,
                                               bias_initializer, prefix=prefix, params=params)
+
+
+class AdaptiveSoftmax(Block):
+    """Adaptive softmax output block for large vocabularies.
+
+    The classes are split by `cutoffs` into a head cluster with the most frequent classes and
+    several tail clusters. The head is a softmax over the frequent classes and one entry for
+    each tail cluster. Each tail cluster is a softmax over its classes computed from a reduced
+    projection of the input, whose size is divided by `div_value` for each further cluster.
+    The class ids are expected to be sorted by decreasing frequency.
+
+    Reference: https://arxiv.org/abs/1609.04309
+
+    Example::
+
+        # network with adaptive softmax
+        decoder = AdaptiveSoftmax(num_classes, in_unit, cutoffs=[2000, 10000])
+
+        # training and evaluation with the log-likelihood of the targets
+        for x, y in batches:
+            l = -decoder(encoder(x), y)
+
+        # inference with the log probabilities of all the classes
+        log_probs = decoder(encoder(x))
+
+    Parameters
+    ----------
+    num_classes: int
+        Number of possible classes.
+    in_unit: int
+        Dimensionality of the input space.
+    cutoffs: list of int
+        Increasing class ids at which the clusters are split. The head cluster contains the
+        classes in `[0, cutoffs[0])`, and the i-th tail cluster contains the classes in
+        `[cutoffs[i], cutoffs[i+1])` with `num_classes` as the last boundary.
+    div_value: float, default 4.0
+        Reduction factor of the projection size for each further tail cluster.
+    dtype : str or np.dtype, default 'float32'
+        Data type of output embeddings.
+    weight_initializer : str or `Initializer`, optional
+        Initializer for the `kernel` weights matrix.
+    bias_initializer: str or `Initializer`, optional
+        Initializer for the bias vector.
+
+    Inputs:
+        - **x**: A tensor of shape `(d1, ..., dn, in_unit)`. The forward activation of
+          the input network.
+        - **label**: A tensor of shape `(d1, ..., dn)` or None. The target classes.
+
+    Outputs:
+        - **out**: If label is None, a tensor of shape `(d1, ..., dn, num_classes)` with
+          the log probabilities of all the classes. Otherwise, a tensor of shape
+          `(d1, ..., dn)` with the log probabilities of the target classes.
+    """
+    def __init__(self, num_classes, in_unit, cutoffs, div_value=4.0, dtype='float32',
+                 weight_initializer=None, bias_initializer='zeros', prefix=None, params=None):
+        super(AdaptiveSoftmax, self).__init__(prefix=prefix, params=params)
+        cutoffs = list(cutoffs)
+        assert cutoffs and cutoffs == sorted(set(cutoffs)) and 0 < cutoffs[0] \
+            and cutoffs[-1] < num_classes, \
+            'cutoffs must be unique increasing integers in (0, num_classes). ' \
+            'Received cutoffs={}, num_classes={}'.format(cutoffs, num_classes)
+        self._num_classes = num_classes
+        self._in_unit = in_unit
+        self._cutoffs = cutoffs + [num_classes]
+        self._div_value = div_value
+        with self.name_scope():
+            self.head = nn.Dense(cutoffs[0] + len(cutoffs), in_units=in_unit, flatten=False,
+                                 dtype=dtype, weight_initializer=weight_initializer,
+                                 bias_initializer=bias_initializer, prefix='head_')
+            self.tail = nn.Sequential(prefix='tail_')
+            with self.tail.name_scope():
+                for i in range(len(cutoffs)):
+                    proj_size = max(1, int(in_unit // (div_value ** (i + 1))))
+                    cluster = nn.HybridSequential()
+                    with cluster.name_scope():
+                        cluster.add(nn.Dense(proj_size, in_units=in_unit, use_bias=False,
+                                             flatten=False, dtype=dtype,
+                                             weight_initializer=weight_initializer))
+                        cluster.add(nn.Dense(self._cutoffs[i + 1] - self._cutoffs[i],
+                                             in_units=proj_size, flatten=False, dtype=dtype,
+                                             weight_initializer=weight_initializer,
+                                             bias_initializer=bias_initializer))
+                    self.tail.add(cluster)
+
+    def forward(self, x, label=None): # pylint: disable=arguments-differ
+        """Forward computation."""
+        shape = x.shape[:-1]
+        x = x.reshape((-1, self._in_unit))
+        head_log_probs = nd.log_softmax(self.head(x))
+        if label is None:
+            log_probs = [head_log_probs.slice_axis(axis=1, begin=0, end=self._cutoffs[0])]
+            for i, cluster in enumerate(self.tail):
+                cluster_log_probs = head_log_probs.slice_axis(axis=1, begin=self._cutoffs[0] + i,
+                                                              end=self._cutoffs[0] + i + 1)
+                log_probs.append(nd.broadcast_add(nd.log_softmax(cluster(x)),
+                                                  cluster_log_probs))
+            return nd.concat(*log_probs, dim=1).reshape(shape + (self._num_classes,))
+        ctx = x.context
+        label_np = label.reshape((-1,)).asnumpy().astype(np.int64)
+        # 0 for the head cluster and i + 1 for the i-th tail cluster
+        cluster_ids = np.searchsorted(self._cutoffs[:-1], label_np, side='right')
+        head_label = np.where(cluster_ids == 0, label_np, self._cutoffs[0] + cluster_ids - 1)
+        out = nd.pick(head_log_probs, nd.array(head_label, ctx=ctx), axis=1)
+        # Only the inputs whose targets are in a tail cluster go through that cluster
+        for i, cluster in enumerate(self.tail):
+            rows = np.nonzero(cluster_ids == i + 1)[0]
+            if not rows.size:
+                continue
+            rows_nd = nd.array(rows, ctx=ctx, dtype=np.int32)
+            cluster_log_probs = nd.log_softmax(cluster(x.take(rows_nd)))
+            cluster_label = nd.array(label_np[rows] - self._cutoffs[i], ctx=ctx)
+            cluster_out = nd.pick(cluster_log_probs, cluster_label, axis=1)
+            out = out + nd.scatter_nd(cluster_out, rows_nd.reshape((1, -1)),
+                                      shape=(len(label_np),))
+        return out.reshape(label.shape)
+
+    def __repr__(self):
+        s = '{name}({mapping})'
+        mapping = '{0} -> {1}, with cutoffs {2}'.format(self._in_unit, self._num_classes,
+                                                        self._cutoffs[:-1])
+        return s.format(name=self.__class__.__name__,
+                        mapping=mapping)
@@ -260,16 +260,56 @@ def _choose_states(F, states, state_info, indices):
         raise NotImplementedError
 
 
+def _merge_compacted_results(results):
+    """Merge the results of the sentences that are removed from the batch at different steps.
+
+    Parameters
+    ----------
+    results : list of tuple
+        Each tuple contains the ids of the sentences in the original batch and their samples,
+        scores and valid lengths.
+
+    Returns
+    -------
+    samples : NDArray
+        Shape (batch_size, beam_size, length). The samples are padded with -1.
+    scores : NDArray
+        Shape (batch_size, beam_size)
+    valid_length : NDArray
+        Shape (batch_size, beam_size)
+    """
+    length = max(samples.shape[2] for _, samples, _, _ in results)
+    samples_l = []
+    for _, samples, _, _ in results:
+        if samples.shape[2] < length:
+            pad_shape = samples.shape[:2] + (length - samples.shape[2],)
+            samples = mx.nd.concat(samples,
+                                   mx.nd.full(shape=pad_shape, val=-1, ctx=samples.context,
+                                              dtype=np.int32),
+                                   dim=2)
+        samples_l.append(samples)
+    ids = np.concatenate([ele[0] for ele in results])
+    order = mx.nd.array(np.argsort(ids), ctx=samples_l[0].context, dtype=np.int32)
+    samples = mx.nd.concat(*samples_l, dim=0).take(order)
+    scores = mx.nd.concat(*[ele[2] for ele in results], dim=0).take(order)
+    valid_length = mx.nd.concat(*[ele[3] for ele in results], dim=0).take(order)
+    return samples, scores, valid_length
+
+
 class _BeamSearchStepUpdate(HybridBlock):
     def __init__(self, beam_size, eos_id, scorer, state_info, single_step=False, \
-        prefix=None, params=None):
+        per_beam_topk=None, prefix=None, params=None):
         super(_BeamSearchStepUpdate, self).__init__(prefix, params)
         self._beam_size = beam_size
         self._eos_id = eos_id
         self._scorer = scorer
         self._state_info = state_info
         self._single_step = single_step
+        self._per_beam_topk = per_beam_topk
         assert eos_id >= 0, 'eos_id cannot be negative! Received eos_id={}'.format(eos_id)
+        assert per_beam_topk is None or per_beam_topk >= beam_size, \
+            'per_beam_topk must be no smaller than beam_size! Received per_beam_topk={}, ' \
+            'beam_size={}'.format(per_beam_topk, beam_size)
 
     def hybrid_forward(self, F, samples, valid_length, outputs, scores, step, beam_alive_mask,   # pylint: disable=arguments-differ
                        states, vocab_size, batch_shift):
@@ -325,23 +365,41 @@ class _BeamSearchStepUpdate(HybridBlock):
         beam_alive_mask_bcast = F.expand_dims(beam_alive_mask, axis=2).astype(np.float32)
         candidate_scores = self._scorer(outputs.reshape(shape=(-4, -1, beam_size, 0)),
                                         scores, step)
-        # Concat the candidate scores and the scores of the finished beams
-        # The resulting candidate score will have shape (batch_size, beam_size * |V| + beam_size)
+        if self._per_beam_topk is not None:
+            # Keep only the top candidates of each beam. The global top beam_size candidates
+            # are always among them, so the selected beams do not change. The alive mask is
+            # constant within a beam and is applied after the pruning.
+            candidate_scores, candidate_word_ids = F.topk(candidate_scores, axis=2,
+                                                          k=self._per_beam_topk, ret_typ='both')
+            candidate_word_ids = candidate_word_ids.astype(np.int32).reshape(shape=(-1,))
+            num_candidates = F.ones_like(vocab_size) * self._per_beam_topk
+        else:
+            num_candidates = vocab_size
         candidate_scores = F.broadcast_mul(beam_alive_mask_bcast, candidate_scores) + \
                            F.broadcast_mul(1 - beam_alive_mask_bcast,
                                            F.ones_like(candidate_scores) * LARGE_NEGATIVE_FLOAT)
         finished_scores = F.where(beam_alive_mask,
                                   F.ones_like(scores) * LARGE_NEGATIVE_FLOAT, scores)
+        # Concat the candidate scores and the scores of the finished beams
+        # The resulting candidate score will have shape
+        # (batch_size, beam_size * num_candidates + beam_size), where num_candidates is |V|, or
+        # per_beam_topk if the candidates are pruned
         candidate_scores = F.concat(candidate_scores.reshape(shape=(0, -1)),
                                     finished_scores, dim=1)
         # Get the top K scores
         new_scores, indices = F.topk(candidate_scores, axis=1, k=beam_size, ret_typ='both')
         indices = indices.astype(np.int32)
-        use_prev = F.broadcast_greater_equal(indices, beam_size * vocab_size)
-        chosen_word_ids = F.broadcast_mod(indices, vocab_size)
+        use_prev = F.broadcast_greater_equal(indices, beam_size * num_candidates)
+        if self._per_beam_topk is not None:
+            candidate_indices = F.broadcast_add(F.where(use_prev, F.zeros_like(indices), indices),
+                                                F.expand_dims(batch_shift, axis=1)
+                                                * self._per_beam_topk)
+            chosen_word_ids = F.take(candidate_word_ids, candidate_indices)
+        else:
+            chosen_word_ids = F.broadcast_mod(indices, vocab_size)
         beam_ids = F.where(use_prev,
-                           F.broadcast_minus(indices, beam_size * vocab_size),
-                           F.floor(F.broadcast_div(indices, vocab_size)))
+                           F.broadcast_minus(indices, beam_size * num_candidates),
+                           F.floor(F.broadcast_div(indices, num_candidates)))
         batch_beam_indices = F.broadcast_add(beam_ids, F.expand_dims(batch_shift, axis=1))
         chosen_word_ids = F.where(use_prev,
                                   -F.ones_like(indices),
@@ -469,9 +527,29 @@ class BeamSearchSampler(object):
         The score function used in beam search.
     max_length : int, default 100
         The maximum search length.
+    compact_finished : bool, default False
+        Whether to remove the sentences whose beams have all finished from the decoding batch.
+        The decoder will then be called with a smaller batch size once some sentences finish,
+        and the results of the finished sentences are merged back at the end.
+    per_beam_topk : int or None, default None
+        If not None, only the top per_beam_topk candidates of each beam are kept before selecting
+        the new beams, which makes the selection cost independent of the vocabulary size.
+        It must be no smaller than beam_size and no larger than the vocabulary size.
+    check_interval : int, default 1
+        Number of decoding steps between two checks of whether all the beams have finished.
+        Each check waits for the device, so a larger interval keeps the decoding asynchronous
+        at the cost of at most check_interval - 1 extra steps. The extra steps only pad the
+        samples with -1.
+    optimal_stopping : bool, default False
+        Whether to stop a sentence once none of its alive beams can reach the score of its best
+        finished beam. The upper bound of an alive beam is computed with the length penalty of
+        the BeamSearchScorer at max_length, assuming that the decoder outputs log probabilities.
+        The best beam is then the same as without the early stop, and the other alive beams of
+        the sentence are returned without the EOS token.
     """
     def __init__(self, beam_size, decoder, eos_id, scorer=BeamSearchScorer(alpha=1.0, K=5),
-                 max_length=100):
+                 max_length=100, compact_finished=False, per_beam_topk=None, check_interval=1,
+                 optimal_stopping=False):
         self._beam_size = beam_size
         assert beam_size > 0,\
             'beam_size must be larger than 0. Received beam_size={}'.format(beam_size)
@@ -480,12 +558,21 @@ class BeamSearchSampler(object):
         assert eos_id >= 0, 'eos_id cannot be negative! Received eos_id={}'.format(eos_id)
         self._max_length = max_length
         self._scorer = scorer
+        self._compact_finished = compact_finished
+        self._check_interval = check_interval
+        assert check_interval > 0, \
+            'check_interval must be larger than 0. Received check_interval={}'\
+            .format(check_interval)
+        self._optimal_stopping = optimal_stopping
+        if optimal_stopping:
+            assert isinstance(scorer, BeamSearchScorer) and scorer._alpha >= 0, \
+                'optimal_stopping requires a BeamSearchScorer with a non-negative alpha.'
         if hasattr(decoder, 'state_info'):
             state_info = decoder.state_info()
         else:
             state_info = None
         self._updater = _BeamSearchStepUpdate(beam_size=beam_size, eos_id=eos_id, scorer=scorer,
-                                              state_info=state_info)
+                                              state_info=state_info, per_beam_topk=per_beam_topk)
         self._updater.hybridize()
 
     def __call__(self, inputs, states):
@@ -529,27 +616,88 @@ class BeamSearchSampler(object):
         if beam_size > 1:
             scores[:, 1:beam_size] = LARGE_NEGATIVE_FLOAT
         samples = step_input.reshape((batch_size, beam_size, 1))
+        # Ids of the sentences in the decoding batch and the results of the removed sentences.
+        # They are only used when compact_finished is turned on.
+        live_ids = np.arange(batch_size)
+        finished = []
         for i in range(self._max_length):
             log_probs, new_states = self._decoder(step_input, states)
             vocab_size_nd = mx.nd.array([log_probs.shape[1]], ctx=ctx, dtype=np.int32)
-            batch_shift_nd = mx.nd.arange(0, batch_size * beam_size, beam_size, ctx=ctx,
+            batch_shift_nd = mx.nd.arange(0, len(live_ids) * beam_size, beam_size, ctx=ctx,
                                           dtype=np.int32)
             step_nd = mx.nd.array([i + 1], ctx=ctx)
             samples, valid_length, scores, chosen_word_ids, beam_alive_mask, states = \
                 self._updater(samples, valid_length, log_probs, scores, step_nd, beam_alive_mask,
                               new_states, vocab_size_nd, batch_shift_nd)
             step_input = mx.nd.relu(chosen_word_ids).reshape((-1,))
-            if mx.nd.sum(beam_alive_mask).asscalar() == 0:
+            if self._optimal_stopping:
+                beam_alive_mask = self._stop_unbeatable(scores, beam_alive_mask, i + 1)
+            if (i + 1) % self._check_interval != 0:
+                continue
+            if self._compact_finished:
+                sentence_alive = beam_alive_mask.asnumpy().any(axis=1)
+                if sentence_alive.all():
+                    continue
+                finished_ind = mx.nd.array(np.nonzero(~sentence_alive)[0], ctx=ctx,
+                                           dtype=np.int32)
+                finished.append((live_ids[~sentence_alive], samples.take(finished_ind),
+                                 scores.take(finished_ind), valid_length.take(finished_ind)))
+                live_ids = live_ids[sentence_alive]
+                if len(live_ids) == 0:
+                    return _merge_compacted_results(finished)
+                live_ind = np.nonzero(sentence_alive)[0]
+                row_ind = mx.nd.array((live_ind.reshape((-1, 1)) * beam_size
+                                       + np.arange(beam_size)).reshape((-1,)),
+                                      ctx=ctx, dtype=np.int32)
+                live_ind = mx.nd.array(live_ind, ctx=ctx, dtype=np.int32)
+                samples, scores, valid_length, beam_alive_mask = \
+                    [ele.take(live_ind) for ele in [samples, scores, valid_length,
+                                                    beam_alive_mask]]
+                step_input = step_input.take(row_ind)
+                states = _choose_states(mx.nd, states, state_info, row_ind)
+            elif mx.nd.sum(beam_alive_mask).asscalar() == 0:
                 return samples, scores, valid_length
         final_word = mx.nd.where(beam_alive_mask,
-                                 mx.nd.full(shape=(batch_size, beam_size),
+                                 mx.nd.full(shape=(len(live_ids), beam_size),
                                             val=self._eos_id, ctx=ctx, dtype=np.int32),
-                                 mx.nd.full(shape=(batch_size, beam_size),
+                                 mx.nd.full(shape=(len(live_ids), beam_size),
                                             val=-1, ctx=ctx, dtype=np.int32))
         samples = mx.nd.concat(samples, final_word.reshape((0, 0, 1)), dim=2)
         valid_length += beam_alive_mask
+        if finished:
+            finished.append((live_ids, samples, scores, valid_length))
+            return _merge_compacted_results(finished)
         return samples, scores, valid_length
 
+    def _stop_unbeatable(self, scores, beam_alive_mask, step):
+        """Mark the alive beams of a sentence as finished if none of them can beat the best
+        finished beam of the sentence.
+
+        Parameters
+        ----------
+        scores : NDArray
+            Shape (batch_size, beam_size)
+        beam_alive_mask : NDArray
+            Shape (batch_size, beam_size)
+        step : int
+            The current step. Begins from 1.
+
+        Returns
+        -------
+        beam_alive_mask : NDArray
+            Shape (batch_size, beam_size)
+        """
+        # The log probability of a beam can only decrease, so the best reachable score is
+        # obtained with the largest length penalty, i.e., the one at max_length.
+        ratio = (float(self._scorer._K + step) / (self._scorer._K + self._max_length)) \
+                ** self._scorer._alpha
+        large_negative = mx.nd.ones_like(scores) * LARGE_NEGATIVE_FLOAT
+        best_finished = mx.nd.where(beam_alive_mask, large_negative, scores).max(axis=1)
+        best_alive = mx.nd.where(beam_alive_mask, scores * ratio, large_negative).max(axis=1)
+        return mx.nd.broadcast_mul(beam_alive_mask,
+                                   (best_alive > best_finished).astype(np.int32)
+                                   .reshape((-1, 1)))
+
 
 class HybridBeamSearchSampler(HybridBlock):
     r"""Draw samples from the decoder by beam search.
@@ -579,10 +727,14 @@ class HybridBeamSearchSampler(HybridBlock):
         The maximum search length.
     vocab_size : int, default None, meaning `decoder._vocab_size`
         The vocabulary size
+    per_beam_topk : int or None, default None
+        If not None, only the top per_beam_topk candidates of each beam are kept before selecting
+        the new beams, which makes the selection cost independent of the vocabulary size.
+        It must be no smaller than beam_size and no larger than the vocabulary size.
     """
     def __init__(self, batch_size, beam_size, decoder, eos_id,
                  scorer=BeamSearchScorer(alpha=1.0, K=5),
-                 max_length=100, vocab_size=None,
+                 max_length=100, vocab_size=None, per_beam_topk=None,
                  prefix=None, params=None):
         super(HybridBeamSearchSampler, self).__init__(prefix, params)
         self._batch_size = batch_size
@@ -596,7 +748,8 @@ class HybridBeamSearchSampler(HybridBlock):
         self._scorer = scorer
         self._state_info_func = getattr(decoder, 'state_info', lambda _=None: None)
         self._updater = _BeamSearchStepUpdate(beam_size=beam_size, eos_id=eos_id, scorer=scorer,
-                                              single_step=True, state_info=self._state_info_func())
+                                              single_step=True, state_info=self._state_info_func(),
+                                              per_beam_topk=per_beam_topk)
         self._updater.hybridize()
         self._vocab_size = vocab_size or getattr(decoder, '_vocab_size', None)
         assert self._vocab_size is not None,\
@@ -604,6 +757,9 @@ class HybridBeamSearchSampler(HybridBlock):
         assert not hasattr(decoder, '_vocab_size') or decoder._vocab_size == self._vocab_size, \
             'Provided vocab_size={} is not equal to decoder._vocab_size={}'\
             .format(self._vocab_size, decoder._vocab_size)
+        assert per_beam_topk is None or per_beam_topk <= self._vocab_size, \
+            'per_beam_topk must be no larger than vocab_size! Received per_beam_topk={}, ' \
+            'vocab_size={}'.format(per_beam_topk, self._vocab_size)
 
     def hybrid_forward(self, F, inputs, states):   # pylint: disable=arguments-differ
         """Sample by beam search.
@@ -736,13 +892,23 @@ class SequenceSampler(object):
         The maximum search length.
     temperature : float, default 1.0
         Softmax temperature.
+    check_interval : int, default 1
+        Number of decoding steps between two checks of whether all the samples have finished.
+        Each check waits for the device, so a larger interval keeps the decoding asynchronous
+        at the cost of at most check_interval - 1 extra steps. The extra steps only pad the
+        samples with -1.
     """
-    def __init__(self, beam_size, decoder, eos_id, max_length=100, temperature=1.0):
+    def __init__(self, beam_size, decoder, eos_id, max_length=100, temperature=1.0,
+                 check_interval=1):
         self._beam_size = beam_size
         self._decoder = decoder
         self._eos_id = eos_id
         assert eos_id >= 0, 'eos_id cannot be negative! Received eos_id={}'.format(eos_id)
         self._max_length = max_length
+        self._check_interval = check_interval
+        assert check_interval > 0, \
+            'check_interval must be larger than 0. Received check_interval={}'\
+            .format(check_interval)
         self._updater = _SamplingStepUpdate(beam_size=beam_size,
                                             eos_id=eos_id,
                                             temperature=temperature)
@@ -786,12 +952,13 @@ class SequenceSampler(object):
         scores = mx.nd.zeros(shape=(batch_size, beam_size), ctx=ctx)
         scores = 0.
         samples = step_input.reshape((batch_size, beam_size, 1)).astype(np.int32)
-        for _ in range(self._max_length):
+        for i in range(self._max_length):
             outputs, new_states = self._decoder(step_input, states)
             samples, valid_length, scores, chosen_word_ids, beam_alive_mask, states = \
                 self._updater(samples, valid_length, outputs, scores, beam_alive_mask, new_states)
             step_input = mx.nd.relu(chosen_word_ids).reshape((-1,))
-            if mx.nd.sum(beam_alive_mask).asscalar() == 0:
+            if (i + 1) % self._check_interval == 0 and \
+                    mx.nd.sum(beam_alive_mask).asscalar() == 0:
                 return samples, scores, valid_length
         final_word = mx.nd.where(beam_alive_mask,
                                  mx.nd.full(shape=(batch_size, beam_size),
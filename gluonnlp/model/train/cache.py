@@ -104,58 +104,66 @@ class CacheCell(Block):
         Parameters
         ----------
         inputs: NDArray
-            The input data
+            The input data with shape `(sequence_length, batch_size)`
         target: NDArray
-            The label
-        next_word_history: NDArray
-            The next word in memory
-        cache_history: NDArray
-            The hidden state in cache history
+            The label with shape `(sequence_length, batch_size)`
+        next_word_history: NDArray or None
+            The indices of the next words in memory with shape `(window, batch_size)`.
+            Empty slots are filled with -1. None means that the memory is empty.
+        cache_history: NDArray or None
+            The hidden states in memory with shape `(window, batch_size, num_hidden)`.
+            None means that the memory is empty.
 
 
         Returns
         --------
         out: NDArray
             The linear interpolation of the cache language model
-            with the regular word-level language model
+            with the regular word-level language model. It is the probability of the
+            target words with shape `(sequence_length, batch_size)`
         next_word_history: NDArray
-            The next words to be kept in the memory for look up
-            (size is equal to the window size)
+            The indices of the next words to be kept in the memory for look up
+            with shape `(window, batch_size)`
         cache_history: NDArray
             The hidden states to be kept in the memory for look up
-            (size is equal to the window size)
+            with shape `(window, batch_size, num_hidden)`
         """
         output, hidden, encoder_hs, _ = \
             super(self.lm_model.__class__, self.lm_model).\
                 forward(inputs, begin_state)
-        encoder_h = encoder_hs[-1].reshape(-3, -2)
-        output = output.reshape(-1, self._vocab_size)
-
-        start_idx = len(next_word_history) \
-            if next_word_history is not None else 0
-        next_word_history = nd.concat(*[nd.one_hot(t[0], self._vocab_size, on_value=1, off_value=0)
-                                        for t in target], dim=0) if next_word_history is None \
-            else nd.concat(next_word_history,
-                           nd.concat(*[nd.one_hot(t[0], self._vocab_size, on_value=1, off_value=0)
-                                       for t in target], dim=0), dim=0)
-        cache_history = encoder_h if cache_history is None \
-            else nd.concat(cache_history, encoder_h, dim=0)
-
-        out = None
-        softmax_output = nd.softmax(output)
-        for idx, vocab_L in enumerate(softmax_output):
-            joint_p = vocab_L
-            if start_idx + idx > self._window:
-                valid_next_word = next_word_history[start_idx + idx - self._window:start_idx + idx]
-                valid_cache_history = cache_history[start_idx + idx - self._window:start_idx + idx]
-                logits = nd.dot(valid_cache_history, encoder_h[idx])
-                cache_attn = nd.softmax(self._theta * logits).reshape(-1, 1)
-                cache_dist = (cache_attn.broadcast_to(valid_next_word.shape)
-                              * valid_next_word).sum(axis=0)
-                joint_p = self._lambdas * cache_dist + (1 - self._lambdas) * vocab_L
-
-            out = joint_p[target[idx]] if out is None \
-                else nd.concat(out, joint_p[target[idx]], dim=0)
-        next_word_history = next_word_history[-self._window:]
-        cache_history = cache_history[-self._window:]
+        encoder_h = encoder_hs[-1]
+        seq_len, batch_size, num_hidden = encoder_h.shape
+        ctx = encoder_h.context
+        target = target.astype('int32')
+        if next_word_history is None:
+            next_word_history = nd.full((self._window, batch_size), -1, ctx=ctx, dtype='int32')
+        if cache_history is None:
+            cache_history = nd.zeros((self._window, batch_size, num_hidden), ctx=ctx,
+                                     dtype=encoder_h.dtype)
+
+        vocab_p = nd.pick(nd.log_softmax(output), target, axis=2).exp()
+        # The memory followed by the current sequence. Position t of the sequence is at
+        # window + t and attends to the window positions before it, i.e., [t, window + t).
+        history = nd.concat(cache_history, encoder_h, dim=0)
+        next_words = nd.concat(next_word_history, target, dim=0)
+        logits = nd.batch_dot(encoder_h.transpose((1, 0, 2)), history.transpose((1, 0, 2)),
+                              transpose_b=True) * self._theta
+        offset = nd.arange(self._window + seq_len, ctx=ctx).reshape((1, -1)) \
+                 - nd.arange(seq_len, ctx=ctx).reshape((-1, 1))
+        in_window = (offset >= 0) * (offset < self._window)
+        logits = nd.where(nd.broadcast_to(in_window.expand_dims(0), shape=logits.shape), logits,
+                          nd.ones_like(logits) * -1e18)
+        cache_attn = nd.softmax(logits, axis=2)
+        # The cache probability of a target sums up the attention over its occurrences.
+        is_target = nd.broadcast_equal(next_words.T.expand_dims(1), target.T.expand_dims(2))
+        cache_p = (cache_attn * is_target.astype(cache_attn.dtype)).sum(axis=2).T
+        # The cache is used once more than window words have been seen.
+        num_seen = (next_word_history[:, 0] >= 0).sum().astype('float32')
+        use_cache = nd.broadcast_greater(nd.arange(seq_len, ctx=ctx) + num_seen,
+                                         nd.array([self._window], ctx=ctx)).reshape((-1, 1))
+        out = nd.broadcast_add(nd.broadcast_mul(use_cache, self._lambdas * cache_p
+                                                + (1 - self._lambdas) * vocab_p),
+                               nd.broadcast_mul(1 - use_cache, vocab_p))
+        next_word_history = next_words.slice_axis(axis=0, begin=seq_len, end=None)
+        cache_history = history.slice_axis(axis=0, begin=seq_len, end=None)
         return out, next_word_history, cache_history, hidden
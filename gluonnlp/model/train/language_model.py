@@ -23,7 +23,7 @@ from mxnet import init, nd, autograd
 from mxnet.gluon import nn, Block, contrib, rnn
 
 from ..utils import _get_rnn_layer, apply_weight_drop
-from ..sampled_block import ISLogits, SparseISLogits
+from ..sampled_block import ISLogits, SparseISLogits, AdaptiveSoftmax
 
 class AWDRNN(Block):
     """AWD language model by salesforce.
@@ -56,10 +56,16 @@ class AWDRNN(Block):
         Dropout rate to on the output of embedding.
     drop_e : float
         Dropout rate to use on the embedding layer.
+    adaptive_softmax_cutoffs : list of int or None, default None
+        If not None, use an `AdaptiveSoftmax` decoder with these cutoffs instead of the dense
+        decoder. The model then outputs log probabilities instead of unnormalized scores, or
+        only the log-likelihood of the targets if they are passed to `forward`.
     """
     def __init__(self, mode, vocab_size, embed_size=400, hidden_size=1150, num_layers=3,
                  tie_weights=True, dropout=0.4, weight_drop=0.5, drop_h=0.2,
-                 drop_i=0.65, drop_e=0.1, **kwargs):
+                 drop_i=0.65, drop_e=0.1, adaptive_softmax_cutoffs=None, **kwargs):
+        assert not (tie_weights and adaptive_softmax_cutoffs), \
+            'Weights cannot be tied with the adaptive softmax decoder.'
         super(AWDRNN, self).__init__(**kwargs)
         self._mode = mode
         self._vocab_size = vocab_size
@@ -72,6 +78,7 @@ class AWDRNN(Block):
         self._drop_e = drop_e
         self._weight_drop = weight_drop
         self._tie_weights = tie_weights
+        self._adaptive_softmax_cutoffs = adaptive_softmax_cutoffs
 
         with self.name_scope():
             self.embedding = self._get_embedding()
@@ -101,6 +108,9 @@ class AWDRNN(Block):
         return encoder
 
     def _get_decoder(self):
+        if self._adaptive_softmax_cutoffs:
+            return AdaptiveSoftmax(self._vocab_size, self._hidden_size,
+                                   self._adaptive_softmax_cutoffs)
         output = nn.HybridSequential()
         with output.name_scope():
             if self._tie_weights:
@@ -116,7 +126,7 @@ class AWDRNN(Block):
     def state_info(self, *args, **kwargs):
         return [c.state_info(*args, **kwargs) for c in self.encoder]
 
-    def forward(self, inputs, begin_state=None): # pylint: disable=arguments-differ
+    def forward(self, inputs, begin_state=None, target=None): # pylint: disable=arguments-differ
         """Implement the forward computation that the awd language model and cache model use.
 
         Parameters
@@ -127,12 +137,16 @@ class AWDRNN(Block):
         begin_state : list
             initial recurrent state tensor with length equals to num_layers.
             the initial state with shape `(1, batch_size, num_hidden)`
+        target : NDArray or None, default None
+            The target tokens with shape `(sequence_length, batch_size)`. Only supported with
+            the adaptive softmax decoder, whose full output is not computed if it is passed.
 
         Returns
         --------
         out: NDArray
             output tensor with shape `(sequence_length, batch_size, input_size)`
-            when `layout` is "TNC".
+            when `layout` is "TNC". If `target` is passed, the log-likelihood of the targets
+            with shape `(sequence_length, batch_size)`.
         out_states: list
             output recurrent state tensor with length equals to num_layers.
             the state with shape `(1, batch_size, num_hidden)`
@@ -161,9 +175,16 @@ class AWDRNN(Block):
             encoded = nd.Dropout(encoded, p=self._dropout, axes=(0,))
         encoded_dropped.append(encoded)
         with autograd.predict_mode():
-            out = self.decoder(encoded)
+            out = self._decode(encoded, target)
         return out, out_states, encoded_raw, encoded_dropped
 
+    def _decode(self, encoded, target):
+        if target is None:
+            return self.decoder(encoded)
+        assert self._adaptive_softmax_cutoffs, \
+            'target can only be passed with the adaptive softmax decoder.'
+        return self.decoder(encoded, target)
+
 
 class StandardRNN(Block):
     """Standard RNN language model.
@@ -184,9 +205,16 @@ class StandardRNN(Block):
         Dropout rate to use for encoder output.
     tie_weights : bool, default False
         Whether to tie the weight matrices of output dense layer and input embedding layer.
+    adaptive_softmax_cutoffs : list of int or None, default None
+        If not None, use an `AdaptiveSoftmax` decoder with these cutoffs instead of the dense
+        decoder. The model then outputs log probabilities instead of unnormalized scores, or
+        only the log-likelihood of the targets if they are passed to `forward`.
     """
     def __init__(self, mode, vocab_size, embed_size, hidden_size,
-                 num_layers, dropout=0.5, tie_weights=False, **kwargs):
+                 num_layers, dropout=0.5, tie_weights=False, adaptive_softmax_cutoffs=None,
+                 **kwargs):
+        assert not (tie_weights and adaptive_softmax_cutoffs), \
+            'Weights cannot be tied with the adaptive softmax decoder.'
         if tie_weights:
             assert embed_size == hidden_size, 'Embedding dimension must be equal to ' \
                                               'hidden dimension in order to tie weights. ' \
@@ -200,6 +228,7 @@ class StandardRNN(Block):
         self._dropout = dropout
         self._tie_weights = tie_weights
         self._vocab_size = vocab_size
+        self._adaptive_softmax_cutoffs = adaptive_softmax_cutoffs
 
         with self.name_scope():
             self.embedding = self._get_embedding()
@@ -220,6 +249,9 @@ class StandardRNN(Block):
                               self._hidden_size, self._dropout, 0)
 
     def _get_decoder(self):
+        if self._adaptive_softmax_cutoffs:
+            return AdaptiveSoftmax(self._vocab_size, self._hidden_size,
+                                   self._adaptive_softmax_cutoffs)
         output = nn.HybridSequential()
         with output.name_scope():
             if self._tie_weights:
@@ -235,7 +267,7 @@ class StandardRNN(Block):
     def state_info(self, *args, **kwargs):
         return self.encoder.state_info(*args, **kwargs)
 
-    def forward(self, inputs, begin_state=None): # pylint: disable=arguments-differ
+    def forward(self, inputs, begin_state=None, target=None): # pylint: disable=arguments-differ
         """Defines the forward computation. Arguments can be either
         :py:class:`NDArray` or :py:class:`Symbol`.
 
@@ -247,12 +279,16 @@ class StandardRNN(Block):
         begin_state : list
             initial recurrent state tensor with length equals to num_layers-1.
             the initial state with shape `(num_layers, batch_size, num_hidden)`
+        target : NDArray or None, default None
+            The target tokens with shape `(sequence_length, batch_size)`. Only supported with
+            the adaptive softmax decoder, whose full output is not computed if it is passed.
 
         Returns
         --------
         out: NDArray
             output tensor with shape `(sequence_length, batch_size, input_size)`
-            when `layout` is "TNC".
+            when `layout` is "TNC". If `target` is passed, the log-likelihood of the targets
+            with shape `(sequence_length, batch_size)`.
         out_states: list
             output recurrent state tensor with length equals to num_layers-1.
             the state with shape `(num_layers, batch_size, num_hidden)`
@@ -272,9 +308,16 @@ class StandardRNN(Block):
         encoded_raw.append(encoded)
         if self._dropout:
             encoded = nd.Dropout(encoded, p=self._dropout, axes=(0,))
-        out = self.decoder(encoded)
+        out = self._decode(encoded, target)
         return out, state, encoded_raw, encoded_dropped
 
+    def _decode(self, encoded, target):
+        if target is None:
+            return self.decoder(encoded)
+        assert self._adaptive_softmax_cutoffs, \
+            'target can only be passed with the adaptive softmax decoder.'
+        return self.decoder(encoded, target)
+
 class BigRNN(Block):
     """Big language model with LSTMP and importance sampling.
 
@@ -305,6 +348,9 @@ class BigRNN(Block):
     sparse_grad : bool
         Whether to use RowSparseNDArray for the gradients w.r.t.
         weights of input and output embeddings.
+    adaptive_softmax_cutoffs : list of int or None, default None
+        If not None, use an `AdaptiveSoftmax` decoder with these cutoffs instead of
+        importance sampling. `num_sampled` and `sampled_values` are then ignored.
 
     .. note: If `sparse_grad` is set to True, the gradient w.r.t input and output
              embeddings will be sparse. Only a subset of optimizers support
@@ -322,7 +368,7 @@ class BigRNN(Block):
     """
     def __init__(self, vocab_size, embed_size, hidden_size, num_layers,
                  projection_size, num_sampled, embed_dropout=0.0, encode_dropout=0.0,
-                 sparse_weight=True, sparse_grad=True, **kwargs):
+                 sparse_weight=True, sparse_grad=True, adaptive_softmax_cutoffs=None, **kwargs):
         super(BigRNN, self).__init__(**kwargs)
         self._embed_size = embed_size
         self._hidden_size = hidden_size
@@ -334,6 +380,7 @@ class BigRNN(Block):
         self._num_sampled = num_sampled
         self._sparse_weight = sparse_weight
         self._sparse_grad = sparse_grad
+        self._adaptive_softmax_cutoffs = adaptive_softmax_cutoffs
         if self._sparse_weight:
             assert self._sparse_grad, 'Dense grad with sparse weight is not supported.'
 
@@ -372,6 +419,9 @@ class BigRNN(Block):
 
     def _get_decoder(self):
         prefix = 'decoder0_'
+        if self._adaptive_softmax_cutoffs:
+            return AdaptiveSoftmax(self._vocab_size, self._projection_size,
+                                   self._adaptive_softmax_cutoffs, prefix=prefix)
         if self._sparse_weight:
             # sparse IS logits has both sparse weight and sparse grad
             block = SparseISLogits(self._vocab_size, self._num_sampled,
@@ -407,20 +457,23 @@ class BigRNN(Block):
         --------
         out : NDArray
             output tensor with shape `(sequence_length, batch_size, 1+num_samples)`
-            when `layout` is "TNC".
+            when `layout` is "TNC". With the adaptive softmax decoder, it is the
+            log-likelihood of the labels with shape `(sequence_length, batch_size)`.
         out_states : list
             output recurrent state tensor with length equals to num_layers*2.
             For each layer the two initial states have shape `(batch_size, num_hidden)`
             and `(batch_size, num_projection)`
-        new_target : NDArray
+        new_target : NDArray or None
             output tensor with shape `(sequence_length, batch_size)`
-            when `layout` is "TNC".
+            when `layout` is "TNC". None with the adaptive softmax decoder.
         """
         encoded = self.embedding(inputs)
         length = inputs.shape[0]
         batch_size = inputs.shape[1]
         encoded, out_states = self.encoder.unroll(length, encoded, begin_state,
                                                   layout='TNC', merge_outputs=True)
+        if self._adaptive_softmax_cutoffs:
+            return self.decoder(encoded, label.reshape((length, batch_size))), out_states, None
         out, new_target = self.decoder(encoded, sampled_values, label)
         out = out.reshape((length, batch_size, -1))
         new_target = new_target.reshape((length, batch_size))
@@ -0,0 +1,324 @@
+# coding: utf-8
+
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Array-backed token tables and their binary file format."""
+
+import itertools
+import json
+import mmap
+import os
+import struct
+import zlib
+
+try:
+    from collections.abc import Mapping, Sequence
+except ImportError:
+    from collections import Mapping, Sequence
+
+import numpy as np
+
+from ..base import _str_types
+
+_MAGIC = b'GNLPVOC1'
+_ALIGNMENT = 8
+
+
+def _hash(data):
+    """Hash of the UTF-8 bytes of a token, stable across processes."""
+    return zlib.crc32(data) & 0xffffffff
+
+
+class _TokenTable(object):
+    """Tokens stored as one UTF-8 blob with their offsets, and an open-addressing hash table.
+
+    Token `i` is `blob[offsets[i]:offsets[i + 1]]`. The hash table has a power of two number of
+    slots holding token indices, or -1 for empty slots, and is probed linearly from the slot of
+    the CRC32 of the token.
+
+    Tables memory-mapped from a file keep its absolute path, size and modification time, and
+    are pickled as a reference to the file.
+    """
+    def __init__(self, blob, offsets, table, blob_start=0, filename=None, file_stat=None):
+        self._blob = blob
+        self._blob_start = blob_start
+        self._offsets = offsets
+        self._table = table
+        self._filename = filename
+        self._file_stat = file_stat
+
+    @staticmethod
+    def from_tokens(tokens):
+        """Build the table of a list of distinct str tokens."""
+        for token in tokens:
+            if not isinstance(token, _str_types):
+                raise TypeError('Only str tokens can be stored in a token table, but got {}.'
+                                .format(type(token)))
+        encoded = [token.encode('utf-8') for token in tokens]
+        offsets = np.zeros((len(encoded) + 1,), dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)),
+                  out=offsets[1:])
+        hashes = np.fromiter(map(_hash, encoded), dtype=np.int64, count=len(encoded))
+
+        # Keep the load factor at most 0.5
+        size = 2
+        while size < 2 * len(encoded):
+            size *= 2
+        table = np.full((size,), -1, dtype=np.int32)
+        slots = hashes & (size - 1)
+        pending = np.arange(len(encoded))
+        while len(pending):
+            # Tokens whose slot is empty claim it, the first of them wins ties. The others probe
+            # the next slot, which preserves the linear probing invariant.
+            empty = table[slots[pending]] == -1
+            candidates = pending[empty]
+            claimed_slots, first = np.unique(slots[candidates], return_index=True)
+            table[claimed_slots] = candidates[first]
+            claimed = np.zeros((len(encoded),), dtype=bool)
+            claimed[candidates[first]] = True
+            pending = pending[~claimed[pending]]
+            slots[pending] = (slots[pending] + 1) & (size - 1)
+        return _TokenTable(b''.join(encoded), offsets, table)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __reduce__(self):
+        if self._filename is not None:
+            # Memory-mapped tables are mapped again instead of being copied
+            return (_reload_table, (self._filename, self._file_stat))
+        blob = bytes(self._blob[self._blob_start:self._blob_start + int(self._offsets[-1])])
+        return (_TokenTable, (blob, np.asarray(self._offsets), np.asarray(self._table)))
+
+    @property
+    def nbytes(self):
+        """Number of bytes of the arrays of the table."""
+        return int(self._offsets[-1]) + self._offsets.nbytes + self._table.nbytes
+
+    def token(self, idx):
+        """Return the token of index `idx`."""
+        start = self._blob_start + int(self._offsets[idx])
+        end = self._blob_start + int(self._offsets[idx + 1])
+        return self._blob[start:end].decode('utf-8')
+
+    def index(self, token):
+        """Return the index of `token`, or -1 if it is not in the table."""
+        if not isinstance(token, _str_types):
+            return -1
+        data = token.encode('utf-8')
+        table = self._table
+        mask = len(table) - 1
+        slot = _hash(data) & mask
+        while True:
+            idx = int(table[slot])
+            if idx < 0:
+                return -1
+            start = self._blob_start + int(self._offsets[idx])
+            end = self._blob_start + int(self._offsets[idx + 1])
+            if end - start == len(data) and self._blob[start:end] == data:
+                return idx
+            slot = (slot + 1) & mask
+
+    def indices(self, tokens):
+        """Return the int64 indices of a list of tokens, or -1 for tokens not in the table.
+
+        The distinct tokens are hashed in one pass, and then probed together with array
+        operations.
+        """
+        # Tokens repeat in a corpus, so only the distinct ones are looked up
+        distinct = dict(zip(dict.fromkeys(tokens), itertools.count()))
+        inverse = np.fromiter(map(distinct.__getitem__, tokens), dtype=np.int64,
+                              count=len(tokens))
+        is_str = None
+        try:
+            encoded = [token.encode('utf-8') for token in distinct]
+        except AttributeError:
+            # Tokens that are not str are not in the table
+            is_str = np.array([isinstance(token, _str_types) for token in distinct], dtype=bool)
+            encoded = [token.encode('utf-8') if valid else b''
+                       for token, valid in zip(distinct, is_str)]
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        starts = np.zeros((len(encoded),), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=starts[1:])
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        blob = np.frombuffer(self._blob, dtype=np.uint8)
+        mask = len(self._table) - 1
+        slots = np.fromiter(map(zlib.crc32, encoded), dtype=np.int64, count=len(encoded)) & mask
+        result = np.full((len(encoded),), -1, dtype=np.int64)
+        pending = np.arange(len(encoded))
+        while len(pending):
+            candidates = self._table[slots[pending]].astype(np.int64)
+            # Tokens that reach an empty slot are not in the table
+            occupied = candidates >= 0
+            pending, candidates = pending[occupied], candidates[occupied]
+            candidate_starts = self._blob_start + self._offsets[candidates]
+            same_length = (self._offsets[candidates + 1] + self._blob_start - candidate_starts
+                           == lengths[pending])
+            # Compare the bytes of the tokens with the bytes of the candidates of the same
+            # length, all concatenated
+            compared = pending[same_length]
+            compared_lengths = lengths[compared]
+            ends = np.cumsum(compared_lengths)
+            token_bytes = np.repeat(starts[compared] - ends + compared_lengths,
+                                    compared_lengths) + np.arange(ends[-1] if len(ends) else 0)
+            candidate_bytes = token_bytes + np.repeat(candidate_starts[same_length]
+                                                      - starts[compared], compared_lengths)
+            num_differ = np.concatenate([[0], np.cumsum(data[token_bytes]
+                                                        != blob[candidate_bytes])])
+            equal = num_differ[ends] == num_differ[ends - compared_lengths]
+            result[compared[equal]] = candidates[same_length][equal]
+            found = np.zeros((len(encoded),), dtype=bool)
+            found[compared[equal]] = True
+            pending = pending[~found[pending]]
+            slots[pending] = (slots[pending] + 1) & mask
+        if is_str is not None:
+            result[~is_str] = -1
+        return result[inverse]
+
+    def save(self, filename, header):
+        """Write the table and a json serializable header to a binary file."""
+        header = dict(header, num_tokens=len(self), table_size=len(self._table),
+                      blob_size=int(self._offsets[-1]))
+        header = json.dumps(header).encode('utf-8')
+        start = len(_MAGIC) + 8 + len(header)
+        padding = b'\0' * (-start % _ALIGNMENT)
+        blob = self._blob[self._blob_start:self._blob_start + int(self._offsets[-1])]
+        with open(filename, 'wb') as f:
+            f.write(_MAGIC)
+            f.write(struct.pack('<Q', len(header)))
+            f.write(header)
+            f.write(padding)
+            f.write(np.asarray(self._offsets, dtype='<i8').tobytes())
+            f.write(np.asarray(self._table, dtype='<i4').tobytes())
+            f.write(bytes(blob))
+
+    @staticmethod
+    def load(filename, mmap_mode=True):
+        """Read a table written by `save`, and return it with its header."""
+        with open(filename, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            if mmap_mode:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                data = f.read()
+        if data[:len(_MAGIC)] != _MAGIC:
+            raise ValueError('{} is not a binary vocabulary file.'.format(filename))
+        header_size, = struct.unpack('<Q', data[len(_MAGIC):len(_MAGIC) + 8])
+        start = len(_MAGIC) + 8
+        header = json.loads(data[start:start + header_size].decode('utf-8'))
+        start += header_size
+        start += -start % _ALIGNMENT
+        offsets = np.frombuffer(data, dtype='<i8', count=header['num_tokens'] + 1,
+                                offset=start)
+        start += offsets.nbytes
+        table = np.frombuffer(data, dtype='<i4', count=header['table_size'], offset=start)
+        start += table.nbytes
+        if start + header['blob_size'] != len(data):
+            raise ValueError('{} is truncated or corrupted.'.format(filename))
+        if mmap_mode:
+            table = _TokenTable(data, offsets, table, blob_start=start,
+                                filename=os.path.abspath(filename),
+                                file_stat=(stat.st_size, stat.st_mtime))
+        else:
+            table = _TokenTable(data, offsets, table, blob_start=start)
+        return table, header
+
+
+def _reload_table(filename, file_stat=None):
+    """Map again the file of a pickled table, which must not have changed since it was loaded."""
+    table = _TokenTable.load(filename)[0]
+    if file_stat is not None and table._file_stat != tuple(file_stat):
+        raise ValueError('{} changed since the vocabulary was loaded from it.'.format(filename))
+    return table
+
+
+class _TokenList(Sequence):
+    """Read-only list of the tokens of a `_TokenTable`, used as `idx_to_token`."""
+    def __init__(self, table):
+        self._table = table
+
+    def __len__(self):
+        return len(self._table)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self._table.token(i) for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('Token index {} is out of range.'.format(idx))
+        return self._table.token(idx)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self._table.token(idx)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class _TokenIndex(Mapping):
+    """Read-only mapping from the tokens of a `_TokenTable` to their index, used as
+    `token_to_idx`.
+
+    Like `DefaultLookupDict`, unknown tokens are mapped to `default_idx` if it is not None.
+    """
+    def __init__(self, table, default_idx=None):
+        self._table = table
+        self._default_idx = default_idx
+
+    def __len__(self):
+        return len(self._table)
+
+    def __iter__(self):
+        for idx in range(len(self._table)):
+            yield self._table.token(idx)
+
+    def __contains__(self, token):
+        return self._table.index(token) >= 0
+
+    def __getitem__(self, token):
+        idx = self._table.index(token)
+        if idx >= 0:
+            return idx
+        if self._default_idx is None:
+            raise KeyError(token)
+        return self._default_idx
+
+    def get(self, token, default=None):
+        idx = self._table.index(token)
+        return idx if idx >= 0 else default
+
+    def lookup_indices(self, tokens, num_tokens):
+        """Look up the indices of `num_tokens` tokens at once as an int32 array."""
+        tokens = list(itertools.islice(tokens, num_tokens))
+        if len(tokens) < num_tokens:
+            raise ValueError('iterator too short: Expected {} but iterator had only {} items.'
+                             .format(num_tokens, len(tokens)))
+        indices = self._table.indices(tokens)
+        unknown = indices < 0
+        if unknown.any():
+            if self._default_idx is None:
+                raise KeyError(tokens[int(np.argmax(unknown))])
+            indices[unknown] = self._default_idx
+        return indices.astype(np.int32)
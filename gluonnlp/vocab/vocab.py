@@ -23,14 +23,17 @@
 from __future__ import absolute_import
 from __future__ import print_function
 
-__all__ = ['Vocab']
+__all__ = ['Vocab', 'FrozenVocab']
 
+import itertools
 import json
 import warnings
 
+import numpy as np
 from mxnet import nd
 
-from ..data.utils import DefaultLookupDict
+from ..data.utils import DefaultLookupDict, _lookup_indices
+from ._token_table import _TokenIndex, _TokenList, _TokenTable
 from .. import _constants as C
 from .. import embedding as emb
 
@@ -171,6 +174,7 @@ class Vocab(object):
             self._index_counter_keys(counter, unknown_token, special_tokens, max_size, min_freq)
 
         self._embedding = None
+        self._idx_to_token_array = None
 
     def _index_special_tokens(self, unknown_token, special_tokens):
         """Indexes unknown and reserved tokens."""
@@ -336,22 +340,33 @@ class Vocab(object):
         new_embedding._idx_to_vec = new_idx_to_vec
         self._embedding = new_embedding
 
-    def to_tokens(self, indices):
+    def to_tokens(self, indices, valid_length=None):
         """Converts token indices to tokens according to the vocabulary.
 
+        Arrays of indices are converted at once by taking from a cached object array of
+        `idx_to_token`.
+
 
         Parameters
         ----------
-        indices : int or list of ints
-            A source token index or token indices to be converted.
+        indices : int, list of ints, numpy.ndarray or NDArray
+            A source token index or token indices to be converted. Arrays may have any shape.
+        valid_length : numpy.ndarray, NDArray or None, default None
+            Only used if `indices` is an array of at least one dimension. The number of valid
+            indices along the last axis of `indices`, of shape `indices.shape[:-1]`. Only the
+            valid tokens are returned, so the innermost lists have different lengths.
 
 
         Returns
         -------
-        str or list of strs
-            A token or a list of tokens according to the vocabulary.
+        str or (nested) list of strs
+            A token or a list of tokens according to the vocabulary. For arrays, nested lists
+            with the shape of `indices`.
         """
 
+        if isinstance(indices, (nd.NDArray, np.ndarray)):
+            return self._array_to_tokens(indices, valid_length)
+
         to_reduce = False
         if not isinstance(indices, (list, tuple)):
             indices = [indices]
@@ -361,13 +376,151 @@ class Vocab(object):
 
         tokens = []
         for idx in indices:
-            if not isinstance(idx, int) or idx > max_idx:
+            if not isinstance(idx, (int, np.integer)) or idx > max_idx:
                 raise ValueError('Token index {} in the provided `indices` is invalid.'.format(idx))
             else:
                 tokens.append(self._idx_to_token[idx])
 
         return tokens[0] if to_reduce else tokens
 
+    def _array_to_tokens(self, indices, valid_length):
+        """Converts an array of token indices to (nested) lists of tokens."""
+        if isinstance(indices, nd.NDArray):
+            indices = indices.asnumpy()
+        if isinstance(valid_length, nd.NDArray):
+            valid_length = valid_length.asnumpy()
+        if indices.dtype.kind not in 'iu':
+            # NDArrays of indices are commonly float32
+            if indices.dtype.kind != 'f' or np.any(indices != np.floor(indices)):
+                raise ValueError('Token indices must be integers, but got {}.'
+                                 .format(indices.dtype))
+        indices = indices.astype(np.int64, copy=False)
+        if indices.size and (indices.min() < 0 or indices.max() >= len(self._idx_to_token)):
+            raise ValueError('Token indices in the provided `indices` are invalid.')
+        if indices.ndim == 0:
+            return self._idx_to_token[int(indices)]
+        tokens = self._take_tokens(indices)
+        if valid_length is None:
+            return tokens.tolist()
+        valid_length = np.asarray(valid_length).astype(np.int64, copy=False)
+        if not tokens.size:
+            return tokens.tolist()
+        if valid_length.shape != tokens.shape[:-1]:
+            raise ValueError('valid_length must be of shape {}, but got {}.'
+                             .format(tokens.shape[:-1], valid_length.shape))
+        rows = tokens.reshape((-1, tokens.shape[-1])).tolist()
+        valid_length = np.clip(valid_length, 0, tokens.shape[-1]).reshape((-1,)).tolist()
+        result = [row[:length] for row, length in zip(rows, valid_length)]
+        # Nest the rows as the leading axes of indices
+        for size in reversed(tokens.shape[:-1]):
+            result = [result[i:i + size] for i in range(0, len(result), size)]
+        return result[0]
+
+    def _token_array(self):
+        """Return `idx_to_token` as a cached numpy object array."""
+        array = getattr(self, '_idx_to_token_array', None)
+        if array is None or len(array) != len(self._idx_to_token):
+            array = np.empty((len(self._idx_to_token),), dtype=object)
+            # Assign one by one, as tuple tokens would be broadcast otherwise
+            for idx, token in enumerate(self._idx_to_token):
+                array[idx] = token
+            self._idx_to_token_array = array
+        return array
+
+    def _take_tokens(self, indices):
+        """Return the tokens of an array of valid indices as an object array of its shape."""
+        return self._token_array().take(indices)
+
+    def encode_batch(self, samples, pad=False, pad_val=None):
+        """Looks up the indices of a batch of token sequences at once.
+
+        The indices of all sequences are written in one int32 array, without creating a list
+        per sequence. If `unknown_token` of the vocabulary is None, looking up unknown tokens
+        results in KeyError.
+
+
+        Parameters
+        ----------
+        samples : list of list of strs
+            The token sequences to be converted.
+        pad : bool, default False
+            Whether to return the sequences as rows of a matrix padded with `pad_val`.
+        pad_val : int or None, default None
+            The index used for padding. If None, the index of `padding_token` is used.
+
+
+        Returns
+        -------
+        data : numpy.ndarray
+            If `pad` is False, the int32 indices of all sequences, of shape (num_tokens,).
+            Otherwise, the padded int32 indices of shape (num_samples, max_length).
+        offsets_or_lengths : numpy.ndarray
+            If `pad` is False, the int64 start offsets of the sequences in `data` followed by
+            `num_tokens`, of shape (num_samples + 1,), so that sequence `i` is
+            `data[offsets[i]:offsets[i + 1]]`. Otherwise, the int32 length of each sequence,
+            of shape (num_samples,).
+        """
+        if not isinstance(samples, (list, tuple)):
+            samples = list(samples)
+        lengths = np.fromiter(map(len, samples), dtype=np.int64, count=len(samples))
+        offsets = np.zeros((len(samples) + 1,), dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        data = _lookup_indices(self, itertools.chain.from_iterable(samples), offsets[-1])
+        if not pad:
+            return data, offsets
+        if pad_val is None:
+            if self._padding_token is None:
+                raise ValueError('pad_val must be specified if the vocabulary has no '
+                                 'padding_token.')
+            pad_val = self._token_to_idx[self._padding_token]
+        max_length = int(lengths.max()) if len(lengths) else 0
+        padded = np.full((len(samples), max_length), pad_val, dtype=np.int32)
+        padded[np.arange(max_length)[None, :] < lengths[:, None]] = data
+        return padded, lengths.astype(np.int32)
+
+    def decode_batch(self, data, offsets=None, valid_length=None):
+        """Converts a batch of index sequences to token sequences.
+
+        This is the inverse of `encode_batch`. Pass `offsets` if `data` holds the concatenated
+        indices of all sequences, or `valid_length` if it is a padded matrix.
+
+
+        Parameters
+        ----------
+        data : numpy.ndarray or NDArray
+            The flat indices of shape (num_tokens,), or the padded indices of shape
+            (num_samples, max_length).
+        offsets : numpy.ndarray or None, default None
+            The start offsets of the sequences in the flat `data`, followed by `num_tokens`.
+        valid_length : numpy.ndarray, NDArray or None, default None
+            The length of each row of the padded `data`. If None, all rows are decoded in full.
+
+
+        Returns
+        -------
+        list of list of strs
+            The token sequences.
+        """
+        if isinstance(data, nd.NDArray):
+            data = data.asnumpy()
+        if isinstance(valid_length, nd.NDArray):
+            valid_length = valid_length.asnumpy()
+        data = np.asarray(data).astype(np.int64, copy=False)
+        if offsets is None:
+            if data.ndim != 2:
+                raise ValueError('offsets must be specified for flat indices.')
+            num_samples, max_length = data.shape
+            if valid_length is None:
+                valid_length = np.full((num_samples,), max_length, dtype=np.int64)
+            valid_length = np.asarray(valid_length).astype(np.int64, copy=False)
+            data = data[np.arange(max_length)[None, :] < valid_length[:, None]]
+            offsets = np.concatenate([[0], np.cumsum(valid_length)])
+        if len(data) and (data.min() < 0 or data.max() >= len(self._idx_to_token)):
+            raise ValueError('Token indices in the provided `data` are invalid.')
+        tokens = self._take_tokens(data).tolist()
+        offsets = np.asarray(offsets).tolist()
+        return [tokens[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
     def to_indices(self, tokens):
         """Looks up indices of text tokens according to the vocabulary.
 
@@ -404,6 +557,12 @@ class Vocab(object):
 
         return self[tokens]
 
+    def __getstate__(self):
+        # The token array is rebuilt on demand instead of being pickled with the tokens
+        state = self.__dict__.copy()
+        state['_idx_to_token_array'] = None
+        return state
+
     def __repr__(self):
         return 'Vocab(size={}, unk="{}", reserved="{}")'.format(len(self), self._unknown_token,
                                                                 self._reserved_tokens)
@@ -419,7 +578,7 @@ class Vocab(object):
                           'You may serialize the embedding to a binary format '
                           'separately using vocab.embedding.serialize')
         vocab_dict = {}
-        vocab_dict['idx_to_token'] = self._idx_to_token
+        vocab_dict['idx_to_token'] = list(self._idx_to_token)
         vocab_dict['token_to_idx'] = dict(self._token_to_idx)
         vocab_dict['reserved_tokens'] = self._reserved_tokens
         vocab_dict['unknown_token'] = self._unknown_token
@@ -456,3 +615,120 @@ class Vocab(object):
         vocab._bos_token = vocab_dict.get('bos_token')
         vocab._eos_token = vocab_dict.get('eos_token')
         return vocab
+
+    def to_binary(self, filename):
+        """Serialize Vocab object to a binary file.
+
+        The tokens are stored as one UTF-8 blob with their offsets, followed by a prebuilt hash
+        table from the tokens to their indices, so that `from_binary` neither parses the tokens
+        nor builds a dictionary. All tokens must be str. This method does not serialize the
+        underlying embedding.
+
+        Parameters
+        ----------
+        filename : str
+            Path to the file to write.
+        """
+        if self._embedding:
+            warnings.warn('Serialization of attached embedding '
+                          'to binary is not supported. '
+                          'You may serialize the embedding to a binary format '
+                          'separately using vocab.embedding.serialize')
+        table = _TokenTable.from_tokens(list(self._idx_to_token))
+        table.save(filename, {'reserved_tokens': self._reserved_tokens,
+                              'unknown_token': self._unknown_token,
+                              'padding_token': self._padding_token,
+                              'bos_token': self._bos_token,
+                              'eos_token': self._eos_token})
+
+    @staticmethod
+    def from_binary(filename, mmap=True):
+        """Deserialize Vocab object from a binary file written by `to_binary`.
+
+        If `mmap` is True, the file is memory-mapped, so that loading takes constant time and
+        processes that load the same file share its pages. The tokens are decoded and looked
+        up in the hash table on access, see `FrozenVocab`.
+
+        Parameters
+        ----------
+        filename : str
+            Path to the binary file.
+        mmap : bool, default True
+            Whether to memory-map the file instead of reading it into memory.
+
+
+        Returns
+        -------
+        FrozenVocab
+        """
+        table, header = _TokenTable.load(filename, mmap_mode=mmap)
+        vocab = FrozenVocab.__new__(FrozenVocab)
+        vocab._init_from_table(table, header['unknown_token'], header['padding_token'],
+                               header['bos_token'], header['eos_token'],
+                               header['reserved_tokens'])
+        return vocab
+
+    def freeze(self):
+        """Return a memory-lean read-only copy of the vocabulary.
+
+        See `FrozenVocab`.
+
+        Returns
+        -------
+        FrozenVocab
+        """
+        return FrozenVocab(self)
+
+
+class FrozenVocab(Vocab):
+    """A read-only vocabulary stored in arrays instead of a list and a dict of tokens.
+
+    The tokens are stored as one UTF-8 blob with their offsets, and the token indices in an
+    open-addressing hash table of int32. This takes a few times less memory than the list and
+    the dict of a `Vocab` with millions of tokens, at the cost of slower lookups: looking up
+    single tokens is about 3 times slower. `encode_batch` looks up the distinct tokens of a
+    batch together with array operations, and is about 2 times slower than with a `Vocab` on
+    text with a Zipfian token distribution. `idx_to_token` and `token_to_idx` are read-only
+    views that decode the tokens on access. All tokens must be str.
+
+    A FrozenVocab is also returned by `Vocab.freeze` and `Vocab.from_binary`.
+
+    Parameters
+    ----------
+    vocab : Vocab
+        The vocabulary to copy. Its embedding is shared.
+    """
+    def __init__(self, vocab):  # pylint: disable=super-init-not-called
+        self._init_from_table(_TokenTable.from_tokens(list(vocab.idx_to_token)),
+                              vocab.unknown_token, vocab.padding_token, vocab.bos_token,
+                              vocab.eos_token, vocab.reserved_tokens)
+        self._embedding = vocab.embedding
+
+    def _init_from_table(self, table, unknown_token, padding_token, bos_token, eos_token,
+                         reserved_tokens):
+        self._table = table
+        self._idx_to_token = _TokenList(table)
+        default_idx = table.index(unknown_token) if unknown_token else None
+        self._token_to_idx = _TokenIndex(table, default_idx)
+        self._unknown_token = unknown_token
+        self._padding_token = padding_token
+        self._bos_token = bos_token
+        self._eos_token = eos_token
+        self._reserved_tokens = reserved_tokens
+        self._embedding = None
+        self._idx_to_token_array = None
+
+    def _take_tokens(self, indices):
+        # Only the distinct tokens are decoded, instead of caching all tokens as objects
+        unique, inverse = np.unique(indices, return_inverse=True)
+        tokens = np.empty((len(unique),), dtype=object)
+        for i, idx in enumerate(unique.tolist()):
+            tokens[i] = self._table.token(idx)
+        return tokens.take(inverse).reshape(np.shape(indices))
+
+    def freeze(self):
+        return self
+
+    def __repr__(self):
+        return 'FrozenVocab(size={}, unk="{}", reserved="{}")'.format(
+            len(self), self._unknown_token, self._reserved_tokens)
@@ -48,6 +48,8 @@ parser = argparse.ArgumentParser(description=
                                  'MXNet Neural Cache Language Model on Wikitext-2.')
 parser.add_argument('--bptt', type=int, default=2000,
                     help='sequence length')
+parser.add_argument('--batch_size', type=int, default=1,
+                    help='evaluation batch size')
 parser.add_argument('--model_name', type=str, default='awd_lstm_lm_1150',
                     help='name of the pretrained language model')
 parser.add_argument('--gpus', type=str,
@@ -109,9 +111,9 @@ val_dataset, test_dataset = \
                         skip_empty=False, bos=None, eos='<eos>')
      for segment in ['val', 'test']]
 
-val_batch_size = 1
+val_batch_size = args.batch_size
 val_data = val_dataset.batchify(vocab, val_batch_size)
-test_batch_size = 1
+test_batch_size = args.batch_size
 test_data = test_dataset.batchify(vocab, test_batch_size)
 
 ###############################################################################
@@ -191,11 +193,9 @@ def evaluate(data_source, batch_size, ctx=None):
         data, target = get_batch(data_source, i)
         data = data.as_in_context(ctx)
         target = target.as_in_context(ctx)
-        L = 0
         outs, next_word_history, cache_history, hidden = \
             cache_cell(data, target, next_word_history, cache_history, hidden)
-        for out in outs:
-            L += (-mx.nd.log(out)).asscalar()
+        L = (-mx.nd.log(outs)).sum().asscalar()
         total_L += L / data.shape[1]
         hidden = detach(hidden)
     return total_L / len(data_source)
@@ -93,6 +93,9 @@ parser.add_argument('--test-mode', action='store_true',
                     help='Whether to run through the script with few examples')
 parser.add_argument('--eval-only', action='store_true',
                     help='Whether to only run evluation for the trained model')
+parser.add_argument('--eval-vocab-chunk-size', type=int, default=None,
+                    help='If set, the evaluation computes the full softmax over chunks of the '
+                         'vocabulary with this size instead of materializing all the logits')
 args = parser.parse_args()
 
 segments = ['train', 'test']
@@ -139,6 +142,7 @@ def _load(xs):
     return ret
 
 def _split_and_sample(x, y):
+    x, y = x.astype('float32'), y.astype('float32')
     m = x != vocab[vocab.padding_token]  # mask padding
     num_ctx = len(context)
     if num_ctx > 1:
@@ -293,13 +297,18 @@ def test(data_stream, batch_size, ctx=None):
     hidden = eval_model.begin_state(batch_size=batch_size, func=mx.nd.zeros, ctx=ctx)
     start_time = time.time()
     for data, target in data_stream:
-        data = data.as_in_context(ctx)
-        target = target.as_in_context(ctx)
+        data = data.as_in_context(ctx).astype('float32')
+        target = target.as_in_context(ctx).astype('float32')
         mask = data != vocab[vocab.padding_token]
-        output, hidden = eval_model(data, hidden)
+        if args.eval_vocab_chunk_size:
+            log_likelihood, hidden = eval_model.log_likelihood(
+                data, target, hidden, vocab_chunk_size=args.eval_vocab_chunk_size)
+            L = -log_likelihood.reshape((-1,)) * mask.reshape((-1,))
+        else:
+            output, hidden = eval_model(data, hidden)
+            output = output.reshape((-3, -1))
+            L = loss(output, target.reshape(-1,)) * mask.reshape((-1,))
         hidden = detach(hidden)
-        output = output.reshape((-3, -1))
-        L = loss(output, target.reshape(-1,)) * mask.reshape((-1,))
         total_L += L.mean()
         ntotal += mask.mean()
         nbatch += 1
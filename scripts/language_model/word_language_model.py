@@ -123,18 +123,27 @@ assert args.batch_size % len(context) == 0, \
 assert args.weight_dropout > 0 or (args.weight_dropout == 0 and args.alpha == 0), \
     'The alpha L2 regularization cannot be used with standard RNN, please set alpha to 0'
 
-train_dataset, val_dataset, test_dataset = \
-    [nlp.data.WikiText2(segment=segment,
-                        skip_empty=False, bos=None, eos='<eos>')
-     for segment in ['train', 'val', 'test']]
+train_file, val_file, test_file = [nlp.data.WikiText2.get_filename(segment)
+                                   for segment in ['train', 'val', 'test']]
 
-vocab = nlp.Vocab(counter=nlp.data.Counter(train_dataset[0]), padding_token=None, bos_token=None)
+# The token counts and the numericalized segments are cached, so that later runs neither read
+# nor tokenize the corpus
+vocab = nlp.Vocab(counter=nlp.data.load_corpus_counter(train_file, skip_empty=False,
+                                                       eos='<eos>'),
+                  padding_token=None, bos_token=None)
 
-train_data = train_dataset.batchify(vocab, args.batch_size)
+
+def batchify(filename, batch_size):
+    """Numericalize a segment of the corpus and split it into `batch_size` sequences."""
+    corpus = nlp.data.load_numericalized_corpus(filename, vocab, skip_empty=False, eos='<eos>')
+    return corpus.batchify(batch_size)
+
+
+train_data = batchify(train_file, args.batch_size)
 val_batch_size = 10
-val_data = val_dataset.batchify(vocab, val_batch_size)
+val_data = batchify(val_file, val_batch_size)
 test_batch_size = 1
-test_data = test_dataset.batchify(vocab, test_batch_size)
+test_data = batchify(test_file, test_batch_size)
 
 if args.test_mode:
     args.emsize = 200
@@ -316,10 +316,9 @@ def evaluate(data_loader):
             translator.translate(src_seq=src_seq, src_valid_length=src_valid_length)
         max_score_sample = samples[:, 0, :].asnumpy()
         sample_valid_length = sample_valid_length[:, 0].asnumpy()
-        for i in range(max_score_sample.shape[0]):
-            translation_out.append(
-                [tgt_vocab.idx_to_token[ele] for ele in
-                 max_score_sample[i][1:(sample_valid_length[i] - 1)]])
+        # Strip the BOS and EOS tokens
+        translation_out.extend(tgt_vocab.to_tokens(max_score_sample[:, 1:],
+                                                   valid_length=sample_valid_length - 2))
     avg_loss = avg_loss / avg_loss_denom
     real_translation_out = [None for _ in range(len(all_inst_ids))]
     for ind, sentence in zip(all_inst_ids, translation_out):
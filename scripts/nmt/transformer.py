@@ -291,6 +291,41 @@ class TransformerDecoderCell(HybridBlock):
         mem_mask : Symbol or NDArray or None
             Mask for mem_value. Shape (batch_size, length, mem_length)
 
+        Returns
+        -------
+        decoder_cell_outputs: list
+            Outputs of the decoder cell. Contains:
+
+            - outputs of the transformer decoder cell. Shape (batch_size, length, C_out)
+            - additional_outputs of all the transformer decoder cell
+        """
+        return self._forward_projected(inputs,
+                                       self.attention_cell_in.project_memory(inputs),
+                                       self.attention_cell_inter.project_memory(mem_value),
+                                       mask, mem_mask)
+
+    def _forward_projected(self, inputs, self_mem, mem_value, mask=None, mem_mask=None):
+        """Compute the outputs given the projected memories of the attention cells.
+
+        In incremental decoding, this is called with NDArrays so that the projected memories of the
+        previous steps can be reused.
+
+        Parameters
+        ----------
+        inputs : Symbol or NDArray
+            Input sequence. Shape (batch_size, length, C_in)
+        self_mem : list of Symbol or list of NDArray
+            Projected key and value of the self-attention returned by
+            `attention_cell_in.project_memory()`, which cover all the previous positions
+            followed by `inputs`.
+        mem_value : list of Symbol or list of NDArray
+            Projected key and value of the encoder outputs returned by
+            `attention_cell_inter.project_memory()`.
+        mask : Symbol or NDArray or None
+            Mask for inputs. Shape (batch_size, length, self_mem_length)
+        mem_mask : Symbol or NDArray or None
+            Mask for mem_value. Shape (batch_size, length, mem_length)
+
         Returns
         -------
         decoder_cell_outputs: list
@@ -300,7 +335,7 @@ class TransformerDecoderCell(HybridBlock):
             - additional_outputs of all the transformer decoder cell
         """
         outputs, attention_in_outputs =\
-            self.attention_cell_in(inputs, inputs, inputs, mask)
+            self.attention_cell_in.attend_projected(inputs, self_mem[0], self_mem[1], mask)
         outputs = self.proj_in(outputs)
         outputs = self.dropout_layer(outputs)
         if self._use_residual:
@@ -308,7 +343,8 @@ class TransformerDecoderCell(HybridBlock):
         outputs = self.layer_norm_in(outputs)
         inputs = outputs
         outputs, attention_inter_outputs = \
-            self.attention_cell_inter(inputs, mem_value, mem_value, mem_mask)
+            self.attention_cell_inter.attend_projected(inputs, mem_value[0], mem_value[1],
+                                                       mem_mask)
         outputs = self.proj_inter(outputs)
         outputs = self.dropout_layer(outputs)
         if self._use_residual:
@@ -613,7 +649,6 @@ class TransformerDecoder(HybridBlock, Seq2SeqDecoder):
                 mx.nd.arange(mem_length, ctx=encoder_valid_length.context).reshape((1, -1)),
                 encoder_valid_length.reshape((-1, 1)))
             decoder_states.append(mem_masks)
-        self._encoder_valid_length = encoder_valid_length
         return decoder_states
 
     def decode_seq(self, inputs, states, valid_length=None):
@@ -657,7 +692,6 @@ class TransformerDecoder(HybridBlock, Seq2SeqDecoder):
             mask = mx.nd.broadcast_axes(mx.nd.expand_dims(mask, axis=0), axis=0, size=batch_size)
         states = [None] + states
         output, states, additional_outputs = self.forward(inputs, states, mask)
-        states = states[1:]
         if valid_length is not None:
             output = mx.nd.SequenceMask(output,
                                         sequence_length=valid_length,
@@ -668,6 +702,11 @@ class TransformerDecoder(HybridBlock, Seq2SeqDecoder):
     def __call__(self, step_input, states): #pylint: disable=arguments-differ
         """One-step-ahead decoding of the Transformer decoder.
 
+        In the test mode, the decoding is incremental. The projected keys and values of the
+        self-attention of all the previous steps are stored in the states, and only the new
+        position is computed. The encoder outputs are projected by the encoder-decoder attention
+        of each layer in the first step and the projections are reused in the following steps.
+
         Parameters
         ----------
         step_input : NDArray
@@ -681,9 +720,13 @@ class TransformerDecoder(HybridBlock, Seq2SeqDecoder):
             In the test mode, Shape is (batch_size, C_out)
         new_states: list
             Includes
-            - last_embeds : NDArray or None
-                It is only given during testing
-            - mem_value : NDArray
+            - layer_states : list of list of NDArray
+                It is only given during testing. Contains the projected key and value of the
+                self-attention of each layer for all the decoded positions. The first two
+                dimensions are (batch_size, length).
+            - mem_value : NDArray or list of list of NDArray
+                During testing, it contains the projected key and value of the encoder outputs
+                for each layer.
             - mem_masks : NDArray, optional
 
         step_additional_outputs : list of list
@@ -694,23 +737,10 @@ class TransformerDecoder(HybridBlock, Seq2SeqDecoder):
         return super(TransformerDecoder, self).__call__(step_input, states)
 
     def forward(self, step_input, states, mask=None):  #pylint: disable=arguments-differ, missing-docstring
-        input_shape = step_input.shape
-        mem_mask = None
-        # If it is in testing, transform input tensor to a tensor with shape NTC
+        # If it is in testing, only compute the output of the newly added position.
         # Otherwise remove the None in states.
-        if len(input_shape) == 2:
-            if self._encoder_valid_length is not None:
-                has_last_embeds = len(states) == 3
-            else:
-                has_last_embeds = len(states) == 2
-            if has_last_embeds:
-                last_embeds = states[0]
-                step_input = mx.nd.concat(last_embeds,
-                                          mx.nd.expand_dims(step_input, axis=1),
-                                          dim=1)
-                states = states[1:]
-            else:
-                step_input = mx.nd.expand_dims(step_input, axis=1)
+        if len(step_input.shape) == 2:
+            return self._forward_step(step_input, states)
         elif states[0] is None:
             states = states[1:]
         has_mem_mask = (len(states) == 2)
@@ -734,10 +764,60 @@ class TransformerDecoder(HybridBlock, Seq2SeqDecoder):
         states = states[:-1]
         if has_mem_mask:
             states[-1] = mem_mask
-        new_states = [step_input] + states
-        # If it is in testing, only output the last one
-        if len(input_shape) == 2:
-            step_output = step_output[:, -1, :]
+        return step_output, states, step_additional_outputs
+
+    def _forward_step(self, step_input, states):
+        """Incremental one-step-ahead decoding.
+
+        Parameters
+        ----------
+        step_input : NDArray, Shape (batch_size, C_in)
+        states : list
+            The decoder states. If at least one step has been decoded, the first element is the
+            list of the projected self-attention memory of each layer and the second element is
+            the list of the projected encoder outputs of each layer.
+
+        Returns
+        -------
+        step_output : NDArray, Shape (batch_size, C_out)
+        new_states : list
+        step_additional_outputs : list
+        """
+        if isinstance(states[0], list):
+            layer_states = states[0]
+            states = states[1:]
+            step = layer_states[0][0].shape[1]
+        else:
+            layer_states = None
+            step = 0
+            # Project the encoder outputs only once
+            states = [[cell.attention_cell_inter.project_memory(states[0])
+                       for cell in self.transformer_cells]] + states[1:]
+        ctx = step_input.context
+        mem_value = states[0]
+        mem_mask = mx.nd.expand_dims(states[1], axis=1) if len(states) == 2 else None
+        # Positional Encoding
+        position = self.position_weight.data(ctx).slice_axis(axis=0, begin=step, end=step + 1)
+        inputs = mx.nd.broadcast_add(
+            mx.nd.expand_dims(step_input, axis=1) * math.sqrt(step_input.shape[-1]),
+            position.reshape((1, 1, -1)))
+        inputs = self.dropout_layer(inputs)
+        inputs = self.layer_norm(inputs)
+        new_layer_states = []
+        step_additional_outputs = []
+        for i, cell in enumerate(self.transformer_cells):
+            self_mem = cell.attention_cell_in.project_memory(inputs)
+            if layer_states is not None:
+                self_mem = [mx.nd.concat(prev_ele, ele, dim=1)
+                            for prev_ele, ele in zip(layer_states[i], self_mem)]
+            new_layer_states.append(self_mem)
+            # All the previous positions are visible to the new position, so no mask is needed
+            inputs, attention_weights = cell._forward_projected(inputs, self_mem, mem_value[i],
+                                                                None, mem_mask)
+            if self._output_attention:
+                step_additional_outputs.append(attention_weights)
+        step_output = inputs.reshape((0, -1))
+        new_states = [new_layer_states] + states
         return step_output, new_states, step_additional_outputs
 
     def hybrid_forward(self, F, step_input, states, mask=None, position_weight=None):  #pylint: disable=arguments-differ
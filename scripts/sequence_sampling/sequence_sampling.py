@@ -135,9 +135,10 @@ def generate():
                                                                          args.temperature))
 
     print('Generation Result:')
-    for i in range(args.print_num):
-        sentence = args.bos[:-1] +\
-                   [vocab.idx_to_token[ele] for ele in samples[i][:valid_lengths[i]]]
+    sentences = vocab.to_tokens(samples[:args.print_num],
+                                valid_length=valid_lengths[:args.print_num])
+    for i, sentence in enumerate(sentences):
+        sentence = args.bos[:-1] + sentence
         print([' '.join(sentence), scores[i]])
 
 
@@ -166,3 +166,38 @@ def test_transformer_encoder_decoder():
                     else:
                         assert(len(additional_outputs) == 0)
 
+
+
+def test_transformer_decoder_step():
+    ctx = mx.Context.default_ctx
+    units = 16
+    encoder = TransformerEncoder(num_layers=2, units=units, hidden_size=32, num_heads=8, max_length=10,
+                                 dropout=0.0, use_residual=True, prefix='transformer_encoder_')
+    encoder.initialize(ctx=ctx)
+    encoder.hybridize()
+    for output_attention in [True, False]:
+        decoder = TransformerDecoder(num_layers=2, units=units, hidden_size=32, num_heads=8, max_length=10, dropout=0.0,
+                                     output_attention=output_attention, prefix='transformer_decoder_')
+        decoder.initialize(ctx=ctx)
+        decoder.hybridize()
+        batch_size, src_seq_length, tgt_seq_length = 4, 6, 7
+        src_seq_nd = mx.nd.random.normal(0, 1, shape=(batch_size, src_seq_length, units), ctx=ctx)
+        tgt_seq_nd = mx.nd.random.normal(0, 1, shape=(batch_size, tgt_seq_length, units), ctx=ctx)
+        src_valid_length_nd = mx.nd.array(np.random.randint(1, src_seq_length, size=(batch_size,)), ctx=ctx)
+        encoder_outputs, _ = encoder(src_seq_nd, valid_length=src_valid_length_nd)
+        decoder_states = decoder.init_state_from_encoder(encoder_outputs, src_valid_length_nd)
+        seq_output, _, _ = decoder.decode_seq(tgt_seq_nd, decoder_states)
+        states = decoder_states
+        for i in range(tgt_seq_length):
+            step_output, states, step_additional_outputs = decoder(tgt_seq_nd[:, i, :], states)
+            assert(step_output.shape == (batch_size, units))
+            # Projected self-attention memory and projected encoder outputs of each layer
+            assert(len(states[0]) == 2 and len(states[1]) == 2)
+            assert(states[0][0][0].shape == (batch_size, i + 1, 8, units // 8))
+            assert(states[1][0][0].shape == (batch_size, src_seq_length, 8, units // 8))
+            assert_almost_equal(step_output.asnumpy(), seq_output[:, i, :].asnumpy(), 1E-5, 1E-5)
+            if output_attention:
+                assert(len(step_additional_outputs) == 2)
+                assert(step_additional_outputs[0][1].shape == (batch_size, 8, 1, src_seq_length))
+            else:
+                assert(len(step_additional_outputs) == 0)
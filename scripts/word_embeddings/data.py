@@ -54,6 +54,11 @@ class WikiDumpStream(CorpusStream):
         The token to add at the begining of each sentence. If None, nothing is added.
     eos : str or None, default None
         The token to add at the end of each sentence. If None, nothing is added.
+    num_parts : int, default 1
+        The number of parts the files are partitioned into, e.g. the number of training
+        processes. See `gluonnlp.data.CorpusStream`.
+    part_index : int, default 0
+        The index of the part to stream, in [0, num_parts).
 
     Attributes
     ----------
@@ -65,7 +70,7 @@ class WikiDumpStream(CorpusStream):
     """
 
     def __init__(self, root, language, date, skip_empty=True, bos=None,
-                 eos=None):
+                 eos=None, num_parts=1, part_index=0):
         self._root = root
         self._language = language
         self._date = date
@@ -79,7 +84,8 @@ class WikiDumpStream(CorpusStream):
 
         self._file_pattern = os.path.join(self._path, '*.txt')
         super(WikiDumpStream, self).__init__(
-            self._file_pattern, skip_empty=skip_empty, bos=bos, eos=eos)
+            self._file_pattern, skip_empty=skip_empty, bos=bos, eos=eos,
+            num_parts=num_parts, part_index=part_index)
 
     @property
     def vocab(self):
@@ -21,7 +21,6 @@
 """Extract the vocabulary from a file and write it to disk."""
 
 import argparse
-import itertools
 import json
 import logging
 import time
@@ -37,6 +36,9 @@ def parse_args():
     parser.add_argument('--max-size', type=int, default=None)
     parser.add_argument('--min-freq', type=int, default=5)
     parser.add_argument('--max-word-length', type=int, default=50)
+    parser.add_argument('--num-workers', type=int, default=None,
+                        help='Number of processes counting the files. '
+                        'Defaults to the number of CPUs.')
     parser.add_argument('files', type=str, nargs='+')
     parser.add_argument('--vocab-output', type=str, default='vocab.json')
     parser.add_argument('--counts-output', type=str, default='counts.json')
@@ -46,15 +48,9 @@ def parse_args():
 
 def get_vocab(args):
     """Compute the vocabulary."""
-    counter = nlp.data.Counter()
     start = time.time()
-    for filename in args.files:
-        print('Starting processing of {} after {:.1f} seconds.'.format(
-            filename,
-            time.time() - start))
-        with open(filename, 'r') as f:
-            tokens = itertools.chain.from_iterable((l.split() for l in f))
-            counter.update(tokens)
+    print('Starting processing of {} files.'.format(len(args.files)))
+    counter = nlp.data.count_corpus_tokens(args.files, num_workers=args.num_workers)
 
     if args.max_word_length:
         counter = {
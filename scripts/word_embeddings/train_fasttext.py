@@ -37,7 +37,7 @@ Word2Vec embedding model was introduced by
 
 """
 import argparse
-import itertools
+import functools
 import logging
 import math
 import os
@@ -84,6 +84,9 @@ def parse_args():
     group.add_argument('--batch-size', type=int, default=1024,
                        help='Batch size for training.')
     group.add_argument('--epochs', type=int, default=5, help='Epoch limit')
+    group.add_argument('--num-data-workers', type=int, default=0,
+                       help='Number of worker processes coding the training data. '
+                       'If 0, the data is coded in the main process.')
     group.add_argument('--gpu', type=int, nargs='+',
                        help=('Number (index) of GPU to run on, e.g. 0. '
                              'If not specified, uses CPU.'))
@@ -145,16 +148,42 @@ def parse_args():
     return args
 
 
+def code(vocab, shard):
+    """Map the tokens of each sentence in the shard to their indices."""
+    with print_time('code shard'):
+        return [[vocab[token] for token in sentence if token in vocab]
+                for sentence in shard]
+
+
+def remove_unknown(corpus, max_sentence_length=10000):
+    """Split the sentences of a corpus coded with a leading unknown token into chunks of
+    `max_sentence_length` tokens as `Text8`, and drop the unknown tokens."""
+    offsets = np.concatenate([np.arange(start, end, max_sentence_length) for start, end
+                              in zip(corpus.offsets[:-1], corpus.offsets[1:])])
+    offsets = np.append(offsets, corpus.num_tokens)
+    known = np.asarray(corpus.tokens) != 0
+    num_known = np.concatenate([[0], np.cumsum(known)])
+    return nlp.data.NumericalizedCorpus(np.asarray(corpus.tokens)[known] - 1,
+                                        num_known[offsets])
+
+
 def get_train_data(args):
     """Helper function to get training data."""
 
     def text8():
-        data = nlp.data.Text8(segment='train')
-        counter = nlp.data.count_tokens(itertools.chain.from_iterable(data))
+        # The token counts and the numericalized corpus are cached, so that later runs neither
+        # read nor tokenize the corpus
+        path = nlp.data.Text8.get_filename(segment='train')
+        counter = nlp.data.load_corpus_counter(path)
         vocab = nlp.Vocab(counter, unknown_token=None, padding_token=None,
                           bos_token=None, eos_token=None, min_freq=5)
         idx_to_counts = [counter[w] for w in vocab.idx_to_token]
-        data = nlp.data.SimpleDataStream([data])
+        # Tokens of the coding vocabulary are shifted by one with respect to vocab, as the
+        # unknown token comes first
+        coding_vocab = nlp.Vocab(counter, padding_token=None, bos_token=None,
+                                 eos_token=None, min_freq=5)
+        corpus = nlp.data.load_numericalized_corpus(path, coding_vocab)
+        data = nlp.data.SimpleDataStream([remove_unknown(corpus)])
         return data, vocab, idx_to_counts
 
     def wiki():
@@ -170,16 +199,14 @@ def get_train_data(args):
         data, vocab, idx_to_counts = f_data()
 
     # Apply transforms
-    def code(shard):
-        with print_time('code shard'):
-            return [[vocab[token] for token in sentence if token in vocab]
-                    for sentence in shard]
-
     def shuffle(shard):
+        shard = list(shard)
         random.shuffle(shard)
         return shard
 
-    data = data.transform(code)
+    if args.data != 'text8':
+        data = data.transform(functools.partial(code, vocab),
+                              num_workers=args.num_data_workers, worker_type='process')
     data = data.transform(shuffle)
 
     negatives_sampler = nlp.data.UnigramCandidateSampler(
@@ -22,6 +22,14 @@ def check_attention_cell_basic(attention_cell, q_channel, k_channel, v_channel,
             read_value, att_weights = attention_cell(query_nd, key_nd, value_nd, mask_nd)
             att_weights_npy = att_weights.asnumpy()
             read_value_npy = read_value.asnumpy()
+            # Check the attention computed from the projected memory is the same
+            proj_key_nd, proj_value_nd = attention_cell.project_memory(key_nd, value_nd)
+            assert proj_key_nd.shape[:2] == (batch_size, mem_length)
+            assert proj_value_nd.shape[:2] == (batch_size, mem_length)
+            proj_read_value, proj_att_weights = attention_cell.attend_projected(
+                query_nd, proj_key_nd, proj_value_nd, mask_nd)
+            assert_allclose(proj_read_value.asnumpy(), read_value_npy, 1E-5, 1E-5)
+            assert_allclose(proj_att_weights.asnumpy(), att_weights_npy, 1E-5, 1E-5)
             value_npy = value_nd.asnumpy()
             if not multi_head:
                 if use_mask:
@@ -124,3 +124,17 @@ def test_pad_wrap_batchify():
                             assert batch_data.dtype == batch_data_use_mx.dtype == _dtype
                             assert valid_length.dtype == valid_length_use_mx.dtype == np.int32
 
+
+
+def test_pad_ragged_inputs():
+    data = [[1.5, 2.5, 3.5], [], [4.5], [5.5, 6.5]]
+    expected = np.array([[1.5, 2.5, 3.5], [-1, -1, -1], [4.5, -1, -1], [5.5, 6.5, -1]])
+    for inputs in [data, [np.array(ele) for ele in data]]:
+        batch_data, valid_length = batchify.Pad(pad_val=-1, ret_length=True)(inputs)
+        assert_allclose(batch_data.asnumpy(), expected)
+        assert_allclose(valid_length.asnumpy(), [3, 0, 1, 2])
+    nd_data = [mx.nd.array(ele, dtype=np.int32) for ele in data[:1] + data[2:]]
+    for dtype in [None, np.float32]:
+        batch_data = batchify.Pad(pad_val=-1, dtype=dtype)(nd_data)
+        assert batch_data.dtype == (np.int32 if dtype is None else dtype)
+        assert_allclose(batch_data.asnumpy(), [[1, 2, 3], [4, -1, -1], [5, 6, -1]])
@@ -20,6 +20,7 @@
 from __future__ import print_function
 
 import datetime
+import io
 import itertools
 import json
 import os
@@ -74,6 +75,98 @@ def test_dataset_registry():
     my_dataset = nlp.data.create('MyDataset5')
 
 
+###############################################################################
+# Text datasets
+###############################################################################
+def test_lazy_text_datasets(tmpdir):
+    path = str(tmpdir.join('corpus.txt'))
+    with io.open(path, 'w', encoding='utf8', newline='') as f:
+        f.write(u'Hello  world\n\n   \r\n\u8bed\u8a00 model \r\nlast line')
+    eager_lines = nlp.data.TextLineDataset(path)
+    lazy_lines = nlp.data.TextLineDataset(path, lazy=True)
+    assert len(lazy_lines) == len(eager_lines) == 5
+    assert list(lazy_lines) == list(eager_lines)
+    assert lazy_lines[-1] == u'last line'
+
+    for skip_empty in [True, False]:
+        for tokenizer in [nlp.data.utils.whitespace_splitter, None]:
+            eager = nlp.data.CorpusDataset([path, path], skip_empty=skip_empty,
+                                           tokenizer=tokenizer, bos='<bos>', eos='<eos>')
+            for _ in range(2):  # the second dataset reuses the sidecar index
+                lazy = nlp.data.CorpusDataset([path, path], skip_empty=skip_empty,
+                                              tokenizer=tokenizer, bos='<bos>', eos='<eos>',
+                                              lazy=True, cache_index=True)
+                assert len(lazy) == len(eager)
+                assert [lazy[i] for i in range(len(lazy))] == list(eager)
+    assert os.path.exists(path + '.lineidx.npz')
+    with pytest.raises(AssertionError):
+        nlp.data.CorpusDataset(path, flatten=True, lazy=True)
+
+
+def test_numericalized_corpus(tmpdir):
+    path = str(tmpdir.join('corpus.txt'))
+    with io.open(path, 'w', encoding='utf8') as f:
+        f.write(u'a b c\n\nd e\nf a b c d e f a\n')
+    root = str(tmpdir.join('cache'))
+    dataset = nlp.data.CorpusDataset(path, eos='<eos>')
+    vocab = nlp.Vocab(nlp.data.count_tokens(itertools.chain.from_iterable(dataset)))
+
+    corpus = nlp.data.load_numericalized_corpus(path, vocab, eos='<eos>', root=root)
+    cached = nlp.data.load_numericalized_corpus(path, vocab, eos='<eos>', root=root)
+    assert isinstance(cached.tokens, np.memmap) and not isinstance(corpus.tokens, np.memmap)
+    for c in [corpus, cached]:
+        assert len(c) == len(dataset) == 3
+        assert c.tokens.dtype == np.int32
+        assert [c[i].tolist() for i in range(len(c))] == [vocab[s] for s in dataset]
+    assert cached[-1].tolist() == vocab[dataset[-1]]
+    # Another vocabulary or tokenizer uses another cache entry
+    other = nlp.data.load_numericalized_corpus(path, nlp.Vocab(nlp.data.Counter(['a'])),
+                                               eos='<eos>', root=root)
+    assert not isinstance(other.tokens, np.memmap)
+    assert len(os.listdir(root)) == 4
+
+    lm_dataset = nlp.data.LanguageModelDataset(path, eos='<eos>')
+    for last_batch in ['keep', 'discard']:
+        expected = lm_dataset.bptt_batchify(vocab, 3, 2, last_batch=last_batch)
+        batches = cached.bptt_batchify(3, 2, last_batch=last_batch,
+                                       padding_idx=vocab[vocab.padding_token])
+        assert len(batches) == len(expected)
+        for (data, label), (expected_data, expected_label) in zip(batches, expected):
+            assert np.all(data.asnumpy() == expected_data.asnumpy())
+            assert np.all(label.asnumpy() == expected_label.asnumpy())
+    assert np.all(cached.batchify(2).asnumpy() == lm_dataset.batchify(vocab, 2).asnumpy())
+    with pytest.raises(ValueError):
+        cached.bptt_batchify(3, 2, last_batch='keep')
+
+    sampler = nlp.data.ContextSampler(cached, batch_size=4, shuffle=False)
+    assert sum(center.shape[0] for center, _, _ in sampler) == cached.num_tokens
+
+
+def test_load_corpus_counter(tmpdir):
+    path = str(tmpdir.join('corpus.txt'))
+    with io.open(path, 'w', encoding='utf8') as f:
+        f.write(u'a b c\n\nd e\nf a b c d e f a\n')
+    root = str(tmpdir.join('cache'))
+    dataset = nlp.data.CorpusDataset(path, skip_empty=False, eos='<eos>')
+    expected = nlp.data.count_tokens(itertools.chain.from_iterable(dataset))
+
+    counter = nlp.data.load_corpus_counter(path, skip_empty=False, eos='<eos>', root=root)
+    assert counter == expected
+    assert len(os.listdir(root)) == 1
+    cached = nlp.data.load_corpus_counter(path, skip_empty=False, eos='<eos>', root=root)
+    assert isinstance(cached, nlp.data.Counter) and cached == expected
+    # Other reading arguments use another cache entry
+    assert nlp.data.load_corpus_counter(path, root=root) == \
+        nlp.data.count_tokens(itertools.chain.from_iterable(nlp.data.CorpusDataset(path)))
+    assert len(os.listdir(root)) == 2
+
+    # A changed file is counted again
+    with io.open(path, 'w', encoding='utf8') as f:
+        f.write(u'a a\n')
+    assert nlp.data.load_corpus_counter(path, skip_empty=False, eos='<eos>', root=root) == \
+        nlp.data.Counter({'a': 2, '<eos>': 1})
+
+
 ###############################################################################
 # Language model
 ###############################################################################
@@ -102,6 +195,29 @@ def test_bptt_batchify(batch_size, seq_len):
     assert len(data[0]) - len(coded) < batch_size * seq_len
 
 
+@pytest.mark.parametrize('last_batch', ['keep', 'discard'])
+def test_bptt_batchify_views(tmpdir, last_batch):
+    path = str(tmpdir.join('corpus.txt'))
+    with io.open(path, 'w', encoding='utf8') as f:
+        f.write(u'\n'.join(' '.join(str(i) for i in range(j, j + 7)) for j in range(0, 70, 7)))
+    data = nlp.data.LanguageModelDataset(path)
+    vocab = nlp.Vocab(nlp.data.Counter(data[0]))
+    batches = data.bptt_batchify(vocab, 4, 3, last_batch=last_batch)
+    assert len(batches) == (6 if last_batch == 'keep' else 5)
+    for i, (X, Y) in enumerate(batches):
+        assert X.shape == Y.shape == (4, 3) and X.dtype == np.float32
+        assert np.all(X[1:].asnumpy() == Y[:-1].asnumpy())
+        # Each column is a consecutive part of the corpus
+        for col in X.T.asnumpy():
+            col = [int(vocab.idx_to_token[int(t)]) for t in col
+                   if t != vocab[vocab.padding_token]]
+            assert not col or col == list(range(col[0], col[0] + len(col)))
+    X, Y = batches[-1]
+    assert np.all(X.asnumpy() == batches[len(batches) - 1][0].asnumpy())
+    with pytest.raises(IndexError):
+        batches[len(batches)]
+
+
 def test_wikitext2():
     batch_size = 80
     seq_len = 35
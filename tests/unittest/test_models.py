@@ -22,7 +22,10 @@ from __future__ import print_function
 import sys
 
 import mxnet as mx
+import numpy as np
+import pytest
 from mxnet import gluon
+from mxnet.test_utils import assert_almost_equal
 import gluonnlp as nlp
 
 def eprint(*args, **kwargs):
@@ -110,6 +113,29 @@ def test_cache_models():
             print(cache_history)
 
 
+def test_cache_cell_batch():
+    vocab_size, window, seq_len, batch_size = 20, 5, 4, 3
+    model = nlp.model.StandardRNN('lstm', vocab_size, 8, 8, 2, 0, False)
+    model.initialize()
+    cache_cell = nlp.model.train.CacheCell(model, vocab_size, window, theta=0.6, lambdas=0.2)
+    data = mx.nd.random.randint(0, vocab_size, shape=(3 * seq_len + 1, batch_size))
+    outs = []
+    for batch_slice in [slice(None)] + [slice(i, i + 1) for i in range(batch_size)]:
+        hidden, word_history, cache_history = None, None, None
+        batch_outs = []
+        for i in range(0, 3 * seq_len, seq_len):
+            inputs = data[i:i + seq_len, batch_slice]
+            target = data[i + 1:i + 1 + seq_len, batch_slice]
+            out, word_history, cache_history, hidden = \
+                cache_cell(inputs, target, word_history, cache_history, hidden)
+            batch_outs.append(out.asnumpy())
+        assert word_history.shape == (window, batch_outs[0].shape[1])
+        assert cache_history.shape == (window, batch_outs[0].shape[1], 8)
+        outs.append(np.concatenate(batch_outs, axis=0))
+    assert outs[0].shape == (3 * seq_len, batch_size)
+    assert_almost_equal(outs[0], np.concatenate(outs[1:], axis=1))
+
+
 def test_get_cache_model_noncache_models():
     language_models_params = {'awd_lstm_lm_1150': 'awd_lstm_lm_1150_wikitext-2-45d6df33.params',
                               'awd_lstm_lm_600': 'awd_lstm_lm_600_wikitext-2-7894a046.params',
@@ -154,6 +180,23 @@ def test_save_load_cache_models():
             cache_cell.save_params('tests/data/model/' + name + '-' + dataset_name + '.params')
             cache_cell.load_params('tests/data/model/' + name + '-' + dataset_name + '.params')
 
+def test_big_rnn_log_likelihood():
+    vocab_size, seq_len, batch_size = 100, 5, 3
+    model = nlp.model.language_model.BigRNN(vocab_size, 8, 16, 1, 8)
+    model.initialize()
+    inputs = mx.nd.random.randint(0, vocab_size, shape=(seq_len, batch_size))
+    target = mx.nd.random.randint(0, vocab_size, shape=(seq_len, batch_size))
+    hidden = model.begin_state(batch_size=batch_size, func=mx.nd.zeros)
+    output, _ = model(inputs, hidden)
+    expected = mx.nd.pick(mx.nd.log_softmax(output), target, axis=2)
+    for vocab_chunk_size in [7, 50, 100, 1000]:
+        log_likelihood, state = model.log_likelihood(inputs, target, hidden,
+                                                     vocab_chunk_size=vocab_chunk_size)
+        assert log_likelihood.shape == (seq_len, batch_size)
+        assert len(state) == len(hidden)
+        assert_almost_equal(log_likelihood.asnumpy(), expected.asnumpy(), rtol=1e-4, atol=1e-5)
+
+
 def test_save_load_big_rnn_models():
     ctx = mx.cpu()
     seq_len = 1
@@ -233,6 +276,92 @@ def test_big_rnn_model_share_params():
     assert logits.shape == (seq_len, batch_size, vocab_size)
     mx.nd.waitall()
 
+def test_adaptive_softmax():
+    num_classes, in_unit = 50, 16
+    decoder = nlp.model.AdaptiveSoftmax(num_classes, in_unit, cutoffs=[10, 30], div_value=2.0)
+    decoder.initialize(mx.init.Xavier())
+    x = mx.nd.random.normal(shape=(4, 3, in_unit))
+    y = mx.nd.random.randint(0, num_classes, shape=(4, 3))
+    log_probs = decoder(x)
+    assert log_probs.shape == (4, 3, num_classes)
+    assert_almost_equal(log_probs.exp().sum(axis=2).asnumpy(), np.ones((4, 3)), rtol=1e-4)
+    x.attach_grad()
+    with mx.autograd.record():
+        log_likelihood = decoder(x, y)
+    log_likelihood.backward()
+    assert log_likelihood.shape == (4, 3)
+    assert_almost_equal(log_likelihood.asnumpy(),
+                        mx.nd.pick(log_probs, y, axis=2).asnumpy(), rtol=1e-4, atol=1e-5)
+    dense_x = x.copy()
+    dense_x.attach_grad()
+    with mx.autograd.record():
+        dense_log_likelihood = mx.nd.pick(decoder(dense_x), y, axis=2)
+    dense_log_likelihood.backward()
+    assert_almost_equal(x.grad.asnumpy(), dense_x.grad.asnumpy(), rtol=1e-4, atol=1e-5)
+
+
+def test_adaptive_softmax_language_models(tmpdir):
+    vocab_size, seq_len, batch_size = 30, 4, 2
+    cutoffs = [5, 15]
+    x = mx.nd.random.randint(0, vocab_size, shape=(seq_len, batch_size))
+    y = mx.nd.random.randint(0, vocab_size, shape=(seq_len, batch_size))
+    models = [nlp.model.train.StandardRNN('lstm', vocab_size, 8, 8, 2, 0.2,
+                                          adaptive_softmax_cutoffs=cutoffs),
+              nlp.model.train.AWDRNN('lstm', vocab_size, 8, 8, 2, tie_weights=False,
+                                     adaptive_softmax_cutoffs=cutoffs),
+              nlp.model.StandardRNN('lstm', vocab_size, 8, 8, 2, 0.2, False,
+                                    adaptive_softmax_cutoffs=cutoffs),
+              nlp.model.AWDRNN('lstm', vocab_size, 8, 8, 2, False, 0.2, 0.2, 0.2, 0.2, 0.1,
+                               adaptive_softmax_cutoffs=cutoffs)]
+    for model in models:
+        model.initialize()
+        out = model(x)[0]
+        assert out.shape == (seq_len, batch_size, vocab_size)
+        assert_almost_equal(out.exp().sum(axis=2).asnumpy(), np.ones((seq_len, batch_size)),
+                            rtol=1e-4)
+    # The training models compute only the log-likelihood of the targets if they are passed
+    for model in models[:2]:
+        out = model(x)[0]
+        log_likelihood = model(x, None, y)[0]
+        assert log_likelihood.shape == (seq_len, batch_size)
+        assert_almost_equal(log_likelihood.asnumpy(), mx.nd.pick(out, y, axis=2).asnumpy(),
+                            rtol=1e-4, atol=1e-5)
+        with mx.autograd.record():
+            l = -model(x, None, y)[0]
+        l.backward()
+    dense_model = nlp.model.train.StandardRNN('lstm', vocab_size, 8, 8, 2, 0.2)
+    dense_model.initialize()
+    with pytest.raises(AssertionError):
+        dense_model(x, None, y)
+    # BigRNN
+    model = nlp.model.language_model.train.BigRNN(vocab_size, 2, 3, 1, 5, 6, prefix='bigrnn',
+                                                  adaptive_softmax_cutoffs=cutoffs)
+    eval_model = nlp.model.language_model.BigRNN(vocab_size, 2, 3, 1, 5, prefix='bigrnn',
+                                                 adaptive_softmax_cutoffs=cutoffs)
+    assert sorted(model.collect_params().keys()) == sorted(eval_model.collect_params().keys())
+    model.initialize(mx.init.Xavier())
+    trainer = mx.gluon.Trainer(model.collect_params(), 'sgd')
+    hidden = model.begin_state(batch_size=batch_size, func=mx.nd.zeros)
+    with mx.autograd.record():
+        log_likelihood, _, new_y = model(x, y, hidden, None)
+        assert log_likelihood.shape == (seq_len, batch_size)
+        assert new_y is None
+        l = -log_likelihood
+    l.backward()
+    trainer.step(batch_size)
+    log_likelihood, _, _ = model(x, y, hidden, None)
+    path = str(tmpdir.join('adaptive.params'))
+    model.save_parameters(path)
+    eval_model.load_parameters(path)
+    out, _ = eval_model(x, hidden)
+    assert out.shape == (seq_len, batch_size, vocab_size)
+    eval_log_likelihood, _ = eval_model.log_likelihood(x, y, hidden)
+    assert_almost_equal(eval_log_likelihood.asnumpy(), log_likelihood.asnumpy(),
+                        rtol=1e-4, atol=1e-5)
+    assert_almost_equal(mx.nd.pick(out, y, axis=2).asnumpy(), log_likelihood.asnumpy(),
+                        rtol=1e-4, atol=1e-5)
+
+
 def test_weight_drop():
     class RefBiLSTM(gluon.Block):
         def __init__(self, size, **kwargs):
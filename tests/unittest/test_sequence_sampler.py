@@ -44,7 +44,9 @@ def test_sequence_sampler():
 
 @pytest.mark.seed(1)
 @pytest.mark.parametrize('hybridize', [False, True])
-@pytest.mark.parametrize('sampler_cls', [HybridBeamSearchSampler, BeamSearchSampler])
+@pytest.mark.parametrize('sampler_cls', [HybridBeamSearchSampler, BeamSearchSampler,
+                                         functools.partial(BeamSearchSampler,
+                                                           compact_finished=True)])
 def test_beam_search(hybridize, sampler_cls):
     def _get_new_states(states, state_info, sel_beam_ids):
         assert not state_info or isinstance(state_info, (type(states), dict)), \
@@ -282,3 +284,95 @@ def test_beam_search(hybridize, sampler_cls):
                                 assert(samples[i, j, valid_length[i, j] - 1] == 3.0)
                                 if valid_length[i, j] < samples.shape[2]:
                                     assert((samples[i, j, valid_length[i, j]:] == -1.0).all())
+
+
+class LogSoftmaxRNNDecoder(HybridBlock):
+    def __init__(self, vocab_size, hidden_size, prefix=None, params=None):
+        super(LogSoftmaxRNNDecoder, self).__init__(prefix=prefix, params=params)
+        self._vocab_size = vocab_size
+        with self.name_scope():
+            self._embed = nn.Embedding(input_dim=vocab_size, output_dim=hidden_size)
+            self._rnn = RNNCell(hidden_size=hidden_size, input_size=hidden_size)
+            self._map_to_vocab = nn.Dense(vocab_size, in_units=hidden_size)
+
+    def hybrid_forward(self, F, inputs, states):
+        out, states = self._rnn(self._embed(inputs), states)
+        return self._map_to_vocab(out).log_softmax(), states
+
+
+@pytest.mark.parametrize('hybridize', [False, True])
+@pytest.mark.parametrize('sampler_cls', [HybridBeamSearchSampler, BeamSearchSampler])
+def test_beam_search_per_beam_topk(hybridize, sampler_cls):
+    vocab_size, batch_size, max_length = 50, 4, 10
+    decoder = LogSoftmaxRNNDecoder(vocab_size=vocab_size, hidden_size=16)
+    decoder.initialize(mx.init.Normal(1.0))
+    decoder.hybridize()
+    states = decoder._rnn.begin_state(batch_size=batch_size, func=mx.nd.random.normal)
+    inputs = mx.nd.full(shape=(batch_size,), val=1)
+    for beam_size, per_beam_topk in [(1, 1), (3, 3), (4, 10)]:
+        outputs = []
+        for topk in [None, per_beam_topk]:
+            if sampler_cls is HybridBeamSearchSampler:
+                sampler = sampler_cls(batch_size=batch_size, beam_size=beam_size, decoder=decoder,
+                                      eos_id=2, max_length=max_length, per_beam_topk=topk)
+                if hybridize:
+                    sampler.hybridize()
+            else:
+                sampler = sampler_cls(beam_size=beam_size, decoder=decoder, eos_id=2,
+                                      max_length=max_length, per_beam_topk=topk)
+            outputs.append([ele.asnumpy() for ele in sampler(inputs, states)])
+        for ele, pruned_ele in zip(*outputs):
+            assert_allclose(ele, pruned_ele, 1E-5, 1E-5)
+
+
+def test_beam_search_early_stop():
+    vocab_size, batch_size, beam_size, max_length, eos_id = 10, 8, 4, 20, 2
+    decoder = LogSoftmaxRNNDecoder(vocab_size=vocab_size, hidden_size=16)
+    decoder.initialize(mx.init.Normal(1.0))
+    decoder.hybridize()
+    states = decoder._rnn.begin_state(batch_size=batch_size, func=mx.nd.random.normal)
+    inputs = mx.nd.full(shape=(batch_size,), val=1)
+    for alpha in [0.0, 1.0]:
+        scorer = BeamSearchScorer(alpha=alpha, K=5.0)
+        samples, scores, valid_length = \
+            BeamSearchSampler(beam_size=beam_size, decoder=decoder, eos_id=eos_id, scorer=scorer,
+                              max_length=max_length)(inputs, states)
+        # Checking every few steps only pads the samples with -1
+        for check_interval in [2, 3, 100]:
+            interval_samples, interval_scores, interval_valid_length = \
+                BeamSearchSampler(beam_size=beam_size, decoder=decoder, eos_id=eos_id,
+                                  scorer=scorer, max_length=max_length,
+                                  check_interval=check_interval)(inputs, states)
+            interval_samples = interval_samples.asnumpy()
+            assert interval_samples.shape[2] >= samples.shape[2]
+            assert_allclose(interval_samples[:, :, :samples.shape[2]], samples.asnumpy())
+            assert (interval_samples[:, :, samples.shape[2]:] == -1).all()
+            assert_allclose(interval_scores.asnumpy(), scores.asnumpy(), 1E-5, 1E-5)
+            assert_allclose(interval_valid_length.asnumpy(), valid_length.asnumpy())
+        # The best beam does not change with optimal stopping
+        stop_samples, stop_scores, stop_valid_length = \
+            BeamSearchSampler(beam_size=beam_size, decoder=decoder, eos_id=eos_id, scorer=scorer,
+                              max_length=max_length, optimal_stopping=True)(inputs, states)
+        assert stop_samples.shape[2] <= samples.shape[2]
+        assert_allclose(stop_scores[:, 0].asnumpy(), scores[:, 0].asnumpy(), 1E-5, 1E-5)
+        assert_allclose(stop_valid_length[:, 0].asnumpy(), valid_length[:, 0].asnumpy())
+        for i in range(batch_size):
+            length = valid_length[i, 0].asscalar()
+            assert_allclose(stop_samples[i, 0, :length].asnumpy(),
+                            samples[i, 0, :length].asnumpy())
+
+
+def test_sequence_sampler_check_interval():
+    vocab_size, batch_size, beam_size, eos_id = 10, 8, 3, 2
+    decoder = LogSoftmaxRNNDecoder(vocab_size=vocab_size, hidden_size=16)
+    decoder.initialize(mx.init.Normal(1.0))
+    states = decoder._rnn.begin_state(batch_size=batch_size, func=mx.nd.random.normal)
+    inputs = mx.nd.full(shape=(batch_size,), val=1)
+    sampler = SequenceSampler(beam_size=beam_size, decoder=decoder, eos_id=eos_id,
+                              max_length=20, check_interval=4)
+    samples, _, valid_length = sampler(inputs, states)
+    samples = samples.asnumpy()
+    valid_length = valid_length.asnumpy()
+    for i in range(batch_size):
+        for j in range(beam_size):
+            assert (samples[i, j, valid_length[i, j]:] == -1).all()
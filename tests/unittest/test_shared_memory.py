@@ -0,0 +1,57 @@
+# coding: utf-8
+
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import multiprocessing
+
+import numpy as np
+import mxnet as mx
+from numpy.testing import assert_array_equal
+
+from gluonnlp.data._shared_memory import SlabPool
+
+
+def _write_batches(pool, queue):
+    for i in range(1, 5):
+        queue.put(pool.write([np.arange(i * 3, dtype=np.int64).reshape((i, 3)),
+                              (mx.nd.ones((i, 2), dtype='float16') * i, i)]))
+
+
+def test_slab_pool():
+    pool = SlabPool(num_slabs=2, slab_size=1024)
+    queue = multiprocessing.Queue()
+    worker = multiprocessing.Process(target=_write_batches, args=(pool, queue))
+    worker.start()
+    for i in range(1, 5):
+        descriptor = queue.get()
+        assert descriptor[0] is not None
+        x, (y, z) = pool.read(descriptor)
+        assert x.dtype == np.int64
+        assert_array_equal(x, np.arange(i * 3).reshape((i, 3)))
+        assert isinstance(y, mx.nd.NDArray) and y.dtype == np.float16
+        assert_array_equal(y.asnumpy(), np.ones((i, 2)) * i)
+        assert z == i
+    worker.join()
+
+
+def test_slab_pool_fallback():
+    pool = SlabPool(num_slabs=1, slab_size=64)
+    for batch in [np.zeros(100), 'no arrays']:
+        descriptor = pool.write(batch)
+        assert descriptor[0] is None
+        assert_array_equal(pool.read(descriptor), batch)
@@ -24,6 +24,7 @@ import itertools
 import json
 import os
 import random
+import time
 
 import numpy as np
 import pytest
@@ -54,6 +55,84 @@ def test_corpus_stream():
     assert len(counter) == 33278, len(counter)
 
 
+@pytest.mark.parametrize('partition_samples', [False, True])
+@pytest.mark.parametrize('seed', [None, 7])
+def test_corpus_stream_parts(tmpdir, partition_samples, seed):
+    for i in range(5):
+        with open(str(tmpdir.join('part{}.txt'.format(i))), 'w') as f:
+            f.write('\n'.join('file{} line{}'.format(i, j) for j in range(4)))
+    pattern = str(tmpdir.join('*.txt'))
+    num_parts = 3
+    parts = [nlp.data.CorpusStream(pattern, flatten=True, num_parts=num_parts, part_index=i,
+                                   partition_samples=partition_samples, seed=seed)
+             for i in range(num_parts)]
+    all_tokens = sorted(itertools.chain.from_iterable(nlp.data.CorpusStream(pattern,
+                                                                            flatten=True)))
+    epochs = []
+    for _ in range(3):
+        tokens = [list(itertools.chain.from_iterable(part)) for part in parts]
+        # The parts are disjoint and cover the corpus
+        assert sorted(itertools.chain.from_iterable(tokens)) == all_tokens
+        epochs.append([sorted(t) for t in tokens])
+    if seed is not None and not partition_samples:
+        assert any(epoch != epochs[0] for epoch in epochs[1:])
+    elif seed is None:
+        assert all(epoch == epochs[0] for epoch in epochs[1:])
+
+    with pytest.raises(ValueError):
+        nlp.data.CorpusStream(pattern, num_parts=2, part_index=2)
+    with pytest.raises(ValueError):
+        list(nlp.data.CorpusStream(pattern, num_parts=6, part_index=0))
+
+
+def test_corpus_stream_state(tmpdir):
+    for i in range(5):
+        with open(str(tmpdir.join('part{}.txt'.format(i))), 'w') as f:
+            f.write('\n'.join('file{} line{}'.format(i, j) for j in range(4)))
+    pattern = str(tmpdir.join('*.txt'))
+    stream = nlp.data.CorpusStream(pattern)
+    stream_iter = iter(stream)
+    read = [list(next(stream_iter)) for _ in range(2)]
+    state = stream.state_dict()
+    assert state['position'] == 2 and len(state['files']) == 5
+    resumed = nlp.data.CorpusStream(pattern)
+    resumed.load_state_dict(state)
+    assert resumed.state_dict() == state
+    remaining = [list(dataset) for dataset in resumed]
+    assert remaining == [list(dataset) for dataset in stream_iter]
+    assert len(read + remaining) == 5
+    # The next iteration starts a new epoch
+    assert resumed.state_dict()['files'] is None
+    assert len(list(resumed)) == 5
+
+
+@pytest.mark.parametrize('num_workers', [0, 2])
+@pytest.mark.parametrize('to_lower', [False, True])
+def test_count_corpus_tokens(tmpdir, num_workers, to_lower):
+    for i in range(5):
+        with open(str(tmpdir.join('part{}.txt'.format(i))), 'w') as f:
+            f.write('\n'.join('File{} line{} a'.format(i % 2, j) for j in range(i + 1)))
+    pattern = str(tmpdir.join('*.txt'))
+    expected = nlp.data.count_tokens(itertools.chain.from_iterable(
+        nlp.data.CorpusStream(pattern, flatten=True)), to_lower=to_lower)
+    counter = nlp.data.count_corpus_tokens(pattern, to_lower=to_lower, num_workers=num_workers)
+    assert isinstance(counter, nlp.data.Counter)
+    assert counter == expected
+    assert counter['a'] == 15
+    files = sorted(str(f) for f in tmpdir.listdir())
+    assert nlp.data.count_corpus_tokens(files[:3], to_lower=to_lower,
+                                        num_workers=num_workers) == \
+        nlp.data.count_tokens(itertools.chain.from_iterable(
+            nlp.data.CorpusStream(pattern.replace('*', 'part[0-2]'), flatten=True)),
+                              to_lower=to_lower)
+
+    stream = nlp.data.CorpusStream(pattern, eos='<eos>', num_parts=2, part_index=1)
+    counter = nlp.data.count_corpus_tokens(stream, to_lower=to_lower, num_workers=num_workers)
+    assert counter['<eos>'] == 15 and counter['a'] == 15
+    with pytest.raises(ValueError):
+        nlp.data.count_corpus_tokens(str(tmpdir.join('*.none')), num_workers=num_workers)
+
+
 @pytest.mark.parametrize('prefetch', [None, "thread", "process"])
 def test_lazy_stream(prefetch):
     EOS = nlp._constants.EOS_TOKEN
@@ -74,6 +153,99 @@ def test_lazy_stream(prefetch):
         assert all([sx.lower() == sy.lower() == sz for sx, sy, sz in zip(x, y, z)])
 
 
+def _add_offset(x, offset):
+    return x + offset
+
+
+class _CountPickles(object):
+    num_pickles = 0
+
+    def __call__(self, x, offset):
+        return x + offset
+
+    def __reduce__(self):
+        _CountPickles.num_pickles += 1
+        return (_CountPickles, ())
+
+
+@pytest.mark.parametrize('num_workers', [1, 3])
+@pytest.mark.parametrize('ordered', [True, False])
+@pytest.mark.parametrize('worker_type', ['thread', 'process'])
+def test_parallel_transform_stream(num_workers, ordered, worker_type):
+    data = nlp.data.SimpleDataStream([(i, 10) for i in range(20)])
+    stream = data.transform(_add_offset, num_workers=num_workers, ordered=ordered,
+                            worker_type=worker_type, num_prefetch=4)
+    for _ in range(2):
+        result = list(stream)
+        if ordered:
+            assert result == list(range(10, 30))
+        else:
+            assert sorted(result) == list(range(10, 30))
+    # The pool is kept across iterations, including abandoned ones
+    pool = stream._pool
+    assert next(iter(stream)) in range(10, 30)
+    assert sorted(stream) == list(range(10, 30))
+    assert stream._pool is pool
+
+    def fail(x, offset):
+        raise ValueError(x)
+
+    with pytest.raises(ValueError):
+        list(data.transform(fail, num_workers=num_workers, worker_type='thread'))
+    with pytest.raises(ValueError):
+        data.transform(_add_offset, num_workers=2, num_prefetch=0)
+
+
+@pytest.mark.parametrize('worker_type', ['thread', 'process'])
+def test_parallel_transform_stream_fn_sent_once(worker_type):
+    _CountPickles.num_pickles = 0
+    data = nlp.data.SimpleDataStream([(i, 10) for i in range(20)])
+    stream = data.transform(_CountPickles(), num_workers=2, worker_type=worker_type)
+    for _ in range(2):
+        assert list(stream) == list(range(10, 30))
+    # The function is sent at most once to each worker process instead of with each element
+    assert _CountPickles.num_pickles <= 2
+
+
+def _slow_first(x, offset):
+    if x == 0:
+        # Let the following elements be returned first if the order is not kept
+        time.sleep(0.5)
+    return x + offset
+
+
+@pytest.mark.parametrize('ordered', [True, False])
+@pytest.mark.parametrize('worker_type', ['thread', 'process'])
+def test_parallel_transform_stream_state(ordered, worker_type):
+    def make_stream():
+        data = nlp.data.SimpleDataStream([(i, 10) for i in range(20)])
+        return data.transform(_slow_first, num_workers=3, ordered=ordered,
+                              worker_type=worker_type, num_prefetch=4).transform(str)
+
+    stream = make_stream()
+    assert nlp.data.stream._is_resumable(stream)
+    stream_iter = iter(stream)
+    head = [next(stream_iter) for _ in range(7)]
+    state = json.loads(json.dumps(stream.state_dict()))
+    if ordered:
+        assert state == {'stream': {'position': 7}, 'skip': []}
+    else:
+        # The first element was not returned yet
+        assert state['stream'] == {'position': 0} and '10' not in head
+        assert len(state['skip']) == 7
+    resumed = make_stream()
+    resumed.load_state_dict(state)
+    tail = list(resumed)
+    if ordered:
+        assert head + tail == [str(i) for i in range(10, 30)]
+    else:
+        assert sorted(head + tail, key=int) == [str(i) for i in range(10, 30)]
+
+    prefetched = nlp.data.PrefetchingStream(make_stream())
+    assert len(list(prefetched)) == 20
+    assert prefetched.state_dict() == {'stream': {'stream': {'position': 0}, 'skip': []}}
+
+
 @pytest.mark.parametrize('num_prefetch', [0, 1, 10])
 @pytest.mark.parametrize('worker_type', ['thread', 'process'])
 def test_prefetch_stream(num_prefetch, worker_type):
@@ -95,6 +267,36 @@ def test_prefetch_stream(num_prefetch, worker_type):
             assert all([sx == sy for sx, sy in zip(x, y)])
 
 
+@pytest.mark.parametrize('slab_size', [None, 64, 1024 ** 2])
+def test_prefetch_stream_arrays(slab_size):
+    batches = [(mx.nd.arange(i * 10, dtype='int32').reshape((i, 10)),
+                [np.ones((i, 3)) * i, 'batch {}'.format(i)]) for i in range(1, 6)]
+    stream = nlp.data.PrefetchingStream(nlp.data.SimpleDataStream(batches), num_prefetch=2,
+                                        worker_type='process', slab_size=slab_size)
+    for _ in range(2):
+        num_batches = 0
+        for (x, (y, name)), (px, (py, pname)) in zip(batches, stream):
+            assert isinstance(px, mx.nd.NDArray) and px.dtype == np.int32
+            mx.test_utils.assert_almost_equal(x.asnumpy(), px.asnumpy())
+            assert isinstance(py, np.ndarray)
+            mx.test_utils.assert_almost_equal(y, py)
+            assert name == pname
+            num_batches += 1
+        assert num_batches == len(batches)
+
+
+@pytest.mark.parametrize('worker_type', ['thread', 'process'])
+def test_prefetch_stream_profiler(worker_type):
+    profiler = nlp.data.PipelineProfiler()
+    stream = nlp.data.PrefetchingStream(nlp.data.SimpleDataStream([np.ones(3)] * 4),
+                                        worker_type=worker_type, profiler=profiler)
+    assert len(list(stream)) == 4
+    summary = profiler.summary()
+    for stage in ['stream', 'transfer', 'wait']:
+        assert summary['stages'][stage]['count'] == 4
+    assert summary['stages']['consume']['count'] == 4
+
+
 ###############################################################################
 # Language model
 ###############################################################################
@@ -128,6 +330,79 @@ def test_lm_stream():
     assert num_tokens < total_num_tokens
 
 
+@pytest.mark.parametrize('batch_size', [1, 3])
+@pytest.mark.parametrize('seq_len', [2, 5])
+def test_lm_stream_lanes(tmpdir, batch_size, seq_len):
+    sentences = [['a', 'b', 'c', 'd'], ['e', 'f', 'g', 'h', 'i', 'j'], ['k', 'l', 'm', 'n'],
+                 ['o'], ['p', 'q', 'r', 's', 't', 'u', 'v', 'w', 'x', 'y', 'z']]
+    for i, part in enumerate([sentences[:2], sentences[2:]]):
+        with open(str(tmpdir.join('part{}.txt'.format(i))), 'w') as f:
+            f.write('\n'.join(' '.join(s) for s in part))
+    lm_stream = nlp.data.LanguageModelStream(str(tmpdir.join('*.txt')), bos='<bos>', eos='<eos>',
+                                             sampler='sequential', file_sampler='sequential')
+    vocab = nlp.Vocab(nlp.data.Counter(itertools.chain.from_iterable(lm_stream)))
+    bptt_stream = lm_stream.bptt_batchify(vocab, seq_len, batch_size, last_batch='keep')
+    lanes = [[] for _ in range(batch_size)]
+    last_targets = [None] * batch_size
+    for data, target in bptt_stream:
+        assert data.dtype == target.dtype == np.int32
+        assert data.shape == target.shape == (seq_len, batch_size)
+        data, target = data.asnumpy(), target.asnumpy()
+        for i in range(batch_size):
+            num_valid = int((data[:, i] != vocab[vocab.padding_token]).sum())
+            assert np.all(data[1:num_valid, i] == target[:max(num_valid - 1, 0), i])
+            lanes[i].extend(data[:num_valid, i].tolist())
+            if num_valid:
+                last_targets[i] = int(target[num_valid - 1, i])
+    # Every lane reads whole sentences, and each sentence is read by exactly one lane
+    read = []
+    for lane, last_target in zip(lanes, last_targets):
+        lane = lane + [last_target]
+        while len(lane) > 1:
+            end = lane.index(vocab['<eos>'])
+            read.append(lane[:end + 1])
+            lane = lane[end + 1:]
+    coded = [vocab[['<bos>'] + s + ['<eos>']] for s in sentences]
+    assert sorted(read) == sorted(coded)
+
+
+@pytest.mark.parametrize('prefetch', [None, 'thread', 'process'])
+@pytest.mark.parametrize('num_read', [1, 4, 11])
+def test_lm_stream_state(tmpdir, prefetch, num_read):
+    rs = np.random.RandomState(0)
+    for i in range(3):
+        with open(str(tmpdir.join('part{}.txt'.format(i))), 'w') as f:
+            f.write('\n'.join(' '.join('w{}'.format(w) for w in rs.randint(0, 20, rs.randint(1, 9)))
+                              for _ in range(10)))
+    lm_stream = nlp.data.LanguageModelStream(str(tmpdir.join('*.txt')), bos='<bos>', eos='<eos>')
+    vocab = nlp.Vocab(nlp.data.Counter(itertools.chain.from_iterable(lm_stream)))
+
+    def make_stream():
+        stream = lm_stream.bptt_batchify(vocab, 4, 3)
+        if prefetch:
+            stream = nlp.data.PrefetchingStream(stream, worker_type=prefetch)
+        return stream
+
+    np.random.seed(1)
+    expected = [(data.asnumpy(), target.asnumpy()) for data, target in make_stream()]
+    np.random.seed(1)
+    stream = make_stream()
+    stream_iter = iter(stream)
+    batches = [(data.asnumpy(), target.asnumpy())
+               for data, target in itertools.islice(stream_iter, num_read)]
+    state = stream.state_dict()
+    # Finish the interrupted iteration, so that a prefetching thread stops using the global
+    # random state before the resumed one starts
+    for _ in stream_iter:
+        pass
+    resumed = make_stream()
+    resumed.load_state_dict(state)
+    batches += [(data.asnumpy(), target.asnumpy()) for data, target in resumed]
+    assert len(batches) == len(expected)
+    for (data, target), (expected_data, expected_target) in zip(batches, expected):
+        assert np.all(data == expected_data) and np.all(target == expected_target)
+
+
 ###############################################################################
 # Embedding training
 ###############################################################################
@@ -147,3 +422,32 @@ def test_context_stream(reduce_window_size_randomly, shuffle):
         shuffle=shuffle)
 
     assert len(list(context_stream)) == 7500
+
+
+@pytest.mark.parametrize('num_read', [0, 3, 10])
+def test_context_stream_state(num_read):
+    rs = np.random.RandomState(0)
+    shards = [[rs.randint(0, 10, rs.randint(2, 10)).tolist() for _ in range(20)]
+              for _ in range(3)]
+
+    def make_stream():
+        return nlp.data.ContextStream(nlp.data.SimpleDataStream(shards), batch_size=8,
+                                      p_discard=[0.1] * 10, window_size=2)
+
+    def to_numpy(batch):
+        return [array.asnumpy() for array in batch]
+
+    random.seed(1)
+    np.random.seed(1)
+    expected = [to_numpy(batch) for batch in make_stream()]
+    random.seed(1)
+    np.random.seed(1)
+    stream = make_stream()
+    batches = [to_numpy(batch) for batch in itertools.islice(stream, num_read)]
+    state = stream.state_dict()
+    resumed = make_stream()
+    resumed.load_state_dict(state)
+    batches += [to_numpy(batch) for batch in resumed]
+    assert len(batches) == len(expected)
+    for batch, expected_batch in zip(batches, expected):
+        assert all(np.all(x == y) for x, y in zip(batch, expected_batch))
@@ -24,6 +24,7 @@ import re
 import os
 import sys
 import functools
+import pickle
 
 import pytest
 
@@ -115,6 +116,41 @@ def test_vocabulary_getitem():
             no_unk_vocab.to_indices(words)
 
 
+def test_vocabulary_encode_decode_batch():
+    counter = nlp.data.utils.Counter(['a', 'b', 'b', 'c', 'c', 'c', 'some_word$'])
+    vocab = nlp.Vocab(counter)
+    samples = [['a', 'non-exist', 'b'], [], ['c'], ['c', 'b', 'a', 'a']]
+
+    data, offsets = vocab.encode_batch(samples)
+    assert data.dtype == np.int32 and offsets.dtype == np.int64
+    assert offsets.tolist() == [0, 3, 3, 4, 8]
+    assert data.tolist() == [idx for sample in samples for idx in vocab[sample]]
+    decoded = vocab.decode_batch(data, offsets=offsets)
+    assert decoded == [[t if t in vocab else '<unk>' for t in sample] for sample in samples]
+
+    padded, lengths = vocab.encode_batch(samples, pad=True)
+    assert padded.shape == (4, 4) and lengths.tolist() == [3, 0, 1, 4]
+    pad_idx = vocab[vocab.padding_token]
+    for row, sample in zip(padded.tolist(), samples):
+        assert row == vocab[sample] + [pad_idx] * (4 - len(sample))
+    assert vocab.decode_batch(nd.array(padded), valid_length=nd.array(lengths)) == decoded
+    assert vocab.decode_batch(padded)[1] == [vocab.padding_token] * 4
+    # The token array cached by decode_batch is not pickled
+    assert vocab._idx_to_token_array is not None
+    unpickled = pickle.loads(pickle.dumps(vocab))
+    assert unpickled._idx_to_token_array is None
+    assert unpickled.decode_batch(data, offsets=offsets) == decoded
+    assert vocab.encode_batch(samples, pad=True, pad_val=-1)[0][1].tolist() == [-1] * 4
+
+    no_pad_vocab = nlp.Vocab(counter, unknown_token=None, padding_token=None)
+    with pytest.raises(KeyError):
+        no_pad_vocab.encode_batch(samples)
+    with pytest.raises(ValueError):
+        no_pad_vocab.encode_batch([['a']], pad=True)
+    with pytest.raises(ValueError):
+        vocab.decode_batch(np.array([len(vocab)]), offsets=[0, 1])
+
+
 def test_vocabulary_to_tokens():
     counter = nlp.data.utils.Counter(['a', 'b', 'b', 'c', 'c', 'c', 'some_word$'])
 
@@ -136,6 +172,21 @@ def test_vocabulary_to_tokens():
         with pytest.raises(ValueError):
             vocab.to_tokens(indices)
 
+    assert vocab.to_tokens(np.int64(2)) == 'c'
+    assert vocab.to_tokens([np.int32(4), 0]) == ['a', '<unknown>']
+    indices = np.array([[4, 0, 4, 3], [2, 2, 1, 1]])
+    assert vocab.to_tokens(indices) == [['a', '<unknown>', 'a', 'b'], ['c', 'c', '<pad>', '<pad>']]
+    assert vocab.to_tokens(nd.array(indices), valid_length=nd.array([4, 2])) == \
+        [['a', '<unknown>', 'a', 'b'], ['c', 'c']]
+    assert vocab.to_tokens(indices[None], valid_length=np.array([[1, 0]])) == [[['a'], []]]
+    assert vocab.to_tokens(np.array(3)) == 'b'
+    assert vocab.to_tokens(np.zeros((0, 3), dtype=np.int32), valid_length=np.zeros((0,))) == []
+    for indices in [np.array([6]), np.array([-1]), np.array([0.5])]:
+        with pytest.raises(ValueError):
+            vocab.to_tokens(indices)
+    with pytest.raises(ValueError):
+        vocab.to_tokens(np.zeros((2, 3), dtype=np.int32), valid_length=np.zeros((3,)))
+
 
 def test_vocabulary():
     counter = nlp.data.utils.Counter(['a', 'b', 'b', 'c', 'c', 'c', 'some_word$'])
@@ -802,6 +853,109 @@ def test_vocab_serialization():
     loaded_vocab['hello']
 
 
+@pytest.mark.parametrize('unknown_token', ['<unk>', None])
+def test_frozen_vocab(unknown_token):
+    counter = nlp.data.utils.Counter(['a', 'b', 'b', 'c', 'c', 'c', 'some_word$'])
+    vocab = nlp.Vocab(counter, unknown_token=unknown_token)
+    frozen = vocab.freeze()
+    assert isinstance(frozen, nlp.FrozenVocab) and frozen.freeze() is frozen
+    assert len(frozen) == len(vocab)
+    assert list(frozen.idx_to_token) == vocab.idx_to_token
+    assert frozen.idx_to_token[-2:] == vocab.idx_to_token[-2:]
+    assert frozen.padding_token == vocab.padding_token
+    assert frozen.reserved_tokens == vocab.reserved_tokens
+    tokens = ['c', '<pad>', 'some_word$', 'a']
+    assert frozen[tokens] == vocab[tokens] and frozen['b'] == vocab['b']
+    assert 'a' in frozen and 'non-exist' not in frozen
+    if unknown_token:
+        assert frozen['non-exist'] == vocab['non-exist']
+    else:
+        with pytest.raises(KeyError):
+            frozen['non-exist']
+    indices = np.array([[3, 1, 0], [2, 2, 4]])
+    assert frozen.to_tokens(indices) == vocab.to_tokens(indices)
+    assert frozen.to_tokens(indices, valid_length=np.array([1, 3])) == \
+        vocab.to_tokens(indices, valid_length=np.array([1, 3]))
+    assert frozen.to_tokens([1, 2]) == vocab.to_tokens([1, 2])
+    with pytest.raises(ValueError):
+        frozen.to_tokens(len(vocab))
+    data, offsets = frozen.encode_batch([tokens, tokens[:1]])
+    assert frozen.decode_batch(data, offsets=offsets) == [tokens, tokens[:1]]
+    assert pickle.loads(pickle.dumps(frozen))[tokens] == vocab[tokens]
+    assert nlp.Vocab.from_json(frozen.to_json())[tokens] == vocab[tokens]
+
+
+@pytest.mark.parametrize('unknown_token', ['<unk>', None])
+def test_frozen_vocab_encode_batch(unknown_token):
+    # Enough tokens for collisions in the hash table of the frozen vocabulary
+    tokens = ['t{}'.format(i) + u'\u00e9' * (i % 3) for i in range(1000)] + ['']
+    vocab = nlp.Vocab(nlp.data.utils.Counter(tokens), unknown_token=unknown_token)
+    frozen = vocab.freeze()
+    samples = [tokens[i:i + 7] for i in range(0, len(tokens), 5)] + [[], tokens[::-1]]
+    data, offsets = frozen.encode_batch(samples)
+    expected, expected_offsets = vocab.encode_batch(samples)
+    assert data.dtype == np.int32
+    np.testing.assert_array_equal(data, expected)
+    np.testing.assert_array_equal(offsets, expected_offsets)
+    unknown = [['t1', 'non-exist', 5, b't1'], ['t2']]
+    if unknown_token:
+        np.testing.assert_array_equal(frozen.encode_batch(unknown)[0],
+                                      vocab.encode_batch(unknown)[0])
+    else:
+        with pytest.raises(KeyError):
+            frozen.encode_batch(unknown)
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+@pytest.mark.parametrize('unknown_token', ['<unk>', None])
+def test_vocab_binary_serialization(tmpdir, mmap, unknown_token):
+    counter = nlp.data.utils.Counter(['a', 'b', 'b', 'c', 'c', 'c', u'\u00e9t\u00e9', ''])
+    vocab = nlp.Vocab(counter, unknown_token=unknown_token, reserved_tokens=['<sep>'])
+    path = str(tmpdir.join('vocab.bin'))
+    vocab.to_binary(path)
+    loaded_vocab = nlp.Vocab.from_binary(path, mmap=mmap)
+    assert isinstance(loaded_vocab, nlp.FrozenVocab)
+    assert len(loaded_vocab) == len(vocab)
+    assert list(loaded_vocab.idx_to_token) == vocab.idx_to_token
+    assert dict(loaded_vocab.token_to_idx) == dict(vocab.token_to_idx)
+    for attr in ['unknown_token', 'padding_token', 'bos_token', 'eos_token', 'reserved_tokens']:
+        assert getattr(loaded_vocab, attr) == getattr(vocab, attr)
+    tokens = list(counter.keys()) + ['<sep>', '<pad>']
+    assert loaded_vocab[tokens] == vocab[tokens]
+    assert loaded_vocab.to_tokens([0, 3, len(vocab) - 1]) == vocab.to_tokens([0, 3, len(vocab) - 1])
+    assert 'b' in loaded_vocab and 'hello' not in loaded_vocab and 1 not in loaded_vocab
+    if unknown_token:
+        assert loaded_vocab['hello'] == vocab['hello']
+    else:
+        with pytest.raises(KeyError):
+            loaded_vocab['hello']
+    pickled = pickle.dumps(loaded_vocab)
+    assert pickle.loads(pickled)[tokens] == vocab[tokens]
+    assert nlp.Vocab.from_json(loaded_vocab.to_json())[tokens] == vocab[tokens]
+
+    # A memory-mapped vocabulary is pickled as a reference to its file, which must not change
+    with tmpdir.as_cwd():
+        pickled_relative = pickle.dumps(nlp.Vocab.from_binary('vocab.bin', mmap=mmap))
+    assert pickle.loads(pickled_relative)[tokens] == vocab[tokens]
+    new_path = str(tmpdir.join('new_vocab.bin'))
+    nlp.Vocab(counter, unknown_token=unknown_token).to_binary(new_path)
+    stat = os.stat(new_path)
+    os.utime(new_path, (stat.st_atime, stat.st_mtime + 10))
+    os.rename(new_path, path)
+    if mmap:
+        with pytest.raises(ValueError):
+            pickle.loads(pickled)
+    else:
+        assert pickle.loads(pickled)[tokens] == vocab[tokens]
+
+    with pytest.raises(TypeError):
+        nlp.Vocab(nlp.data.utils.Counter([1, 2])).to_binary(path)
+    with open(path, 'wb') as f:
+        f.write(b'not a vocabulary')
+    with pytest.raises(ValueError):
+        nlp.Vocab.from_binary(path, mmap=mmap)
+
+
 def test_token_embedding_from_serialized_file(tmpdir):
     embed_root = str(tmpdir)
     embed_name = 'my_embed'
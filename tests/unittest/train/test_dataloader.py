@@ -1,5 +1,10 @@
+import itertools
+import json
+import multiprocessing
+import os
 import numpy as np
 import mxnet as mx
+import gluonnlp as nlp
 from gluonnlp.data import FixedBucketSampler, ShardedDataLoader
 from mxnet import gluon
 import pytest
@@ -19,8 +24,9 @@ def test_sharded_data_loader():
                                        num_buckets=1,
                                        shuffle=False,
                                        num_shards=num_shards)
-    for num_workers in [0, 1, 2, 3, 4]:
-        loader = ShardedDataLoader(dataset, batch_sampler=batch_sampler, num_workers=num_workers)
+    for num_workers, worker_type in itertools.product([0, 1, 2, 3, 4], ['process', 'thread']):
+        loader = ShardedDataLoader(dataset, batch_sampler=batch_sampler, num_workers=num_workers,
+                                   worker_type=worker_type)
         for i, seqs in enumerate(loader):
             assert len(seqs) == num_shards
             for j in range(num_shards):
@@ -36,3 +42,125 @@ def test_sharded_data_loader():
                     assert mx.test_utils.almost_equal(seqs[j][1].asnumpy(),
                                                       Y[(i*num_shards+j)*2-num_shards:
                                                         (i*num_shards+j+1)*2-num_shards])
+
+
+class _ExitDataset(gluon.data.SimpleDataset):
+    def __getitem__(self, idx):
+        if idx == 5:
+            os._exit(1)
+        return super(_ExitDataset, self).__getitem__(idx)
+
+
+@pytest.mark.parametrize('prefetch', [None, 0, 1])
+@pytest.mark.parametrize('worker_type', ['process', 'thread'])
+def test_sharded_data_loader_persistent_workers(prefetch, worker_type):
+    X = np.random.uniform(size=(20, 5))
+    loader = ShardedDataLoader(gluon.data.ArrayDataset(X), 2, num_workers=2, prefetch=prefetch,
+                               worker_type=worker_type)
+    for _ in range(2):
+        for i, x in enumerate(loader):
+            assert mx.test_utils.almost_equal(x.asnumpy(), X[i*2:(i+1)*2])
+            if i == 3:
+                break
+    workers = loader._persistent_pool._workers
+    for _ in range(2):
+        assert len(list(loader)) == 10
+    assert loader._persistent_pool._workers is workers
+    assert all(worker.is_alive() for worker in workers)
+    loader.shutdown()
+    for i, x in enumerate(loader):
+        assert mx.test_utils.almost_equal(x.asnumpy(), X[i*2:(i+1)*2])
+    loader.shutdown()
+
+
+class _RaiseDataset(gluon.data.SimpleDataset):
+    def __getitem__(self, idx):
+        if idx == 5:
+            raise ValueError
+        return super(_RaiseDataset, self).__getitem__(idx)
+
+
+def test_sharded_data_loader_dead_worker():
+    loader = ShardedDataLoader(_ExitDataset(list(range(10))), 2, num_workers=1,
+                               worker_type='process')
+    with pytest.raises(RuntimeError):
+        for _ in loader:
+            pass
+    # The broken pool is replaced by the next iteration
+    pool = loader._persistent_pool
+    assert pool.broken
+    next(iter(loader))
+    assert loader._persistent_pool is not pool
+    loader.shutdown()
+
+
+@pytest.mark.parametrize('worker_type', ['process', 'thread'])
+def test_sharded_data_loader_worker_error(worker_type):
+    loader = ShardedDataLoader(_RaiseDataset(list(range(10))), 2, num_workers=1,
+                               worker_type=worker_type)
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            for _ in loader:
+                pass
+    # The worker survives the error
+    assert all(worker.is_alive() for worker in loader._persistent_pool._workers)
+    loader.shutdown()
+
+
+def _raising_batchify_fn(samples):
+    if 5 in samples:
+        raise ValueError(samples)
+    return np.array(samples)
+
+
+def test_sharded_data_loader_process_batchify_error():
+    loader = ShardedDataLoader(gluon.data.SimpleDataset(list(range(10))), 2, num_workers=2,
+                               worker_type='process', batchify_fn=_raising_batchify_fn)
+    workers = None
+    for _ in range(2):
+        batches = []
+        with pytest.raises(ValueError):
+            for batch in loader:
+                batches.append(batch.tolist())
+        assert batches == [[0, 1], [2, 3]]
+        assert workers is None or loader._persistent_pool._workers is workers
+        workers = loader._persistent_pool._workers
+    assert all(worker.is_alive() for worker in workers)
+    loader.shutdown()
+
+
+def test_sharded_data_loader_thread_no_processes():
+    children = set(multiprocessing.active_children())
+    dataset = gluon.data.ArrayDataset(np.random.uniform(size=(20, 5)))
+    loader = ShardedDataLoader(dataset, 2, num_workers=4, worker_type='thread')
+    assert len(list(loader)) == 10
+    assert set(multiprocessing.active_children()) <= children
+    loader.shutdown()
+
+
+@pytest.mark.parametrize('num_workers,worker_type', [(0, 'process'), (2, 'process'),
+                                                     (2, 'thread')])
+def test_sharded_data_loader_profiler(num_workers, worker_type, tmpdir):
+    profiler = nlp.data.PipelineProfiler()
+    dataset = gluon.data.ArrayDataset(np.random.uniform(size=(20, 5)))
+    loader = ShardedDataLoader(dataset, 4, num_workers=num_workers, worker_type=worker_type,
+                               profiler=profiler)
+    assert len(list(loader)) == 5
+    summary = profiler.summary()
+    for stage in ['sampler', 'getitem', 'batchify', 'wait']:
+        assert summary['stages'][stage]['count'] == 5
+    assert summary['stages']['consume']['count'] == 5
+    assert 0 <= summary['wait_fraction'] <= 1
+    if num_workers:
+        assert summary['stages']['transfer']['count'] == 5
+        assert summary['counters']['in_flight']['max'] <= 2 * num_workers + 1
+    assert 'batchify' in str(profiler)
+    path = str(tmpdir.join('trace.json'))
+    profiler.export_chrome_trace(path)
+    with open(path) as f:
+        trace = json.load(f)['traceEvents']
+    assert len([event for event in trace if event['ph'] == 'X']) == \
+        sum(stats['count'] for stats in summary['stages'].values())
+    profiler.reset()
+    assert not profiler.summary()['stages']
+    loader.shutdown()